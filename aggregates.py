@@ -0,0 +1,363 @@
+import json
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from sketches import build_sketch_table, stratified_sample, summarize_topk
+from statuses import FLAG_NAMES, LIFECYCLE_FLAGS, flag_counts
+
+DAILY_ROLLUP = "daily.parquet"
+PRODUCT_LINES = "products.parquet"
+ORDER_SKETCHES = "orders_hll.parquet"
+CUSTOMER_SKETCHES = "customers_hll.parquet"
+TOPK_SUMMARIES = "topk.parquet"
+ORDER_SAMPLE = "sample.parquet"
+
+# Items kept per (day, payment type) summary, and the filtered row count
+# below which the dashboard just computes exact rankings
+TOPK_CAPACITY = 50
+TOPK_EXACT_LIMIT = 200_000
+
+# Preview sample: share of each (day, payment type, state) stratum kept, with
+# a floor so small strata still get a variance estimate
+SAMPLE_RATE = float(os.environ.get("GOKWIK_SAMPLE_RATE", 0.02))
+SAMPLE_MIN_ROWS = int(os.environ.get("GOKWIK_SAMPLE_MIN_ROWS", 3))
+SAMPLE_STRATA = ["Day", "Payment Type", "Billing State"]
+SAMPLE_COLUMNS = [
+    "Order Number", "Status", "Payment Type", "City Tier", "Billing State", "Grand Total",
+    "Utm Source", "Utm Medium", "Utm Campaign", "Utm Content",
+]
+
+# Columns the sidebar filters on; every one of them is a rollup key so
+# filtering the rollup gives the same totals as filtering raw orders
+ROLLUP_DIMENSIONS = ["Status", "Payment Type", "City Tier", "Utm Source"]
+
+
+def filter_frame(frame, filters, date_col="Order Date"):
+    """Apply the sidebar filter state to raw orders or to a rollup"""
+    start, end = filters["date_range"][0], filters["date_range"][-1]
+    mask = (
+        (frame[date_col] >= pd.Timestamp(start)) &
+        (frame[date_col] < pd.Timestamp(end) + timedelta(days=1)) &
+        (frame["Status"].isin(filters["status"])) &
+        (frame["Payment Type"].isin(filters["payment"]))
+    )
+
+    if filters["tier"] and "City Tier" in frame.columns:
+        mask &= frame["City Tier"].isin(filters["tier"])
+
+    if filters["utm"] and "Utm Source" in frame.columns:
+        mask &= frame["Utm Source"].isin(filters["utm"])
+
+    return frame[mask]
+
+
+def default_filters(df):
+    """Filter state of a fresh session: the sidebar defaults for this dataset"""
+    dates = df["Order Date"].dropna()
+    return {
+        "date_range": (dates.min().date(), dates.max().date()),
+        "status": df["Status"].unique().tolist(),
+        "payment": ["Prepaid", "COD"],
+        "tier": ["Tier 1", "Tier 2", "Tier 3"] if "City Tier" in df.columns else [],
+        "utm": df["Utm Source"].dropna().unique().tolist() if "Utm Source" in df.columns else [],
+    }
+
+
+def filter_key(filters):
+    """Canonical, order-insensitive string for a filter state"""
+    start, end = filters["date_range"][0], filters["date_range"][-1]
+    canonical = {name: sorted(map(str, values)) for name, values in filters.items() if name != "date_range"}
+    canonical["date_range"] = [str(start), str(end)]
+    return json.dumps(canonical, sort_keys=True)
+
+
+def rollup_keys(df):
+    """Day plus the filter dimensions present in the dataset"""
+    dims = [c for c in ROLLUP_DIMENSIONS if c in df.columns]
+    return df[dims].assign(Day=df["Order Date"].dt.normalize())[["Day"] + dims]
+
+
+def build_daily_rollup(df):
+    """Orders, revenue and lifecycle-flag counts per day and filter dimension"""
+    keys = rollup_keys(df)
+    lifecycle = flag_counts(df, np.ones(len(df), dtype="int64"))
+    frame = keys.assign(**{"Order Number": df["Order Number"], "Grand Total": df["Grand Total"]}, **lifecycle)
+    return frame.groupby(list(keys.columns), dropna=False, observed=True).agg(**{
+        "Orders": ("Order Number", "size"),
+        "Revenue": ("Grand Total", "sum"),
+        "Revenue Rows": ("Grand Total", "count"),
+        **{name: (name, "sum") for name in lifecycle},
+    }).reset_index()
+
+
+def rollup_lifecycle(rollup):
+    """Confirmed, Delivered, Cancelled, RTO and Successful order counts per rollup row.
+
+    Rollups written before these columns existed classify their Status instead.
+    """
+    names = list(FLAG_NAMES.values())
+    if set(names) <= set(rollup.columns):
+        return rollup[names]
+    return pd.DataFrame(flag_counts(rollup, rollup["Orders"]), index=rollup.index)
+
+
+def lifecycle_breakdown(rollup, dimensions=("Payment Type", "City Tier")):
+    """Cancellation and RTO counts and rates per payment type and city tier"""
+    dims = [d for d in dimensions if d in rollup.columns]
+    table = rollup[dims + ["Orders"]].join(rollup_lifecycle(rollup)[LIFECYCLE_FLAGS])
+    table = table.groupby(dims, dropna=False, observed=True).sum().reset_index()
+    orders = table["Orders"]
+    table["Cancellation %"] = (table["Cancelled"] / orders * 100).round(1)
+    table["RTO %"] = (table["RTO"] / orders * 100).round(1)
+    table["Delivered %"] = (table["Delivered"] / orders * 100).round(1)
+    return table
+
+
+def build_product_lines(df):
+    """Explode pipe-separated product names into (Row, Product Name) line items"""
+    if "Product Name" not in df.columns:
+        return pd.DataFrame({"Row": pd.Series(dtype="int64"), "Product Name": pd.Series(dtype="object")})
+
+    products = df["Product Name"].astype(str).str.split('|').explode().str.strip()
+    products = products[products.notna() & (products != '') & (products != 'nan')]
+    return pd.DataFrame({"Row": products.index.to_numpy(), "Product Name": products.to_numpy()})
+
+
+def build_order_sketches(df):
+    """HyperLogLog of Order Number per rollup cell"""
+    return build_sketch_table(rollup_keys(df), df["Order Number"])
+
+
+def build_customer_sketches(df):
+    """HyperLogLog of Customer ID per rollup cell"""
+    customers = df["Customer ID"] if "Customer ID" in df.columns else pd.Series(None, index=df.index, dtype="object")
+    return build_sketch_table(rollup_keys(df), customers)
+
+
+def build_topk(df):
+    """Per-day, per-payment-type heavy hitters for products and UTM content"""
+    keys = ["Day", "Payment Type"]
+    summaries = []
+
+    lines = build_product_lines(df)
+    if len(lines):
+        orders = df.loc[lines["Row"], ["Order Date", "Payment Type", "Order Number", "Grand Total"]]
+        items = pd.DataFrame({
+            "Day": orders["Order Date"].dt.normalize().to_numpy(),
+            "Payment Type": orders["Payment Type"].to_numpy(),
+            "Item": lines["Product Name"].to_numpy(),
+            "Order Number": orders["Order Number"].to_numpy(),
+            "Grand Total": orders["Grand Total"].to_numpy(),
+        })
+        summaries.append(summarize_topk(items, keys, TOPK_CAPACITY).assign(Dimension="Product Name"))
+
+    if "Utm Content" in df.columns:
+        tagged = df[df["Utm Content"].notna()]
+        items = pd.DataFrame({
+            "Day": tagged["Order Date"].dt.normalize(),
+            "Payment Type": tagged["Payment Type"],
+            "Item": tagged["Utm Content"],
+            "Order Number": tagged["Order Number"],
+            "Grand Total": tagged["Grand Total"],
+            "Utm Source": tagged["Utm Source"] if "Utm Source" in tagged.columns else None,
+            "Utm Medium": tagged["Utm Medium"] if "Utm Medium" in tagged.columns else None,
+        })
+        summaries.append(summarize_topk(items, keys, TOPK_CAPACITY).assign(Dimension="Utm Content"))
+
+    if not summaries:
+        return pd.DataFrame(columns=keys + ["Item", "Count", "Orders", "Revenue", "Threshold", "Dimension"])
+    return pd.concat(summaries, ignore_index=True)
+
+
+def topk_window(summaries, dimension, filters):
+    """Summaries of one dimension inside the filter's date range and payment types"""
+    start, end = filters["date_range"][0], filters["date_range"][-1]
+    return summaries[
+        (summaries["Dimension"] == dimension) &
+        (summaries["Day"] >= pd.Timestamp(start)) &
+        (summaries["Day"] <= pd.Timestamp(end)) &
+        (summaries["Payment Type"].isin(filters["payment"]))
+    ]
+
+
+def build_order_sample(df, rate=SAMPLE_RATE, min_rows=SAMPLE_MIN_ROWS):
+    """Stratified sample of orders by day, payment type and state for preview estimates"""
+    frame = df[[c for c in SAMPLE_COLUMNS if c in df.columns]].assign(Day=df["Order Date"].dt.normalize())
+    strata = [c for c in SAMPLE_STRATA if c in frame.columns]
+    return stratified_sample(frame, strata, rate, min_rows, key="Order Number").reset_index(drop=True)
+
+
+ROLLUP_BUILDERS = {
+    DAILY_ROLLUP: build_daily_rollup,
+    PRODUCT_LINES: build_product_lines,
+    ORDER_SKETCHES: build_order_sketches,
+    CUSTOMER_SKETCHES: build_customer_sketches,
+    TOPK_SUMMARIES: build_topk,
+    ORDER_SAMPLE: build_order_sample,
+}
+
+
+def write_rollups(df, rollup_dir):
+    """Precompute and persist the aggregates the dashboard reads on load"""
+    os.makedirs(rollup_dir, exist_ok=True)
+    for name, builder in ROLLUP_BUILDERS.items():
+        builder(df).to_parquet(os.path.join(rollup_dir, name), index=False)
+
+
+def read_rollup(rollup_dir, name, min_mtime_ns=None):
+    """Read a persisted rollup, ignoring it if older than the dataset"""
+    path = os.path.join(rollup_dir, name)
+    if not os.path.exists(path):
+        return None
+    if min_mtime_ns is not None and os.stat(path).st_mtime_ns < min_mtime_ns:
+        return None
+    return pd.read_parquet(path)
+
+
+def comparison_windows(date_range):
+    """Current window, the equally long window before it, and the same dates a year earlier"""
+    start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[-1])
+    span = end - start + timedelta(days=1)
+    year = pd.DateOffset(years=1)
+    return {
+        "current": (start, end),
+        "previous": (start - span, start - timedelta(days=1)),
+        "year_ago": (start - year, end - year),
+    }
+
+
+def window_filters(filters, windows):
+    """Filter state widened to cover every comparison window"""
+    return {**filters, "date_range": (min(w[0] for w in windows.values()), max(w[1] for w in windows.values()))}
+
+
+def window_masks(days, windows):
+    return {name: (days >= start) & (days <= end) for name, (start, end) in windows.items()}
+
+
+def window_totals(rollup, windows):
+    """KPI totals for each window from a single grouped pass over the rollup.
+
+    The rollup is reduced to one row per day; window sums are then differences
+    of cumulative totals, so overlapping windows cost nothing extra.
+    """
+    measures = rollup[["Day", "Orders", "Revenue", "Revenue Rows"]].assign(
+        Prepaid=rollup["Orders"].where(rollup["Payment Type"] == "Prepaid", 0),
+        COD=rollup["Orders"].where(rollup["Payment Type"] == "COD", 0),
+        Successful=rollup_lifecycle(rollup)["Successful"],
+    )
+    cumulative = measures.groupby("Day").sum().cumsum()
+    days = cumulative.index
+
+    totals = {}
+    for name, (start, end) in windows.items():
+        hi = days.searchsorted(end, side="right")
+        lo = days.searchsorted(start, side="left")
+        upper = cumulative.iloc[hi - 1] if hi > 0 else 0
+        lower = cumulative.iloc[lo - 1] if lo > 0 else 0
+        totals[name] = (upper - lower) if hi > lo else cumulative.iloc[:0].sum()
+    return totals
+
+
+def period_totals(rollup, time_grain):
+    """Revenue and orders per Daily, Weekly, Monthly or Yearly period of a daily rollup"""
+    if time_grain == "Daily":
+        period = rollup["Day"].dt.date
+    elif time_grain == "Weekly":
+        period = rollup["Day"].dt.to_period('W').dt.start_time
+    elif time_grain == "Monthly":
+        period = rollup["Day"].dt.to_period('M').dt.start_time
+    else:
+        period = rollup["Day"].dt.year
+
+    daily = rollup.groupby(period).agg({
+        "Revenue": "sum",
+        "Orders": "sum"
+    }).reset_index()
+    daily.columns = ["Date", "Revenue", "Orders"]
+    return daily
+
+
+def payment_split(rollup):
+    """Orders and revenue per payment type"""
+    return rollup.groupby("Payment Type").agg({
+        "Orders": "sum",
+        "Revenue": "sum"
+    }).reset_index()
+
+
+def kpi_values(totals):
+    """Derive the KPI card values from summed rollup measures"""
+    orders = totals["Orders"]
+    return {
+        "revenue": totals["Revenue"],
+        "aov": totals["Revenue"] / totals["Revenue Rows"] if totals["Revenue Rows"] else 0,
+        "prepaid": int(totals["Prepaid"]),
+        "cod": int(totals["COD"]),
+        "success": totals["Successful"] / orders * 100 if orders else 0,
+    }
+
+
+def _group_codes(values):
+    """Integer code per row (-1 where missing) and the label of each code"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    return pd.factorize(values)
+
+
+def _first_rows(slots, valid, n_slots):
+    """Per slot, the first row where ``valid`` holds (-1 if none)"""
+    rows = np.flatnonzero(valid)
+    first = np.full(n_slots, len(valid), dtype=np.intp)
+    np.minimum.at(first, slots[rows], rows)
+    return np.where(first < len(valid), first, -1)
+
+
+def utm_breakdown(frame, dimension, attributes=(), orders=None, revenue="Grand Total"):
+    """Order counts, payment mix, revenue and AOV per UTM value in one grouped pass.
+
+    Works on raw orders (one row per order) or on pre-counted rows such as
+    top-K summaries, whose per-row order count is named by ``orders``. Rows
+    are summed on integer group codes; labels and the attributes (first
+    non-missing value per group) are looked up for the aggregated groups only.
+    """
+    codes, labels = _group_codes(frame[dimension])
+    # Missing values go to slot 0, which is dropped
+    slots = codes.astype(np.intp) + 1
+    n_slots = len(labels) + 1
+
+    counts = frame[orders].to_numpy() if orders else frame["Order Number"].notna().to_numpy()
+    cod = frame["Payment Type"].eq("COD").to_numpy()
+    total = np.bincount(slots, weights=counts, minlength=n_slots)[1:]
+    cod_total = np.bincount(slots, weights=np.where(cod, counts, 0), minlength=n_slots)[1:]
+    amount = np.bincount(slots, weights=frame[revenue].to_numpy(dtype="float64", na_value=0.0), minlength=n_slots)[1:]
+    groups = np.flatnonzero(np.bincount(slots, minlength=n_slots)[1:])
+    if counts.dtype.kind in "biu":
+        total, cod_total = total.astype("int64"), cod_total.astype("int64")
+
+    table = pd.DataFrame({
+        dimension: labels.take(groups),
+        "Total Orders": total[groups],
+        "COD": cod_total[groups],
+        "Total Revenue": amount[groups],
+    })
+    for column in [c for c in attributes if c in frame.columns]:
+        values = frame[column]
+        rows = _first_rows(slots, values.notna().to_numpy(), n_slots)[1:][groups]
+        table[column] = values.iloc[np.maximum(rows, 0)].where(rows >= 0).to_numpy()
+
+    total = table["Total Orders"]
+    table["Prepaid"] = total - table["COD"]
+    table["Prepaid %"] = (table["Prepaid"] / total * 100).round(1)
+    table["COD %"] = (table["COD"] / total * 100).round(1)
+    table["AOV"] = (table["Total Revenue"] / total).round(0)
+
+    # Medium is only meaningful for Google traffic
+    if "Utm Medium" in table.columns and "Utm Source" in table.columns:
+        is_google = table["Utm Source"].astype(str).str.lower().str.contains("google", regex=False).to_numpy()
+        table["Medium"] = np.where(is_google, table["Utm Medium"], "-")
+
+    return table.sort_values("Total Orders", ascending=False, ignore_index=True)
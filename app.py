@@ -1,11 +1,31 @@
+import time
+
+# Taken before anything else loads, so first-paint timings include startup
+RUN_STARTED = time.perf_counter()
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import os
-from datetime import date, datetime
-import hashlib
+from datetime import datetime
+from profiling import SectionProfiler
+from ingest import (
+    DATA_DIR, DEFAULT_MERCHANT, MissingColumnsError, clean_orders, dataset_version, list_merchants,
+    load_dataset, merchant_slug, migrate_legacy_dataset, read_file, rollup_dir, store_orders
+)
+from cache import MerchantCache, estimate_bytes
+from aggregates import (
+    ORDER_SAMPLE, ROLLUP_BUILDERS, SAMPLE_RATE, TOPK_CAPACITY, TOPK_SUMMARIES, comparison_windows, filter_frame, filter_key,
+    payment_split, period_totals, read_rollup, topk_window, utm_breakdown, window_filters, window_masks
+)
+from cohorts import COHORT_MATRIX, build_cohorts, retention_curve, slice_cohorts
+from reports import find_snapshot
+from sections import ORDERS, PREVIEW_MIN_ROWS, SamplePreview, SectionResults
+from sketches import hll_error, merge_topk
+from geo import DEFAULT_GEO_LEVEL, available_levels, geometry_ids, geometry_url, normalize_states
+from tables import COUNT, CURRENCY, DATE, PERCENT, render_table
+from warmup import Warmer, record_filters
+
+STYLESHEET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "dashboard.css")
 
 # ---------------- CONFIG ----------------
 st.set_page_config(
@@ -16,253 +36,93 @@ st.set_page_config(
 )
 
 # ---------------- CUSTOM CSS ----------------
-st.markdown("""
-<style>
-    /* Main background */
-    .main {
-        background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-        padding: 20px;
-    }
-    
-    /* Ensure consistent sizing */
-    .block-container {
-        max-width: 100%;
-        padding: 1rem 2rem;
-    }
-    
-    /* Card styling */
-    .metric-card {
-        background: linear-gradient(135deg, #ffffff 0%, #f8f9fa 100%);
-        padding: 25px;
-        border-radius: 15px;
-        box-shadow: 0 8px 16px rgba(0, 0, 0, 0.1);
-        text-align: center;
-        margin: 10px 0;
-        transition: transform 0.3s ease, box-shadow 0.3s ease;
-        height: 100%;
-        min-height: 140px;
-        display: flex;
-        flex-direction: column;
-        justify-content: center;
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 12px 24px rgba(0, 0, 0, 0.15);
-    }
-    
-    /* Metric value */
-    .metric-value {
-        font-size: 36px;
-        font-weight: 700;
-        color: #667eea;
-        margin: 10px 0;
-        text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.1);
-    }
-    
-    /* Metric label */
-    .metric-label {
-        font-size: 13px;
-        color: #666;
-        text-transform: uppercase;
-        letter-spacing: 1.5px;
-        font-weight: 600;
-        margin-bottom: 8px;
-    }
-    
-    /* Header styling */
-    .dashboard-header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 30px;
-        border-radius: 15px;
-        color: white;
-        text-align: center;
-        margin-bottom: 30px;
-        box-shadow: 0 8px 16px rgba(0, 0, 0, 0.2);
-    }
-    
-    /* Section headers */
-    .section-header {
-        font-size: 24px;
-        font-weight: 700;
-        color: #1a1a1a;
-        margin: 40px 0 25px 0;
-        padding: 20px 25px;
-        border-left: 6px solid #667eea;
-        background: linear-gradient(135deg, #ffffff 0%, #f8f9fa 100%);
-        border-radius: 12px;
-        box-shadow: 0 5px 15px rgba(0, 0, 0, 0.1);
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .section-header::before {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: 0;
-        width: 4px;
-        height: 100%;
-        background: linear-gradient(180deg, #667eea 0%, #764ba2 100%);
-    }
-    
-    /* Chart containers */
-    .js-plotly-plot {
-        border-radius: 12px;
-        overflow: hidden;
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08);
-        background: white;
-        margin: 10px 0;
-    }
-    
-    /* Remove streamlit branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    
-    /* File uploader styling */
-    .uploadedFile {
-        background: white;
-        border-radius: 10px;
-        padding: 10px;
-    }
-    
-    /* Sidebar styling */
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #667eea 0%, #764ba2 100%);
-        box-shadow: 2px 0 10px rgba(0, 0, 0, 0.1);
-    }
-    
-    [data-testid="stSidebar"] * {
-        color: white !important;
-    }
-    
-    /* Streamlit elements */
-    .stButton>button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 12px 24px;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 12px rgba(102, 126, 234, 0.3);
-        width: 100%;
-        height: 80px;
-        font-size: 13px;
-        white-space: pre-line;
-        line-height: 1.4;
-    }
-    
-    .stButton>button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(102, 126, 234, 0.4);
-        background: linear-gradient(135deg, #764ba2 0%, #667eea 100%);
-    }
-    
-    .stButton>button:active {
-        transform: translateY(0px);
-        box-shadow: 0 2px 8px rgba(102, 126, 234, 0.5);
-    }
-    
-    /* Dataframe styling */
-    .dataframe {
-        border-radius: 10px !important;
-        overflow: hidden !important;
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08) !important;
-    }
-    
-    /* Responsive adjustments */
-    @media (max-width: 768px) {
-        .metric-card {
-            padding: 15px;
-            min-height: 120px;
-        }
-        
-        .metric-value {
-            font-size: 28px;
-        }
-        
-        .section-header {
-            font-size: 18px;
-            padding: 12px 15px;
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def load_css():
+    """Dashboard stylesheet, read once per process"""
+    with open(STYLESHEET) as f:
+        return f"<style>\n{f.read()}</style>"
+
+st.markdown(load_css(), unsafe_allow_html=True)
 
-DATA_DIR = "data"
-DATA_FILE = f"{DATA_DIR}/latest.parquet"
 os.makedirs(DATA_DIR, exist_ok=True)
+migrate_legacy_dataset()
+
+profiler = SectionProfiler(
+    enabled=st.session_state.get("profile_sections", os.environ.get("GOKWIK_PROFILE") == "1"),
+    started=RUN_STARTED
+)
 
 # ---------------- HELPERS ----------------
-@st.cache_data(show_spinner=False)
-def load_data():
-    if os.path.exists(DATA_FILE):
-        return pd.read_parquet(DATA_FILE)
-    return None
-
-def save_data(df):
-    df["__last_updated__"] = date.today()
-    df.to_parquet(DATA_FILE, index=False)
-
-def read_file(file):
-    return pd.read_csv(file) if file.name.endswith(".csv") else pd.read_excel(file)
-
-def hash_customer_name(name):
-    """Hash customer name for privacy"""
-    if pd.isna(name):
-        return "Unknown"
-    return hashlib.md5(str(name).encode()).hexdigest()[:8]
-
-def create_metric_card(label, value, delta=None, delta_color="normal"):
-    delta_html = f'<div style="color: {"#10b981" if delta_color == "normal" else "#ef4444"}; font-size: 14px; font-weight: 600; margin-top: 8px;">{delta}</div>' if delta else ""
+@st.cache_resource
+def get_merchant_cache():
+    return MerchantCache()
+
+merchant_cache = get_merchant_cache()
+
+def load_data(merchant, version):
+    # Near the memory budget the dataset is not kept between runs; each run reads it once and passes it on
+    return merchant_cache.get(merchant, ORDERS, version, lambda: load_dataset(merchant), component="dataset", spillable=True)
+
+def load_rollup(merchant, version, name):
+    """Persisted rollup for the merchant, rebuilt from its orders if missing or stale"""
+    def build():
+        rollup = read_rollup(rollup_dir(merchant), name, min_mtime_ns=version)
+        return rollup if rollup is not None else ROLLUP_BUILDERS[name](load_data(merchant, version))
+    return merchant_cache.get(merchant, name, version, build)
+
+def load_cohort_matrix(merchant, version):
+    """Cohort matrix maintained at ingest, rebuilt from all orders if missing or stale"""
+    def build():
+        matrix = read_rollup(rollup_dir(merchant), COHORT_MATRIX, min_mtime_ns=version)
+        return matrix if matrix is not None else build_cohorts(load_data(merchant, version), rollup_dir(merchant))
+    return merchant_cache.get(merchant, COHORT_MATRIX, version, build)
+
+def load_table(merchant, version, name):
+    return load_data(merchant, version) if name == ORDERS else load_rollup(merchant, version, name)
+
+@st.cache_resource
+def get_warmer():
+    warmer = Warmer(merchant_cache, load_table)
+    warmer.start()
+    return warmer
+
+warmer = get_warmer()
+
+def ingest_orders(df, merchant):
+    """Store cleaned orders in the merchant's partitions, refresh its rollups and start warming its views"""
+    store_orders(df, merchant)
+    merchant_cache.invalidate(merchant)
+    warmer.notify()
+
+def plot(builder, *args, **kwargs):
+    """Render the figure ``charts.<builder>`` makes from these inputs, built once per distinct input.
+
+    plotly is imported on the first chart, not while the KPI row is waiting.
+    Streamlit's theme is off so the charts' own template styling applies.
+    """
+    import charts
+    cached = charts.cached_figure(merchant_cache, merchant, version, getattr(charts, builder), *args, **kwargs)
+    profiler.record_figure(cached.nbytes)
+    st.plotly_chart(cached.figure, use_container_width=True, theme=None)
+
+def create_metric_card(label, value, delta=None, delta_color="normal", note=None):
+    # delta may also be a list of (text, delta_color) pairs, one line each
+    deltas = delta if isinstance(delta, list) else ([(delta, delta_color)] if delta else [])
+    delta_html = "".join(
+        f'<div style="color: {"#10b981" if color == "normal" else "#ef4444"}; font-size: 14px; font-weight: 600; margin-top: 8px;">{text}</div>'
+        for text, color in deltas
+    )
+    note_html = f'<div style="color: #6b7280; font-size: 12px; margin-top: 4px;">{note}</div>' if note else ""
     
     return f"""
     <div class="metric-card">
         <div class="metric-label">{label}</div>
         <div class="metric-value">{value}</div>
+        {note_html}
         {delta_html}
     </div>
     """
 
-def get_city_tier(pincode):
-    """Classify cities into tiers based on pincode"""
-    if pd.isna(pincode):
-        return 'Unknown'
-    
-    pincode_str = str(pincode).strip()[:3]
-    
-    try:
-        pincode_prefix = int(pincode_str)
-    except:
-        return 'Unknown'
-    
-    # Tier 1 cities pincodes (Major metros)
-    tier_1_pincodes = [
-        400, 401, 110, 121, 122, 201, 122, 124, 125, 127, 128, 134,
-        560, 562, 563, 500, 501, 502, 503, 504, 505, 508,
-        600, 601, 602, 603, 700, 711, 712, 713, 721, 722, 743,
-        411, 412, 380, 382, 383,
-    ]
-    
-    # Tier 2 cities pincodes
-    tier_2_pincodes = [
-        302, 303, 226, 227, 208, 209, 440, 441, 442,
-        452, 453, 462, 463, 530, 531, 390, 391,
-        141, 142, 282, 283, 422, 423, 121,
-        250, 251, 360, 361, 221, 222, 190, 191, 192, 193, 194,
-        143, 211, 212, 834, 835, 711, 641, 642,
-        520, 521, 342, 344, 625, 626, 492, 493,
-        324, 325, 781, 782, 783, 160, 140, 122, 201,
-    ]
-    
-    if pincode_prefix in tier_1_pincodes:
-        return 'Tier 1'
-    elif pincode_prefix in tier_2_pincodes:
-        return 'Tier 2'
-    else:
-        return 'Tier 3'
-
 # ---------------- HEADER ----------------
 st.markdown("""
 <div class="dashboard-header">
@@ -272,6 +132,19 @@ st.markdown("""
 
 # ---------------- SIDEBAR ----------------
 with st.sidebar:
+    st.markdown("### 🏪 Merchant")
+    merchants = list_merchants()
+    if "pending_merchant" in st.session_state:
+        st.session_state["merchant"] = st.session_state.pop("pending_merchant")
+    merchant = st.selectbox("Merchant", merchants, key="merchant") if merchants else None
+    new_merchant = st.text_input(
+        "New Merchant",
+        placeholder="Brand name",
+        help="Ingest the uploaded file into a new merchant instead of the selected one"
+    )
+    upload_merchant = merchant_slug(new_merchant) if new_merchant.strip() else (merchant or DEFAULT_MERCHANT)
+    
+    st.markdown("---")
     st.markdown("### 📁 Data Upload")
     uploaded_file = st.file_uploader(
         "Upload Order Report",
@@ -285,58 +158,35 @@ with st.sidebar:
         st.success("✅ File uploaded successfully")
 
 # ---------------- UPLOAD PROCESSING ----------------
-if uploaded_file:
-    df = read_file(uploaded_file)
-    df.columns = df.columns.str.strip()
-
-    REQUIRED = [
-        "Order Number",
-        "Created At",
-        "Merchant Order Status",
-        "Payment Method",
-        "Grand Total"
-    ]
-
-    missing = [c for c in REQUIRED if c not in df.columns]
-    if missing:
-        st.error(f"❌ Missing columns: {', '.join(missing)}")
+# An upload is ingested once, into the merchant it was uploaded for. While it
+# stays in the uploader, switching the Merchant selectbox only changes the view;
+# only naming a different New Merchant sends the same file there as well
+upload_key = (uploaded_file.name, uploaded_file.size, uploaded_file.file_id) if uploaded_file else None
+ingested_key, ingested_into = st.session_state.get("ingested_upload", (None, None))
+if upload_key is not None and upload_key == ingested_key:
+    named = merchant_slug(new_merchant) if new_merchant.strip() else None
+    upload_merchant = named if named != ingested_into else None
+if uploaded_file and upload_merchant:
+    try:
+        df = clean_orders(read_file(uploaded_file))
+    except MissingColumnsError as e:
+        st.error(f"❌ Missing columns: {', '.join(e.missing)}")
         st.stop()
 
-    # Data cleaning
-    df["Order Date"] = pd.to_datetime(df["Created At"], errors="coerce", dayfirst=True)
-    df = df[df["Order Date"].notna()]
-    
-    df["Grand Total"] = pd.to_numeric(df["Grand Total"], errors="coerce")
-    df["Status"] = df["Merchant Order Status"]
-    df["Payment Method"] = df["Payment Method"].astype(str).str.upper()
-    df["Payment Type"] = df["Payment Method"].apply(
-        lambda x: "COD" if "COD" in str(x) else "Prepaid"
-    )
-    
-    # Customer ID
-    if "Customer Phone" in df.columns:
-        df["Customer ID"] = df["Customer Phone"].apply(lambda x: str(x).split('|')[0] if pd.notna(x) else "Unknown")
-    elif "Customer Name" in df.columns:
-        df["Customer ID"] = df["Customer Name"].apply(hash_customer_name)
-    
-    # City tier classification
-    if "Billing Pincode" in df.columns:
-        df["City Tier"] = df["Billing Pincode"].apply(get_city_tier)
-    elif "Shipping Pincode" in df.columns:
-        df["City Tier"] = df["Shipping Pincode"].apply(get_city_tier)
-    else:
-        df["City Tier"] = "Unknown"
-
-    save_data(df)
+    ingest_orders(df, upload_merchant)
+    st.session_state["ingested_upload"] = (upload_key, upload_merchant)
+    if upload_merchant != merchant:
+        st.session_state["pending_merchant"] = upload_merchant
+        st.rerun()
     with st.sidebar:
         st.success("✅ Data processed successfully")
 
 # ---------------- LOAD DATA ----------------
-if not uploaded_file:
-    df = load_data()
-    if df is None:
-        st.info("👆 Please upload a file to view the dashboard")
-        st.stop()
+version = dataset_version(merchant) if merchant else None
+if version is None:
+    st.info("👆 Please upload a file to view the dashboard")
+    st.stop()
+df = load_data(merchant, version)
 
 if "Order Date" not in df.columns:
     st.error("⚠️ Data corrupted. Please re-upload the file.")
@@ -399,441 +249,412 @@ with st.sidebar:
     else:
         utm_filter = []
     
-    # Campaign filter removed
-    campaign_filter = []
-    
-    st.markdown("---")
-    
-    # Time granularity selector
-    st.markdown("### 📅 Time Granularity")
-    time_grain = st.selectbox(
-        "Select View",
-        ["Daily", "Weekly", "Monthly", "Yearly"],
-        index=0
+    fast_preview = st.toggle(
+        "⚡ Fast preview",
+        value=len(df) >= PREVIEW_MIN_ROWS,
+        key="fast_preview",
+        help=f"Estimate state and UTM sections from a {SAMPLE_RATE:.0%} stratified sample while exact results compute"
     )
     
     st.markdown("---")
     st.markdown("### 📊 Dashboard Info")
     st.info(f"**Last Updated:** {datetime.now().strftime('%d %b %Y, %I:%M %p')}")
+    component_usage = merchant_cache.usage_by_component()
+    component_usage["session"] = sum(estimate_bytes(v) for v in st.session_state.to_dict().values())
+    st.caption(
+        f"Memory ({sum(component_usage.values()) / 1024 ** 2:,.0f} of {merchant_cache.budget_bytes / 1024 ** 2:,.0f} MB): "
+        + ", ".join(f"{c} {b / 1024 ** 2:,.0f} MB" for c, b in component_usage.items())
+    )
+    st.caption("Cache by merchant: " + ", ".join(f"{m} {b / 1024 ** 2:,.0f} MB" for m, b in merchant_cache.usage().items()))
+    if merchant_cache.under_pressure():
+        st.warning("Near the memory budget: large results are recomputed per run and products are aggregated in slices")
+    st.toggle(
+        "🐞 Profile sections",
+        value=profiler.enabled,
+        key="profile_sections",
+        help="Record per-section timings and memory to data/perf_log.jsonl"
+    )
 
 # ---------------- APPLY FILTERS ----------------
-filtered = df[
-    (df["Order Date"].dt.date >= date_range[0]) &
-    (df["Order Date"].dt.date <= date_range[1]) &
-    (df["Status"].isin(status_filter)) &
-    (df["Payment Type"].isin(payment_filter))
-]
-
-if tier_filter and "City Tier" in filtered.columns:
-    filtered = filtered[filtered["City Tier"].isin(tier_filter)]
-
-if utm_filter and "Utm Source" in filtered.columns:
-    filtered = filtered[filtered["Utm Source"].isin(utm_filter)]
-
-if campaign_filter and "Utm Campaign" in filtered.columns:
-    filtered = filtered[filtered["Utm Campaign"].isin(campaign_filter)]
-
+profiler.start("FILTERS", rows=len(df))
+filters = {
+    "date_range": date_range,
+    "status": status_filter,
+    "payment": payment_filter,
+    "tier": tier_filter,
+    "utm": utm_filter,
+}
+# Each filter state a session lands on feeds the warm-up's popularity ranking
+if st.session_state.get("recorded_filters") != (merchant, filter_key(filters)):
+    record_filters(merchant, filters)
+    st.session_state["recorded_filters"] = (merchant, filter_key(filters))
+
+# Filters matching a preset the report job rendered for this dataset version
+# read their section results from the snapshot instead of computing them
+snapshot = find_snapshot(merchant, version, filters)
+results = SectionResults(
+    merchant_cache, load_table, merchant, version, filters, snapshot=snapshot["dir"] if snapshot else None, orders=df
+)
 # ---------------- KEY METRICS ----------------
+profiler.start("KPI")
 st.markdown('<div class="section-header">📈 Key Performance Indicators</div>', unsafe_allow_html=True)
 
-col1, col2, col3, col4, col5, col6 = st.columns(6)
-
-total_orders = filtered["Order Number"].nunique()
-total_revenue = filtered["Grand Total"].sum()
-avg_order_value = filtered["Grand Total"].mean()
-prepaid_orders = filtered[filtered["Payment Type"] == "Prepaid"].shape[0]
-cod_orders = filtered[filtered["Payment Type"] == "COD"].shape[0]
-
-confirmed_orders = filtered[filtered["Status"].str.contains("Confirmed|Delivered|Shipped", case=False, na=False)].shape[0]
-total_transactions = len(filtered)
-payment_success_ratio = (confirmed_orders / total_transactions * 100) if total_transactions > 0 else 0
-
-with col1:
-    st.markdown(create_metric_card("Total Orders", f"{total_orders:,}"), unsafe_allow_html=True)
+@st.fragment
+def render_kpis(df, filters):
+    distinct_mode = st.radio(
+        "Distinct Counts",
+        ["Approximate", "Exact"],
+        horizontal=True,
+        help="Approximate merges per-day HyperLogLog sketches; Exact counts raw orders"
+    )
+    
+    col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
+
+    # Current, previous-period and year-ago windows are all answered from one
+    # filter pass over the daily rollup (and sketches) covering the three windows
+    totals, kpis = results.get("kpis")
+    kpis = {name: dict(values) for name, values in kpis.items()}
+
+    has_customers = "Customer ID" in df.columns
+    if distinct_mode == "Exact":
+        windows = comparison_windows(filters["date_range"])
+        wide = filter_frame(df, window_filters(filters, windows))
+        for name, mask in window_masks(wide["Order Date"].dt.normalize(), windows).items():
+            kpis[name]["orders"] = wide.loc[mask, "Order Number"].nunique()
+            kpis[name]["customers"] = wide.loc[mask, "Customer ID"].nunique() if has_customers else 0
+        distinct_note = None
+    else:
+        distinct_note = f"±{hll_error() * 100:.1f}% (HLL)"
+
+    def kpi_deltas(key, points=False):
+        """Change against the previous period and the same period last year"""
+        current = kpis["current"][key]
+        deltas = []
+        for name, label in [("previous", "vs prev period"), ("year_ago", "YoY")]:
+            base = kpis[name][key]
+            if totals[name]["Orders"] == 0 or (not points and not base):
+                continue
+            change = current - base if points else (current - base) / base * 100
+            unit = " pts" if points else "%"
+            deltas.append((f"{'▲' if change >= 0 else '▼'} {abs(change):.1f}{unit} {label}", "normal" if change >= 0 else "inverse"))
+        return deltas
+
+    total_orders = kpis["current"]["orders"]
+    total_customers = kpis["current"]["customers"]
+    total_revenue = kpis["current"]["revenue"]
+    avg_order_value = kpis["current"]["aov"]
+    prepaid_orders = kpis["current"]["prepaid"]
+    cod_orders = kpis["current"]["cod"]
+    payment_success_ratio = kpis["current"]["success"]
 
-with col2:
-    st.markdown(create_metric_card("Total Revenue", f"₹{total_revenue:,.0f}"), unsafe_allow_html=True)
+    with col1:
+        st.markdown(create_metric_card("Total Orders", f"{total_orders:,}", delta=kpi_deltas("orders"), note=distinct_note), unsafe_allow_html=True)
 
-with col3:
-    st.markdown(create_metric_card("Avg Order Value", f"₹{avg_order_value:,.0f}"), unsafe_allow_html=True)
+    with col2:
+        st.markdown(create_metric_card("Total Revenue", f"₹{total_revenue:,.0f}", delta=kpi_deltas("revenue")), unsafe_allow_html=True)
 
-with col4:
-    st.markdown(create_metric_card("Prepaid Orders", f"{prepaid_orders:,}"), unsafe_allow_html=True)
+    with col3:
+        st.markdown(create_metric_card("Avg Order Value", f"₹{avg_order_value:,.0f}", delta=kpi_deltas("aov")), unsafe_allow_html=True)
+
+    with col4:
+        st.markdown(create_metric_card("Prepaid Orders", f"{prepaid_orders:,}", delta=kpi_deltas("prepaid")), unsafe_allow_html=True)
+
+    with col5:
+        st.markdown(create_metric_card("COD Orders", f"{cod_orders:,}", delta=kpi_deltas("cod")), unsafe_allow_html=True)
+
+    with col6:
+        st.markdown(create_metric_card("Payment Success", f"{payment_success_ratio:.1f}%", delta=kpi_deltas("success", points=True)), unsafe_allow_html=True)
+
+    with col7:
+        customers_value = f"{total_customers:,}" if has_customers else "-"
+        customers_delta = kpi_deltas("customers") if has_customers else None
+        st.markdown(create_metric_card("Unique Customers", customers_value, delta=customers_delta, note=distinct_note if has_customers else None), unsafe_allow_html=True)
+
+render_kpis(df, filters)
+
+# The KPI row is the first meaningful paint: everything above it comes from
+# the sidebar and the daily rollup, and nothing below it has been computed yet
+profiler.mark("first_paint", new_session="painted" not in st.session_state)
+st.session_state["painted"] = True
+
+rollup = results.get("rollup")
+topk_keys = ["Day", "Payment Type"]
+
+# In preview mode order-level sections are estimated from the stratified
+# sample until the exact results, computed on a background thread, are ready
+preview = None
+if fast_preview and snapshot is None and not results.ready():
+    results.compute_in_background()
+    preview = SamplePreview(load_rollup(merchant, version, ORDER_SAMPLE), filters)
+
+def exact(name):
+    """Exact section result; None while preview mode is still computing it"""
+    return results.peek(name) if preview is not None else results.get(name)
+
+def section(name):
+    """Exact section result, or its sample estimate while it is not ready"""
+    value = exact(name)
+    return preview.get(name) if value is None and preview is not None else value
+
+filtered = exact("filtered")
+use_topk = exact("use_topk")
+view_rows = len(filtered) if filtered is not None else preview.rows
+PREVIEW_PENDING = "⏳ Computing exact results for this selection…"
+
+if preview is not None:
+    @st.fragment(run_every=2)
+    def await_exact_results():
+        if results.ready():
+            st.rerun()
+        st.caption(
+            f"⚡ Preview: state and UTM sections are estimated from a {SAMPLE_RATE:.0%} stratified sample "
+            f"(~{preview.rows:,} ± {preview.rows_ci:,} orders selected); ± values are 95% confidence intervals. "
+            "Exact results replace them automatically."
+        )
+    
+    await_exact_results()
 
-with col5:
-    st.markdown(create_metric_card("COD Orders", f"{cod_orders:,}"), unsafe_allow_html=True)
+if snapshot is not None:
+    st.caption(
+        f"📰 Served from the '{snapshot['preset']}' report rendered "
+        f"{datetime.fromtimestamp(snapshot['created']).strftime('%d %b %Y, %I:%M %p')} "
+        f"(HTML and CSV in {snapshot['dir']})"
+    )
 
-with col6:
-    st.markdown(create_metric_card("Payment Success", f"{payment_success_ratio:.1f}%"), unsafe_allow_html=True)
 
 # ---------------- ROW 1: TRENDS WITH DRILL-DOWN ----------------
+profiler.start("ROW 1", rows=view_rows)
 st.markdown('<div class="section-header">📊 Revenue & Order Trends</div>', unsafe_allow_html=True)
 
-col1, col2 = st.columns([2, 1])
-
-with col1:
-    if time_grain == "Daily":
-        daily = filtered.groupby(filtered["Order Date"].dt.date).agg({
-            "Grand Total": "sum",
-            "Order Number": "count"
-        }).reset_index()
-        daily.columns = ["Date", "Revenue", "Orders"]
-        x_data = daily["Date"]
-        title_text = "Daily Revenue & Orders"
-    elif time_grain == "Weekly":
-        filtered["Week"] = filtered["Order Date"].dt.to_period('W').dt.start_time
-        daily = filtered.groupby("Week").agg({
-            "Grand Total": "sum",
-            "Order Number": "count"
-        }).reset_index()
-        daily.columns = ["Date", "Revenue", "Orders"]
-        x_data = daily["Date"]
-        title_text = "Weekly Revenue & Orders"
-    elif time_grain == "Monthly":
-        filtered["Month"] = filtered["Order Date"].dt.to_period('M').dt.start_time
-        daily = filtered.groupby("Month").agg({
-            "Grand Total": "sum",
-            "Order Number": "count"
-        }).reset_index()
-        daily.columns = ["Date", "Revenue", "Orders"]
-        x_data = daily["Date"]
-        title_text = "Monthly Revenue & Orders"
-    else:
-        filtered["Year"] = filtered["Order Date"].dt.year
-        daily = filtered.groupby("Year").agg({
-            "Grand Total": "sum",
-            "Order Number": "count"
-        }).reset_index()
-        daily.columns = ["Date", "Revenue", "Orders"]
-        x_data = daily["Date"]
-        title_text = "Yearly Revenue & Orders"
-    
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
-    
-    fig.add_trace(
-        go.Scatter(
-            x=x_data, 
-            y=daily["Revenue"],
-            name="Revenue",
-            line=dict(color='#667eea', width=3),
-            fill='tozeroy',
-            fillcolor='rgba(102, 126, 234, 0.1)'
-        ),
-        secondary_y=False
-    )
-    
-    fig.add_trace(
-        go.Scatter(
-            x=x_data, 
-            y=daily["Orders"],
-            name="Orders",
-            line=dict(color='#f093fb', width=2, dash='dot'),
-        ),
-        secondary_y=True
-    )
-    
-    fig.update_layout(
-        title=dict(text=title_text, font=dict(size=16, color='#1a1a1a', family="Arial, sans-serif")),
-        height=400,
-        hovermode='x unified',
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font=dict(family="Arial, sans-serif", size=12, color='#1a1a1a'),
-        margin=dict(l=60, r=60, t=60, b=60)
+@st.fragment
+def render_trends(rollup):
+    time_grain = st.selectbox(
+        "📅 Time Granularity",
+        ["Daily", "Weekly", "Monthly", "Yearly"],
+        index=0
     )
     
-    fig.update_xaxes(showgrid=True, gridcolor='#f0f0f0', tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a'))
-    fig.update_yaxes(showgrid=True, gridcolor='#f0f0f0', secondary_y=False, tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a'))
-    fig.update_yaxes(showgrid=False, secondary_y=True, tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a'))
-    
-    st.plotly_chart(fig, use_container_width=True)
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        # Trend comes from the daily rollup rather than raw orders
+        plot("trend_chart", period_totals(rollup, time_grain), time_grain)
+
+    with col2:
+        plot("payment_pie", payment_split(rollup))
+
+render_trends(rollup)
 
-with col2:
-    payment_split = filtered.groupby("Payment Type").agg({
-        "Order Number": "count",
-        "Grand Total": "sum"
-    }).reset_index()
-    
-    fig = go.Figure(data=[go.Pie(
-        labels=payment_split["Payment Type"],
-        values=payment_split["Order Number"],
-        hole=0.5,
-        marker=dict(colors=['#4facfe', '#f093fb']),
-        textinfo='label+percent+value',
-        textfont_size=16,
-        textfont_color='white',
-        textposition='inside'
-    )])
-    
-    fig.update_layout(
-        title=dict(text="Payment Split", font=dict(size=16, color='#1a1a1a', family="Arial, sans-serif")),
-        height=400,
-        showlegend=False,
-        paper_bgcolor='white',
-        font=dict(family="Arial, sans-serif", size=14, color='#1a1a1a'),
-        margin=dict(l=20, r=20, t=60, b=20)
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
 # ---------------- ROW 2: MAP & TIER ANALYSIS ----------------
+profiler.start("ROW 2", rows=view_rows)
 st.markdown('<div class="section-header">🗺️ Geographic Analysis & City Tiers</div>', unsafe_allow_html=True)
 
-if "Billing State" in filtered.columns:
-    # Aggregate state data
-    state_data = filtered.groupby("Billing State").agg({
-        "Order Number": "count",
-        "Grand Total": "sum"
-    }).reset_index()
-    state_data.columns = ["State", "Orders", "Revenue"]
-    state_data = state_data.sort_values("Orders", ascending=False)
+@st.fragment
+def render_state_map(state_data, district_data):
+    layers = ["States"]
+    if district_data is not None and available_levels("districts"):
+        layers.append("Districts")
+    
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        layer = st.radio("Map", layers, horizontal=True).lower() if len(layers) > 1 else "states"
+    with c2:
+        levels = available_levels(layer)
+        level = st.select_slider(
+            "Map Detail",
+            options=levels,
+            value=DEFAULT_GEO_LEVEL if DEFAULT_GEO_LEVEL in levels else levels[0]
+        ) if len(levels) > 1 else levels[0]
+    with c3:
+        map_metric = st.radio("Color By", ["Orders", "Revenue"], horizontal=True, key="map_metric")
+    
+    # Only ids and values travel with the figure; the geometry is fetched by
+    # URL once and kept by plotly.js across reruns
+    regions = geometry_ids(layer, level)
+    if layer == "states":
+        data = state_data.assign(Region=normalize_states(state_data["State"], canonical=regions).to_numpy())
+    else:
+        states = normalize_states(district_data["State"]).to_numpy()
+        data = district_data.assign(Region=district_data["District"].astype(str).str.strip().str.title() + ", " + states)
+    data = data.groupby("Region", as_index=False)[["Orders", "Revenue"]].sum()
+    
+    plot("state_map", data, geometry_url(layer, level), map_metric, 'State' if layer == 'states' else 'District')
     
+    unmapped = data.loc[~data["Region"].isin(regions), "Region"]
+    if len(unmapped):
+        st.caption(f"Not on the map: {', '.join(unmapped.astype(str).head(10))}" + (" …" if len(unmapped) > 10 else ""))
+
+state_data = section("states")
+if state_data is not None:
     # Create two columns - one for visualization, one for table
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        # Use a simple but effective bar chart visualization
-        fig = go.Figure()
-        
-        fig.add_trace(go.Bar(
-            y=state_data["State"].head(15),
-            x=state_data["Orders"].head(15),
-            orientation='h',
-            marker=dict(
-                color=state_data["Orders"].head(15),
-                colorscale='Blues',
-                showscale=True,
-                colorbar=dict(title="Orders", x=1.15)
-            ),
-            text=state_data["Orders"].head(15),
-            textposition='outside',
-            hovertemplate='<b>%{y}</b><br>Orders: %{x:,}<br>Revenue: ₹%{customdata:,.0f}<extra></extra>',
-            customdata=state_data["Revenue"].head(15)
-        ))
-        
-        fig.update_layout(
-            title=dict(
-                text='Top 15 States by Orders',
-                font=dict(size=20, color='#1a1a1a', family='Arial'),
-                x=0.02,
-                xanchor='left'
-            ),
-            height=600,
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            xaxis=dict(
-                showgrid=True,
-                gridcolor='#f0f0f0',
-                title="Number of Orders",
-                tickfont=dict(color='#1a1a1a'),
-                title_font=dict(color='#1a1a1a')
-            ),
-            yaxis=dict(
-                showgrid=False,
-                tickfont=dict(color='#1a1a1a', size=11),
-                title_font=dict(color='#1a1a1a')
-            ),
-            font=dict(family="Arial, sans-serif", size=12, color='#1a1a1a'),
-            margin=dict(l=150, r=150, t=60, b=60)
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        if available_levels("states"):
+            render_state_map(state_data, exact("districts"))
+        else:
+            # Without built geometries, fall back to a bar chart of the top states
+            plot("state_bar", state_data)
     
     with col2:
         # Show complete state breakdown
         st.markdown("#### 📊 All States")
         
-        display_state_data = state_data.copy()
-        display_state_data["Revenue"] = display_state_data["Revenue"].apply(lambda x: f"₹{x:,.0f}")
-        
-        st.dataframe(
-            display_state_data,
-            use_container_width=True,
-            height=550,
-            hide_index=True
+        render_table(
+            state_data,
+            {"Orders": COUNT, "Orders ±": COUNT, "Revenue": CURRENCY, "Revenue ±": CURRENCY},
+            height=550
         )
 
 # ---------------- ROW 3: TOP 10 WITH TOGGLE ----------------
+profiler.start("ROW 3", rows=view_rows)
 st.markdown('<div class="section-header">🏆 Top 10 States Performance</div>', unsafe_allow_html=True)
 
-if "Billing State" in filtered.columns:
-    col1, col2 = st.columns([3, 1])
+@st.fragment
+def render_top_states(state_data):
+    if state_data is not None:
+        col1, col2 = st.columns([3, 1])
     
-    with col2:
-        top10_metric = st.radio(
-            "Select Metric",
-            ["Orders", "Revenue"],
-            horizontal=True
-        )
+        with col2:
+            top10_metric = st.radio(
+                "Select Metric",
+                ["Orders", "Revenue"],
+                horizontal=True
+            )
     
-    with col1:
-        state_data = filtered.groupby("Billing State").agg({
-            "Order Number": "count",
-            "Grand Total": "sum"
-        }).reset_index()
-        state_data.columns = ["State", "Orders", "Revenue"]
-        
-        if top10_metric == "Orders":
-            state_data = state_data.sort_values("Orders", ascending=True).tail(10)
-            y_data = state_data["Orders"]
-            color_data = state_data["Orders"]
-            title_text = "Top 10 States by Orders"
-            text_data = state_data["Orders"]
-        else:
-            state_data = state_data.sort_values("Revenue", ascending=True).tail(10)
-            y_data = state_data["Revenue"]
-            color_data = state_data["Revenue"]
-            title_text = "Top 10 States by Revenue"
-            text_data = [f"₹{x:,.0f}" for x in state_data["Revenue"]]
-        
-        fig = go.Figure(go.Bar(
-            x=y_data,
-            y=state_data["State"],
-            orientation='h',
-            marker=dict(color=color_data, colorscale='Viridis', showscale=False),
-            text=text_data,
-            textposition='outside'
-        ))
-        
-        fig.update_layout(
-            title=dict(text=title_text, font=dict(size=16, color='#1a1a1a')),
-            height=400,
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            xaxis=dict(showgrid=True, gridcolor='#f0f0f0', tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            yaxis=dict(showgrid=False, tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            font=dict(family="Arial, sans-serif", size=12, color='#1a1a1a'),
-            margin=dict(l=60, r=60, t=60, b=60)
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        with col1:
+            plot("top_states_chart", state_data, top10_metric)
+
+render_top_states(state_data)
+
+# ---------------- CANCELLATIONS & RTO ----------------
+profiler.start("RTO", rows=len(rollup))
+st.markdown('<div class="section-header">🚚 Cancellations & RTO</div>', unsafe_allow_html=True)
+
+lifecycle = results.get("lifecycle")
+if len(lifecycle) > 0:
+    group_col = "City Tier" if "City Tier" in lifecycle.columns else "Payment Type"
+    col1, col2 = st.columns(2)
+    
+    for col, metric in [(col1, "Cancellation %"), (col2, "RTO %")]:
+        with col:
+            plot("lifecycle_chart", lifecycle, group_col, metric)
+    
+    st.caption("Order statuses are mapped to lifecycle states at ingest (see data/reference/statuses.csv).")
+    render_table(
+        lifecycle,
+        {
+            "Orders": COUNT, "Confirmed": COUNT, "Delivered": COUNT, "Cancelled": COUNT, "RTO": COUNT,
+            "Cancellation %": PERCENT, "RTO %": PERCENT, "Delivered %": PERCENT
+        }
+    )
+else:
+    st.info("No orders in the selected range")
 
 # ---------------- ROW 4: UTM CONTENT, SOURCE & MEDIUM ANALYSIS ----------------
+profiler.start("ROW 4", rows=view_rows)
 st.markdown('<div class="section-header">📱 Marketing Performance Analysis</div>', unsafe_allow_html=True)
 
 # UTM Content Analysis
-if "Utm Content" in filtered.columns and "Utm Source" in filtered.columns:
+if "Utm Content" in df.columns and "Utm Source" in df.columns:
     st.markdown("#### All UTM Content: COD vs Prepaid")
     
-    # Get UTM Medium and Source for each content
-    utm_content_info = filtered.groupby("Utm Content").agg({
-        "Utm Source": "first",
-        "Utm Medium": "first" if "Utm Medium" in filtered.columns else lambda x: ""
-    }).reset_index()
-    
-    utm_content_data = filtered.groupby(["Utm Content", "Payment Type"]).agg({
-        "Order Number": "count",
-        "Grand Total": "sum"
-    }).reset_index()
-    
-    # Pivot to create table
-    table_data = utm_content_data.pivot_table(
-        index="Utm Content",
-        columns="Payment Type",
-        values="Order Number",
-        fill_value=0
-    ).reset_index()
-    
-    # Merge with source and medium info
-    table_data = table_data.merge(utm_content_info, on="Utm Content", how="left")
-    
-    # Ensure both payment columns exist
-    if "Prepaid" not in table_data.columns:
-        table_data["Prepaid"] = 0
-    if "COD" not in table_data.columns:
-        table_data["COD"] = 0
-    
-    # Add total column
-    table_data["Total Orders"] = table_data["Prepaid"] + table_data["COD"]
-    table_data["Prepaid %"] = (table_data["Prepaid"] / table_data["Total Orders"] * 100).round(1)
-    table_data["COD %"] = (table_data["COD"] / table_data["Total Orders"] * 100).round(1)
-    table_data = table_data.sort_values("Total Orders", ascending=False)
-    
-    # For Google, show UTM Medium; for others, show blank or N/A
-    if "Utm Medium" in table_data.columns:
-        table_data["Medium"] = table_data.apply(
-            lambda row: row["Utm Medium"] if "google" in str(row["Utm Source"]).lower() else "-",
-            axis=1
+    if use_topk:
+        # Only the heaviest contents, merged from the per-day summaries
+        content_summaries = topk_window(load_rollup(merchant, version, TOPK_SUMMARIES), "Utm Content", filters)
+        top_contents = merge_topk(content_summaries, topk_keys).head(TOPK_CAPACITY * 4)
+        table_data = utm_breakdown(
+            content_summaries[content_summaries["Item"].isin(top_contents.index)].rename(columns={"Item": "Utm Content"}),
+            "Utm Content",
+            attributes=["Utm Source", "Utm Medium"],
+            orders="Count",
+            revenue="Revenue"
         )
-        # Reorder columns
-        table_data = table_data[["Utm Content", "Utm Source", "Medium", "Prepaid", "COD", "Total Orders", "Prepaid %", "COD %"]]
+        st.caption(f"Top {len(top_contents)} contents from daily top-{TOPK_CAPACITY} summaries; each count may be low by at most {top_contents['Error'].max():,} orders")
     else:
-        table_data = table_data[["Utm Content", "Utm Source", "Prepaid", "COD", "Total Orders", "Prepaid %", "COD %"]]
+        table_data = section("utm_contents")
     
-    st.dataframe(
-        table_data.style.format({
-            "Prepaid": "{:,.0f}",
-            "COD": "{:,.0f}",
-            "Total Orders": "{:,.0f}",
-            "Prepaid %": "{:.1f}%",
-            "COD %": "{:.1f}%"
-        }),
-        use_container_width=True,
-        height=400,
-        hide_index=True
+    content_columns = ["Utm Content", "Utm Source", "Medium", "Prepaid", "COD", "Total Orders", "Orders ±", "Prepaid %", "COD %"]
+    table_data = table_data[[c for c in content_columns if c in table_data.columns]]
+    
+    render_table(
+        table_data,
+        {"Prepaid": COUNT, "COD": COUNT, "Total Orders": COUNT, "Orders ±": COUNT, "Prepaid %": PERCENT, "COD %": PERCENT},
+        height=400
     )
 
+UTM_SUMMARY_KINDS = {
+    "Total Orders": COUNT,
+    "Orders ±": COUNT,
+    "Prepaid Orders": COUNT,
+    "COD Orders": COUNT,
+    "Prepaid %": PERCENT,
+    "COD %": PERCENT,
+    "Total Revenue": CURRENCY,
+    "Revenue ±": CURRENCY,
+    "AOV": CURRENCY
+}
+
 # UTM Source Comprehensive Analysis
-if "Utm Source" in filtered.columns:
+if "Utm Source" in df.columns:
     st.markdown("#### UTM Source Performance Overview")
     
-    utm_source_data = filtered.groupby(["Utm Source", "Payment Type"]).agg({
-        "Order Number": "count",
-        "Grand Total": "sum"
-    }).reset_index()
-    
-    # Pivot to create table
-    table_data = utm_source_data.pivot_table(
-        index="Utm Source",
-        columns="Payment Type",
-        values=["Order Number", "Grand Total"],
-        fill_value=0,
-        aggfunc="sum"
-    ).reset_index()
-    
-    # Flatten column names
-    table_data.columns = ['_'.join(col).strip('_') if col[1] else col[0] for col in table_data.columns.values]
-    
-    # Ensure all columns exist
-    for col in ["Order Number_Prepaid", "Order Number_COD", "Grand Total_Prepaid", "Grand Total_COD"]:
-        if col not in table_data.columns:
-            table_data[col] = 0
-    
-    # Calculate metrics
-    table_data["Total Orders"] = table_data["Order Number_Prepaid"] + table_data["Order Number_COD"]
-    table_data["Total Revenue"] = table_data["Grand Total_Prepaid"] + table_data["Grand Total_COD"]
-    table_data["AOV"] = (table_data["Total Revenue"] / table_data["Total Orders"]).round(0)
-    table_data["Prepaid %"] = (table_data["Order Number_Prepaid"] / table_data["Total Orders"] * 100).round(1)
-    table_data["COD %"] = (table_data["Order Number_COD"] / table_data["Total Orders"] * 100).round(1)
+    table_data = section("utm_sources").rename(columns={
+        "Utm Source": "UTM Source",
+        "Prepaid": "Prepaid Orders",
+        "COD": "COD Orders"
+    })
+    source_columns = ["UTM Source", "Total Orders", "Orders ±", "Prepaid Orders", "COD Orders",
+                      "Prepaid %", "COD %", "Total Revenue", "Revenue ±", "AOV"]
+    table_data = table_data[[c for c in source_columns if c in table_data.columns]]
+    
+    render_table(
+        table_data,
+        UTM_SUMMARY_KINDS,
+        height=400
+    )
+
+# UTM Campaign Analysis
+if "Utm Campaign" in df.columns:
+    st.markdown("#### UTM Campaign Performance")
     
-    # Rename for display
-    table_data = table_data.rename(columns={
+    table_data = section("utm_campaigns").rename(columns={
+        "Utm Campaign": "UTM Campaign",
         "Utm Source": "UTM Source",
-        "Order Number_Prepaid": "Prepaid Orders",
-        "Order Number_COD": "COD Orders"
+        "Prepaid": "Prepaid Orders",
+        "COD": "COD Orders"
     })
+    campaign_columns = ["UTM Campaign", "UTM Source", "Total Orders", "Orders ±", "Prepaid Orders", "COD Orders",
+                        "Prepaid %", "COD %", "Total Revenue", "Revenue ±", "AOV"]
+    table_data = table_data[[c for c in campaign_columns if c in table_data.columns]]
+    
+    render_table(
+        table_data,
+        UTM_SUMMARY_KINDS,
+        height=400
+    )
+
+# Sections below the fold compute on the background thread once the page
+# above them is out; a full rerun fills them in when they are ready
+BELOW_FOLD = ["rfm", "products"]
+BELOW_FOLD_PENDING = "⏳ Loading this section…"
+deferred = preview is None and not results.ready(BELOW_FOLD)
+if deferred:
+    results.compute_in_background()
     
-    # Select and reorder columns
-    display_columns = ["UTM Source", "Total Orders", "Prepaid Orders", "COD Orders", 
-                      "Prepaid %", "COD %", "Total Revenue", "AOV"]
-    table_data = table_data[display_columns]
-    table_data = table_data.sort_values("Total Orders", ascending=False)
+    @st.fragment(run_every=2)
+    def await_below_fold():
+        if results.ready(BELOW_FOLD):
+            st.rerun()
     
-    st.dataframe(
-        table_data.style.format({
-            "Total Orders": "{:,.0f}",
-            "Prepaid Orders": "{:,.0f}",
-            "COD Orders": "{:,.0f}",
-            "Prepaid %": "{:.1f}%",
-            "COD %": "{:.1f}%",
-            "Total Revenue": "₹{:,.0f}",
-            "AOV": "₹{:,.0f}"
-        }),
-        use_container_width=True,
-        height=400,
-        hide_index=True
-    )
+    await_below_fold()
+
+def below_fold(name):
+    """Exact result of a below-the-fold section; None while it is still computing"""
+    return results.peek(name) if deferred else exact(name)
 
 # ---------------- ROW 5: RFM ANALYSIS ----------------
+profiler.start("ROW 5", rows=view_rows)
 st.markdown('<div class="section-header">🎯 RFM Analysis (Recency, Frequency, Monetary)</div>', unsafe_allow_html=True)
 
 # Add explanation
@@ -856,266 +677,117 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-if "Customer ID" in filtered.columns:
-    current_date = filtered["Order Date"].max()
-    
-    rfm_data = filtered.groupby("Customer ID").agg({
-        "Order Date": lambda x: (current_date - x.max()).days,
-        "Order Number": "count",
-        "Grand Total": "sum"
-    }).reset_index()
-    
-    rfm_data.columns = ["Customer ID", "Recency", "Frequency", "Monetary"]
-    
-    def calculate_score(data, column, ascending=True):
-        try:
-            unique_values = data[column].nunique()
-            if unique_values <= 1:
-                return pd.Series([3] * len(data), index=data.index)
-            
-            n_bins = min(5, unique_values)
-            if ascending:
-                labels = list(range(1, n_bins + 1))
-            else:
-                labels = list(range(n_bins, 0, -1))
-            
-            if column == "Frequency":
-                return pd.qcut(data[column].rank(method='first'), n_bins, labels=labels, duplicates='drop')
-            else:
-                return pd.qcut(data[column], n_bins, labels=labels, duplicates='drop')
-        except:
-            try:
-                if column == "Frequency":
-                    return pd.cut(data[column].rank(method='first'), n_bins, labels=labels, duplicates='drop')
-                else:
-                    return pd.cut(data[column], n_bins, labels=labels, duplicates='drop')
-            except:
-                ranks = data[column].rank(method='first', pct=True)
-                if ascending:
-                    return pd.cut(ranks, bins=5, labels=[1, 2, 3, 4, 5])
-                else:
-                    return pd.cut(ranks, bins=5, labels=[5, 4, 3, 2, 1])
-    
-    rfm_data["R_Score"] = calculate_score(rfm_data, "Recency", ascending=False)
-    rfm_data["F_Score"] = calculate_score(rfm_data, "Frequency", ascending=True)
-    rfm_data["M_Score"] = calculate_score(rfm_data, "Monetary", ascending=True)
-    
-    rfm_data["RFM_Score"] = rfm_data["R_Score"].astype(str) + rfm_data["F_Score"].astype(str) + rfm_data["M_Score"].astype(str)
-    rfm_data["RFM_Total"] = rfm_data["R_Score"].astype(int) + rfm_data["F_Score"].astype(int) + rfm_data["M_Score"].astype(int)
-    
-    def segment_customer(score):
-        if score >= 13:
-            return "Champions"
-        elif score >= 11:
-            return "Loyal"
-        elif score >= 9:
-            return "Potential"
-        elif score >= 7:
-            return "At Risk"
-        else:
-            return "Lost"
-    
-    rfm_data["Segment"] = rfm_data["RFM_Total"].apply(segment_customer)
-    
+rfm_data = below_fold("rfm")
+if rfm_data is None and "Customer ID" in df.columns and (preview is not None or deferred):
+    st.info(PREVIEW_PENDING if preview is not None else BELOW_FOLD_PENDING)
+elif rfm_data is not None:
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        segment_counts = rfm_data["Segment"].value_counts().reset_index()
-        segment_counts.columns = ["Segment", "Customers"]
-        
-        color_map = {
-            "Champions": "#43e97b",
-            "Loyal": "#30cfd0",
-            "Potential": "#fee140",
-            "At Risk": "#fa709a",
-            "Lost": "#f093fb"
-        }
-        
-        colors = [color_map.get(seg, "#667eea") for seg in segment_counts["Segment"]]
-        
-        fig = go.Figure(data=[go.Bar(
-            x=segment_counts["Segment"],
-            y=segment_counts["Customers"],
-            marker=dict(color=colors),
-            text=segment_counts["Customers"],
-            textposition='outside'
-        )])
-        
-        fig.update_layout(
-            title=dict(text="Customer Segmentation (RFM)", font=dict(size=15, color='#1a1a1a')),
-            height=350,
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            xaxis=dict(showgrid=False, tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            yaxis=dict(showgrid=True, gridcolor='#f0f0f0', title="Customers", tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            font=dict(family="Arial, sans-serif", size=11, color='#1a1a1a'),
-            margin=dict(l=50, r=50, t=50, b=50)
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        plot("rfm_segments", rfm_data)
     
     with col2:
-        fig = go.Figure(data=[go.Histogram(
-            x=rfm_data["Recency"],
-            nbinsx=30,
-            marker=dict(color='#667eea', line=dict(color='white', width=1))
-        )])
-        
-        fig.update_layout(
-            title=dict(text="Recency Distribution (Days)", font=dict(size=15, color='#1a1a1a')),
-            height=350,
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            xaxis=dict(title="Days Since Last Order", tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            yaxis=dict(title="Customers", tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            font=dict(family="Arial, sans-serif", size=11, color='#1a1a1a'),
-            margin=dict(l=50, r=50, t=50, b=50)
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        plot("recency_histogram", rfm_data)
     
     with col3:
-        fig = go.Figure()
-        
-        fig.add_trace(go.Scatter(
-            x=rfm_data["Frequency"],
-            y=rfm_data["Monetary"],
-            mode='markers',
-            marker=dict(
-                size=rfm_data["RFM_Total"] * 2,
-                color=rfm_data["RFM_Total"],
-                colorscale='Viridis',
-                showscale=True,
-                colorbar=dict(title="RFM Score"),
-                line=dict(color='white', width=0.5)
-            ),
-            text=rfm_data["Customer ID"],
-            hovertemplate='<b>%{text}</b><br>Orders: %{x}<br>Revenue: ₹%{y:,.0f}<extra></extra>'
-        ))
+        plot("rfm_scatter", rfm_data)
+
+# ---------------- COHORT RETENTION ----------------
+profiler.start("COHORTS", rows=view_rows)
+st.markdown('<div class="section-header">📅 Cohort Retention</div>', unsafe_allow_html=True)
+
+@st.fragment
+def render_cohorts(cohort_slice):
+    if len(cohort_slice) > 0:
+        col1, col2 = st.columns([3, 2])
         
-        fig.update_layout(
-            title=dict(text="Frequency vs Monetary Value", font=dict(size=15, color='#1a1a1a')),
-            height=350,
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            xaxis=dict(showgrid=True, gridcolor='#f0f0f0', title="Frequency (Orders)", tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            yaxis=dict(showgrid=True, gridcolor='#f0f0f0', title="Monetary (₹)", tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            font=dict(family="Arial, sans-serif", size=11, color='#1a1a1a'),
-            margin=dict(l=50, r=50, t=50, b=50)
-        )
+        with col1:
+            cohort_counts = cohort_slice.groupby(["Cohort", "Period"])["Customers"].sum().unstack(fill_value=0)
+            cohort_sizes = cohort_counts[0] if 0 in cohort_counts.columns else cohort_counts.iloc[:, 0]
+            retention = cohort_counts.div(cohort_sizes, axis=0) * 100
+            
+            plot("retention_heatmap", retention, cohort_counts)
         
-        st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            cohort_split = st.radio(
+                "Split Repeat Rate By",
+                ["None", "Payment Type", "City Tier"],
+                horizontal=True
+            )
+            split_by = cohort_split if cohort_split != "None" and cohort_split in cohort_slice.columns else None
+            curve = retention_curve(cohort_slice, by=split_by)
+            curve = curve[curve["Period"] > 0]
+            
+            plot("retention_curves", curve, split_by)
+    else:
+        st.info("No cohorts in the selected range")
+
+cohort_matrix = load_cohort_matrix(merchant, version) if "Customer ID" in df.columns else None
+
+if cohort_matrix is not None:
+    cohort_slice = slice_cohorts(cohort_matrix, filters)
+    profiler.add_rows(len(cohort_slice))
+    st.caption("Customers are grouped by the month, payment type and city tier of their first order. Status and UTM filters do not apply.")
+    
+    render_cohorts(cohort_slice)
 
 # ---------------- ROW 6: PRODUCTS & PAYMENT MIX ----------------
+profiler.start("ROW 6", rows=view_rows)
 st.markdown('<div class="section-header">🛍️ Product-Level Analysis</div>', unsafe_allow_html=True)
 
-if "Product Name" in filtered.columns:
-    # Split products that are pipe-separated
-    product_exploded = filtered.copy()
-    
-    # Check if products are separated by pipes
-    product_exploded["Product Name"] = product_exploded["Product Name"].astype(str)
-    
-    # Split by pipe and explode
-    product_exploded["Product Name"] = product_exploded["Product Name"].str.split('|')
-    product_exploded = product_exploded.explode("Product Name")
-    product_exploded["Product Name"] = product_exploded["Product Name"].str.strip()
-    
-    # Remove empty or NaN products
-    product_exploded = product_exploded[product_exploded["Product Name"].notna()]
-    product_exploded = product_exploded[product_exploded["Product Name"] != '']
-    product_exploded = product_exploded[product_exploded["Product Name"] != 'nan']
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # Count each product occurrence (line-item level)
-        product_data = product_exploded.groupby("Product Name").agg({
-            "Order Number": "count",
-            "Grand Total": "sum"
-        }).reset_index()
-        product_data.columns = ["Product", "Units Sold", "Revenue"]
-        product_data = product_data.sort_values("Units Sold", ascending=False).head(10)
+if "Product Name" in df.columns and filtered is None:
+    st.info(PREVIEW_PENDING)
+elif "Product Name" in df.columns and not use_topk and below_fold("products") is None:
+    st.info(PREVIEW_PENDING if preview is not None else BELOW_FOLD_PENDING)
+elif "Product Name" in df.columns:
+    if use_topk:
+        # Rankings merged from the per-day product summaries
+        product_summaries = topk_window(load_rollup(merchant, version, TOPK_SUMMARIES), "Product Name", filters)
+        profiler.add_rows(len(product_summaries))
+        top_products_all = merge_topk(product_summaries, topk_keys)
         
-        fig = go.Figure(data=[go.Bar(
-            x=product_data["Product"],
-            y=product_data["Units Sold"],
-            marker=dict(color=product_data["Revenue"], colorscale='Viridis', showscale=True, colorbar=dict(title="Revenue (₹)")),
-            text=product_data["Units Sold"],
-            textposition='outside'
-        )])
+        product_data = top_products_all.head(10)[["Count", "Revenue"]].rename_axis("Product").reset_index()
+        product_data.columns = ["Product", "Units Sold", "Revenue"]
         
-        fig.update_layout(
-            title=dict(text="Top 10 Products by Units Sold", font=dict(size=16, color='#1a1a1a')),
-            height=400,
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            xaxis=dict(showgrid=False, tickangle=-45, tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            yaxis=dict(showgrid=True, gridcolor='#f0f0f0', title="Units Sold", tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            font=dict(family="Arial, sans-serif", size=12, color='#1a1a1a'),
-            margin=dict(l=60, r=60, t=60, b=120)
+        top_products = top_products_all.index[:8].tolist()
+        product_payment = (
+            product_summaries[product_summaries["Item"].isin(top_products)]
+            .groupby(["Item", "Payment Type"])["Count"].sum().reset_index()
         )
+        product_payment.columns = ["Product Name", "Payment Type", "Count"]
         
-        st.plotly_chart(fig, use_container_width=True)
+        product_detail = top_products_all.head(15)[["Count", "Orders", "Revenue"]].rename_axis("Product Name").reset_index()
+        product_detail.columns = ["Product Name", "Units Sold", "Unique Orders", "Total Revenue"]
+        product_detail["Avg Revenue per Unit"] = product_detail["Total Revenue"] / product_detail["Units Sold"]
+        product_note = f"Merged from daily top-{TOPK_CAPACITY} summaries; each count may be low by at most {top_products_all['Error'].head(15).max():,} units"
+    else:
+        products = below_fold("products")
+        profiler.add_rows(products["lines"])
+        product_data = products["data"]
+        product_payment = products["payment"]
+        product_detail = products["detail"]
+        product_note = None
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        plot("top_products", product_data)
     
     with col2:
-        # Product payment split
-        product_payment = product_exploded.groupby(["Product Name", "Payment Type"]).size().reset_index(name='Count')
-        
-        top_products = product_exploded.groupby("Product Name").size().nlargest(8).index.tolist()
-        product_payment = product_payment[product_payment["Product Name"].isin(top_products)]
-        
-        fig = go.Figure()
-        
-        for payment_type in ["Prepaid", "COD"]:
-            data = product_payment[product_payment["Payment Type"] == payment_type]
-            fig.add_trace(go.Bar(
-                name=payment_type,
-                x=data["Product Name"],
-                y=data["Count"],
-                marker=dict(color='#4facfe' if payment_type == "Prepaid" else '#f093fb')
-            ))
-        
-        fig.update_layout(
-            title=dict(text="Product-wise Payment Split (Top 8)", font=dict(size=16, color='#1a1a1a')),
-            height=400,
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            barmode='stack',
-            xaxis=dict(showgrid=False, tickangle=-45, tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            yaxis=dict(showgrid=True, gridcolor='#f0f0f0', title="Units Sold", tickfont=dict(color='#1a1a1a'), title_font=dict(color='#1a1a1a')),
-            font=dict(family="Arial, sans-serif", size=11, color='#1a1a1a'),
-            margin=dict(l=60, r=60, t=60, b=120),
-            showlegend=True,
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, font=dict(color='#1a1a1a'))
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        plot("product_payment_chart", product_payment)
     
     # Product performance table
     st.markdown("#### 📊 Detailed Product Performance")
+    if product_note:
+        st.caption(product_note)
     
-    product_detail = product_exploded.groupby("Product Name").agg({
-        "Order Number": ["count", "nunique"],
-        "Grand Total": "sum"
-    }).reset_index()
-    
-    product_detail.columns = ["Product Name", "Units Sold", "Unique Orders", "Total Revenue"]
-    product_detail["Avg Revenue per Unit"] = product_detail["Total Revenue"] / product_detail["Units Sold"]
-    product_detail = product_detail.sort_values("Units Sold", ascending=False).head(15)
-    
-    st.dataframe(
-        product_detail.style.format({
-            "Units Sold": "{:,.0f}",
-            "Unique Orders": "{:,.0f}",
-            "Total Revenue": "₹{:,.0f}",
-            "Avg Revenue per Unit": "₹{:,.0f}"
-        }),
-        use_container_width=True,
-        height=400,
-        hide_index=True
+    render_table(
+        product_detail,
+        {"Units Sold": COUNT, "Unique Orders": COUNT, "Total Revenue": CURRENCY, "Avg Revenue per Unit": CURRENCY},
+        height=400
     )
 # ---------------- DATA TABLE ----------------
+profiler.start("DATA TABLE", rows=view_rows)
 st.markdown('<div class="section-header">📋 Detailed Order Data</div>', unsafe_allow_html=True)
 
 display_cols = [
@@ -1123,39 +795,59 @@ display_cols = [
     "Grand Total", "Customer ID", "Billing State", "Billing City", 
     "Billing Pincode", "City Tier", "Product Name", "Utm Source", "Utm Campaign", "Utm Content"
 ]
-display_cols = [col for col in display_cols if col in filtered.columns]
-
-st.dataframe(
-    filtered[display_cols].style.format({
-        "Grand Total": "₹{:,.0f}",
-        "Order Date": lambda x: x.strftime("%d %b %Y") if pd.notnull(x) else ""
-    }),
-    use_container_width=True,
-    height=400
-)
+display_cols = [col for col in display_cols if col in df.columns]
+
+if filtered is None:
+    st.info(PREVIEW_PENDING)
+elif st.toggle(f"Show {len(filtered):,} orders", key="show_orders"):
+    # Rows are only sent to the browser once asked for
+    render_table(
+        filtered[display_cols],
+        {"Grand Total": CURRENCY, "Order Date": DATE},
+        height=400,
+        hide_index=False
+    )
 
 # ---------------- DOWNLOAD ----------------
+profiler.start("DOWNLOAD", rows=view_rows)
 st.markdown('<div class="section-header">⬇️ Export Data</div>', unsafe_allow_html=True)
 
-col1, col2, col3 = st.columns([1, 1, 2])
+@st.fragment
+def render_downloads(filtered, export_key):
+    # Serialized only once asked for, then kept for this filter state and
+    # shared by both buttons rather than holding two copies
+    if st.session_state.get("export_key") != export_key:
+        st.session_state.pop("export", None)
+        if not st.button(f"📦 Prepare export of {len(filtered):,} orders"):
+            return
+        st.session_state["export"] = filtered.drop(columns=["__last_updated__"], errors='ignore').to_csv(index=False)
+        st.session_state["export_key"] = export_key
+    export = st.session_state["export"]
+    
+    col1, col2, col3 = st.columns([1, 1, 2])
 
-with col1:
-    st.download_button(
-        "📥 Download CSV",
-        filtered.drop(columns=["__last_updated__"], errors='ignore').to_csv(index=False),
-        file_name=f"gokwik_data_{datetime.now().strftime('%Y%m%d')}.csv",
-        mime="text/csv",
-        use_container_width=True
-    )
+    with col1:
+        st.download_button(
+            "📥 Download CSV",
+            export,
+            file_name=f"gokwik_data_{datetime.now().strftime('%Y%m%d')}.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
 
-with col2:
-    st.download_button(
-        "📊 Download Excel",
-        filtered.drop(columns=["__last_updated__"], errors='ignore').to_csv(index=False),
-        file_name=f"gokwik_data_{datetime.now().strftime('%Y%m%d')}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        use_container_width=True
-    )
+    with col2:
+        st.download_button(
+            "📊 Download Excel",
+            export,
+            file_name=f"gokwik_data_{datetime.now().strftime('%Y%m%d')}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True
+        )
+
+if filtered is None:
+    st.info(PREVIEW_PENDING)
+else:
+    render_downloads(filtered, (merchant, version, filter_key(filters)))
 
 # Footer
 st.markdown("---")
@@ -1164,3 +856,23 @@ st.markdown("""
     <p>GoKwik Order Analytics Dashboard | Built with Streamlit & Plotly</p>
 </div>
 """, unsafe_allow_html=True)
+
+# ---------------- PROFILING ----------------
+profile_records = profiler.finish()
+if profile_records:
+    with st.expander("🐞 Section Profile", expanded=False):
+        profile_df = pd.DataFrame(profile_records)
+        slow_sections = profile_df.loc[profile_df["slow"], "section"].tolist()
+        if slow_sections:
+            st.warning(f"Slow sections: {', '.join(slow_sections)}")
+        st.dataframe(
+            profile_df[["section", "wall_ms", "rows", "peak_mem_kb", "payload_kb", "threshold_ms", "slow"]],
+            use_container_width=True,
+            hide_index=True
+        )
+        first_paint = profiler.milestones.get("first_paint", {}).get("ms")
+        st.caption(
+            f"Run {profiler.run_id} · total {profile_df['wall_ms'].sum():,.0f} ms"
+            + (f" · first paint {first_paint:,.0f} ms" if first_paint is not None else "")
+            + f" · logged to {profiler.log_path}"
+        )
@@ -0,0 +1,135 @@
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+DEFAULT_BUDGET_MB = float(os.environ.get("GOKWIK_CACHE_MB", 1024))
+DEFAULT_IDLE_MINUTES = float(os.environ.get("GOKWIK_CACHE_IDLE_MIN", 30))
+
+# Share of the budget above which spillable entries are no longer kept and
+# callers switch to their streamed paths
+DEFAULT_PRESSURE = float(os.environ.get("GOKWIK_CACHE_PRESSURE", 0.8))
+
+
+def estimate_bytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, dict):
+        return sum(estimate_bytes(v) for v in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_bytes(v) for v in value)
+    if isinstance(value, (str, bytes, bytearray)):
+        # Prepared exports (CSV text) are often a session's largest value
+        return sys.getsizeof(value)
+    # numpy arrays, cached figures and anything else that reports its size
+    return int(getattr(value, "nbytes", 0) or 0)
+
+
+class MerchantCache:
+    """Process-wide cache of per-merchant tables with a fair-share memory budget.
+
+    Entries are keyed by (merchant, name) and tagged with the dataset version
+    they were loaded from. Merchants idle for longer than ``idle_seconds`` are
+    dropped first; after that, while the cache is over budget, the merchant
+    furthest above its equal share loses its least recently used entry.
+
+    Each entry belongs to a component (dataset, rollups, sections) for usage
+    reporting. Once usage passes ``pressure`` of the budget, new entries
+    marked spillable are returned without being kept, so large recomputable
+    results stop displacing everything else.
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_MB * 1024 ** 2, idle_seconds=DEFAULT_IDLE_MINUTES * 60,
+                 pressure=DEFAULT_PRESSURE):
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self.pressure = pressure
+        self.spilled = 0
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def get(self, merchant, name, version, loader, component="rollups", spillable=False):
+        """Return the cached table, calling ``loader()`` on a miss or stale version"""
+        key = (merchant, name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["version"] == version:
+                entry["last_used"] = time.monotonic()
+                return entry["value"]
+
+        value = loader()
+        size = estimate_bytes(value)
+        with self._lock:
+            if spillable and self._total() + size > self.budget_bytes * self.pressure:
+                self._entries.pop(key, None)
+                self.spilled += 1
+                return value
+            self._entries[key] = {
+                "value": value,
+                "version": version,
+                "bytes": size,
+                "component": component,
+                "last_used": time.monotonic(),
+            }
+            self._enforce(protect=merchant)
+        return value
+
+    def contains(self, merchant, name, version):
+        with self._lock:
+            entry = self._entries.get((merchant, name))
+            return entry is not None and entry["version"] == version
+
+    def peek(self, merchant, name, version):
+        """Cached table if present and current, without loading or touching it"""
+        with self._lock:
+            entry = self._entries.get((merchant, name))
+            return entry["value"] if entry and entry["version"] == version else None
+
+    def invalidate(self, merchant):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == merchant]:
+                del self._entries[key]
+
+    def usage(self):
+        """Bytes held per merchant"""
+        with self._lock:
+            totals = {}
+            for (merchant, _), entry in self._entries.items():
+                totals[merchant] = totals.get(merchant, 0) + entry["bytes"]
+            return totals
+
+    def usage_by_component(self):
+        """Bytes held per component"""
+        with self._lock:
+            totals = {}
+            for entry in self._entries.values():
+                totals[entry["component"]] = totals.get(entry["component"], 0) + entry["bytes"]
+            return totals
+
+    def under_pressure(self):
+        """Whether callers should prefer streamed, uncached paths"""
+        with self._lock:
+            return self._total() > self.budget_bytes * self.pressure
+
+    def _total(self):
+        return sum(entry["bytes"] for entry in self._entries.values())
+
+    def _enforce(self, protect):
+        now = time.monotonic()
+        for key, entry in list(self._entries.items()):
+            if key[0] != protect and now - entry["last_used"] > self.idle_seconds:
+                del self._entries[key]
+
+        while True:
+            usage = self.usage()
+            total = sum(usage.values())
+            if total <= self.budget_bytes or len(self._entries) <= 1:
+                return
+            share = self.budget_bytes / len(usage)
+            merchant = max(usage, key=lambda m: usage[m] - share)
+            victims = [k for k in self._entries if k[0] == merchant]
+            lru = min(victims, key=lambda k: self._entries[k]["last_used"])
+            del self._entries[lru]
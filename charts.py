@@ -0,0 +1,402 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
+
+TEXT = "#1a1a1a"
+GRID = "#f0f0f0"
+PREPAID = "#4facfe"
+COD = "#f093fb"
+PAYMENT_COLORS = {"Prepaid": PREPAID, "COD": COD}
+SEGMENT_COLORS = {
+    "Champions": "#43e97b",
+    "Loyal": "#30cfd0",
+    "Potential": "#fee140",
+    "At Risk": "#fa709a",
+    "Lost": "#f093fb",
+}
+HORIZONTAL_LEGEND = dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+
+# Styling shared by every chart, registered once per process. It replaces
+# plotly's default template, so figures also stop carrying that template's
+# several kilobytes of unused trace defaults in every payload
+pio.templates["gokwik"] = go.layout.Template(layout=dict(
+    font=dict(family="Arial, sans-serif", size=12, color=TEXT),
+    title=dict(font=dict(size=16, color=TEXT)),
+    height=400,
+    plot_bgcolor="white",
+    paper_bgcolor="white",
+    margin=dict(l=60, r=60, t=60, b=60),
+    xaxis=dict(gridcolor=GRID, tickfont=dict(color=TEXT), title_font=dict(color=TEXT)),
+    yaxis=dict(gridcolor=GRID, tickfont=dict(color=TEXT), title_font=dict(color=TEXT)),
+    legend=dict(font=dict(color=TEXT)),
+))
+TEMPLATE = "gokwik"
+
+
+def _figure(*traces, **layout):
+    fig = go.Figure(data=list(traces))
+    fig.update_layout(template=TEMPLATE, **layout)
+    return fig
+
+
+def _values(column):
+    """Numeric column as a numpy array, which plotly sends base64-encoded"""
+    return column.to_numpy()
+
+
+def trend_chart(daily, time_grain):
+    """Revenue (area) and orders (dotted, secondary axis) per period"""
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    x = daily["Date"].to_numpy()
+    fig.add_trace(
+        go.Scatter(
+            x=x,
+            y=_values(daily["Revenue"]),
+            name="Revenue",
+            line=dict(color='#667eea', width=3),
+            fill='tozeroy',
+            fillcolor='rgba(102, 126, 234, 0.1)'
+        ),
+        secondary_y=False
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=x,
+            y=_values(daily["Orders"]),
+            name="Orders",
+            line=dict(color='#f093fb', width=2, dash='dot'),
+        ),
+        secondary_y=True
+    )
+    fig.update_layout(
+        template=TEMPLATE,
+        title=dict(text=f"{time_grain} Revenue & Orders"),
+        hovermode='x unified'
+    )
+    fig.update_xaxes(showgrid=True)
+    fig.update_yaxes(showgrid=True, secondary_y=False)
+    fig.update_yaxes(showgrid=False, secondary_y=True)
+    return fig
+
+
+def payment_pie(payment_split):
+    return _figure(
+        go.Pie(
+            labels=payment_split["Payment Type"].to_numpy(),
+            values=_values(payment_split["Orders"]),
+            hole=0.5,
+            marker=dict(colors=[PREPAID, COD]),
+            textinfo='label+percent+value',
+            textfont_size=16,
+            textfont_color='white',
+            textposition='inside'
+        ),
+        title=dict(text="Payment Split"),
+        showlegend=False,
+        font=dict(size=14),
+        margin=dict(l=20, r=20, t=60, b=20)
+    )
+
+
+def state_map(data, geojson, metric, level_name):
+    """Choropleth of Orders or Revenue per Region, with geometry loaded by URL"""
+    fig = _figure(
+        go.Choropleth(
+            geojson=geojson,
+            featureidkey="id",
+            locations=data["Region"].to_numpy(),
+            z=_values(data[metric]),
+            colorscale='Blues',
+            marker_line_color='white',
+            marker_line_width=0.5,
+            colorbar=dict(title="Revenue (₹)" if metric == "Revenue" else "Orders"),
+            customdata=data[["Orders", "Revenue"]].to_numpy(),
+            hovertemplate='<b>%{location}</b><br>Orders: %{customdata[0]:,}<br>Revenue: ₹%{customdata[1]:,.0f}<extra></extra>'
+        ),
+        title=dict(text=f"{metric} by {level_name}", font=dict(size=20), x=0.02, xanchor='left'),
+        height=600,
+        margin=dict(l=0, r=0, t=60, b=0)
+    )
+    fig.update_geos(fitbounds="geojson", visible=False)
+    return fig
+
+
+def state_bar(state_data, n=15):
+    """Top states by orders, used when no map geometry is built"""
+    top = state_data.head(n)
+    orders = _values(top["Orders"])
+    return _figure(
+        go.Bar(
+            y=top["State"].to_numpy(),
+            x=orders,
+            orientation='h',
+            marker=dict(color=orders, colorscale='Blues', showscale=True, colorbar=dict(title="Orders", x=1.15)),
+            texttemplate='%{x:,}',
+            textposition='outside',
+            hovertemplate='<b>%{y}</b><br>Orders: %{x:,}<br>Revenue: ₹%{customdata:,.0f}<extra></extra>',
+            customdata=_values(top["Revenue"]),
+            error_x=dict(type='data', array=_values(top["Orders ±"]), color='#999') if "Orders ±" in top.columns else None
+        ),
+        title=dict(text=f'Top {n} States by Orders', font=dict(size=20), x=0.02, xanchor='left'),
+        height=600,
+        xaxis=dict(showgrid=True, title="Number of Orders"),
+        yaxis=dict(showgrid=False, tickfont=dict(size=11)),
+        margin=dict(l=150, r=150, t=60, b=60)
+    )
+
+
+def top_states_chart(state_data, metric, n=10):
+    top = state_data.sort_values(metric, ascending=True).tail(n)
+    values = _values(top[metric])
+    return _figure(
+        go.Bar(
+            x=values,
+            y=top["State"].to_numpy(),
+            orientation='h',
+            marker=dict(color=values, colorscale='Viridis', showscale=False),
+            texttemplate='₹%{x:,.0f}' if metric == "Revenue" else '%{x:,}',
+            textposition='outside',
+            error_x=dict(type='data', array=_values(top[f"{metric} ±"]), color='#999') if f"{metric} ±" in top.columns else None
+        ),
+        title=dict(text=f"Top {n} States by {metric}"),
+        xaxis=dict(showgrid=True),
+        yaxis=dict(showgrid=False)
+    )
+
+
+def lifecycle_chart(lifecycle, group_col, metric):
+    """Cancellation or RTO rate per group, Prepaid and COD side by side"""
+    traces = []
+    for payment_type in ["Prepaid", "COD"]:
+        data = lifecycle[lifecycle["Payment Type"] == payment_type]
+        traces.append(go.Bar(
+            name=payment_type,
+            x=data[group_col].to_numpy(),
+            y=_values(data[metric]),
+            texttemplate='%{y:.1f}%',
+            textposition='outside',
+            marker=dict(color=PAYMENT_COLORS[payment_type])
+        ))
+    return _figure(
+        *traces,
+        title=dict(text=f"{metric.replace(' %', ' Rate')} by {group_col}"),
+        barmode='group',
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=True, title="% of Orders"),
+        legend=HORIZONTAL_LEGEND
+    )
+
+
+def rfm_segments(rfm_data):
+    segment_counts = rfm_data["Segment"].value_counts()
+    return _figure(
+        go.Bar(
+            x=segment_counts.index.to_numpy(),
+            y=segment_counts.to_numpy(),
+            marker=dict(color=[SEGMENT_COLORS.get(seg, "#667eea") for seg in segment_counts.index]),
+            texttemplate='%{y:,}',
+            textposition='outside'
+        ),
+        title=dict(text="Customer Segmentation (RFM)", font=dict(size=15)),
+        height=350,
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=True, title="Customers"),
+        font=dict(size=11),
+        margin=dict(l=50, r=50, t=50, b=50)
+    )
+
+
+def recency_histogram(rfm_data):
+    return _figure(
+        go.Histogram(
+            x=_values(rfm_data["Recency"]),
+            nbinsx=30,
+            marker=dict(color='#667eea', line=dict(color='white', width=1))
+        ),
+        title=dict(text="Recency Distribution (Days)", font=dict(size=15)),
+        height=350,
+        xaxis=dict(showgrid=False, title="Days Since Last Order"),
+        yaxis=dict(showgrid=False, title="Customers"),
+        font=dict(size=11),
+        margin=dict(l=50, r=50, t=50, b=50)
+    )
+
+
+def rfm_scatter(rfm_data):
+    score = _values(rfm_data["RFM_Total"])
+    return _figure(
+        go.Scatter(
+            x=_values(rfm_data["Frequency"]),
+            y=_values(rfm_data["Monetary"]),
+            mode='markers',
+            marker=dict(
+                size=score * 2,
+                color=score,
+                colorscale='Viridis',
+                showscale=True,
+                colorbar=dict(title="RFM Score"),
+                line=dict(color='white', width=0.5)
+            ),
+            text=rfm_data["Customer ID"].to_numpy(),
+            hovertemplate='<b>%{text}</b><br>Orders: %{x}<br>Revenue: ₹%{y:,.0f}<extra></extra>'
+        ),
+        title=dict(text="Frequency vs Monetary Value", font=dict(size=15)),
+        height=350,
+        xaxis=dict(showgrid=True, title="Frequency (Orders)"),
+        yaxis=dict(showgrid=True, title="Monetary (₹)"),
+        font=dict(size=11),
+        margin=dict(l=50, r=50, t=50, b=50)
+    )
+
+
+def retention_heatmap(retention, cohort_counts):
+    return _figure(
+        go.Heatmap(
+            z=retention.to_numpy(),
+            x=retention.columns.to_numpy(),
+            y=retention.index.strftime("%b %Y").to_numpy(),
+            colorscale='Blues',
+            colorbar=dict(title="Active %"),
+            customdata=cohort_counts.to_numpy(),
+            hovertemplate='<b>%{y}</b><br>Month %{x}: %{z:.1f}%<br>Customers: %{customdata:,}<extra></extra>'
+        ),
+        title=dict(text="Monthly Cohorts: % of Customers Active"),
+        height=450,
+        xaxis=dict(showgrid=False, title="Months Since First Order"),
+        yaxis=dict(showgrid=False, autorange='reversed'),
+        margin=dict(l=80, r=60, t=60, b=60)
+    )
+
+
+def retention_curves(curve, split_by=None):
+    groups = curve.groupby(split_by) if split_by else [("All Customers", curve)]
+    traces = [
+        go.Scatter(x=_values(data["Period"]), y=_values(data["Retention"]), name=str(name), mode='lines+markers')
+        for name, data in groups
+    ]
+    return _figure(
+        *traces,
+        title=dict(text="Repeat Rate by Months Since First Order"),
+        xaxis=dict(showgrid=False, title="Months Since First Order"),
+        yaxis=dict(showgrid=True, title="Customers Returning (%)"),
+        legend=HORIZONTAL_LEGEND
+    )
+
+
+def top_products(product_data):
+    return _figure(
+        go.Bar(
+            x=product_data["Product"].to_numpy(),
+            y=_values(product_data["Units Sold"]),
+            marker=dict(color=_values(product_data["Revenue"]), colorscale='Viridis', showscale=True, colorbar=dict(title="Revenue (₹)")),
+            texttemplate='%{y:,}',
+            textposition='outside'
+        ),
+        title=dict(text="Top 10 Products by Units Sold"),
+        xaxis=dict(showgrid=False, tickangle=-45),
+        yaxis=dict(showgrid=True, title="Units Sold"),
+        margin=dict(l=60, r=60, t=60, b=120)
+    )
+
+
+def product_payment_chart(product_payment):
+    traces = []
+    for payment_type in ["Prepaid", "COD"]:
+        data = product_payment[product_payment["Payment Type"] == payment_type]
+        traces.append(go.Bar(
+            name=payment_type,
+            x=data["Product Name"].to_numpy(),
+            y=_values(data["Count"]),
+            marker=dict(color=PAYMENT_COLORS[payment_type])
+        ))
+    return _figure(
+        *traces,
+        title=dict(text="Product-wise Payment Split (Top 8)"),
+        barmode='stack',
+        xaxis=dict(showgrid=False, tickangle=-45),
+        yaxis=dict(showgrid=True, title="Units Sold"),
+        font=dict(size=11),
+        margin=dict(l=60, r=60, t=60, b=120),
+        showlegend=True,
+        legend=HORIZONTAL_LEGEND
+    )
+
+
+def _hash_into(digest, value):
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((list(value.columns), list(value.dtypes.astype(str)))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, (pd.Series, pd.Index)):
+        digest.update(repr((value.name, str(value.dtype))).encode())
+        digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"[")
+        for item in value:
+            _hash_into(digest, item)
+        digest.update(b"]")
+    else:
+        digest.update(repr(value).encode())
+    digest.update(b"|")
+
+
+def fingerprint(*args, **kwargs):
+    """Hash of a builder's inputs: data values, column names and dtypes, and other arguments"""
+    digest = hashlib.sha1()
+    for value in args:
+        _hash_into(digest, value)
+    for name in sorted(kwargs):
+        _hash_into(digest, (name, kwargs[name]))
+    return digest.hexdigest()
+
+
+def _value_bytes(value):
+    if isinstance(value, dict):
+        return sum(_value_bytes(v) for v in value.values())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        if value and isinstance(value[0], (dict, list, tuple, str)):
+            return sum(_value_bytes(v) for v in value)
+        return 8 * len(value)
+    return 8
+
+
+def payload_bytes(figure):
+    """Approximate payload size of a figure's traces, summed from their arrays without serializing them"""
+    return sum(_value_bytes(trace.to_plotly_json()) for trace in figure.data)
+
+
+class CachedFigure:
+    """A built figure and its approximate payload size, which is what the cache budgets"""
+
+    __slots__ = ("figure", "nbytes")
+
+    def __init__(self, figure):
+        self.figure = figure
+        self.nbytes = payload_bytes(figure)
+
+
+def cached_figure(cache, merchant, version, builder, *args, **kwargs):
+    """The figure ``builder(*args, **kwargs)`` makes, kept in the merchant cache.
+
+    Figures are keyed by builder and input fingerprint under the "figures"
+    component, so reruns with unchanged aggregates skip trace construction,
+    validation and styling, and the memory budget governs them like any other
+    entry (under pressure they are not kept). Only building is saved:
+    st.plotly_chart still serializes the figure on every render. Cached
+    figures are shared across sessions and must not be mutated.
+    """
+    key = ("figure", builder.__name__, fingerprint(*args, **kwargs))
+    return cache.get(
+        merchant, key, version, lambda: CachedFigure(builder(*args, **kwargs)),
+        component="figures", spillable=True
+    )
@@ -0,0 +1,155 @@
+"""Headless ingest for the GoKwik dashboard.
+
+    python cli.py --merchant acme ingest reports/ extra.csv [--replace]
+    python cli.py --merchant acme precompute
+    python cli.py pincodes [master.csv]
+    python cli.py geo states.geojson [--layer districts]
+    python cli.py --merchant acme report [--preset last_7_days] [--all-merchants]
+"""
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from aggregates import write_rollups
+from cohorts import build_cohorts
+from geo import GEO_LAYERS, GEO_LEVELS, build_geometries
+from pincodes import PINCODE_MASTER, compile_pincode_master
+from reports import load_presets, render_reports
+from ingest import (
+    DEFAULT_MERCHANT,
+    MissingColumnsError,
+    bump_dataset_version,
+    clean_orders,
+    collect_files,
+    list_merchants,
+    load_dataset,
+    merchant_slug,
+    migrate_legacy_dataset,
+    read_file,
+    refresh_statuses,
+    rollup_dir,
+    save_partitions,
+    store_orders,
+)
+
+
+def log(message):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+def cmd_ingest(args):
+    files = collect_files(args.paths)
+    if not files:
+        log("No .csv or .xlsx files found")
+        return 1
+
+    frames = []
+    for path in files:
+        try:
+            frames.append(clean_orders(read_file(path)))
+            log(f"Read {path}: {len(frames[-1]):,} orders")
+        except MissingColumnsError as e:
+            log(f"Skipped {path}: {e}")
+
+    if not frames:
+        log("No valid order reports to ingest")
+        return 1
+
+    df = pd.concat(frames, ignore_index=True)
+    if args.skip_precompute:
+        save_partitions(df, args.merchant, replace=args.replace)
+    else:
+        store_orders(df, args.merchant, replace=args.replace)
+        log("Rollups and cohorts precomputed")
+    log(f"Stored {len(df):,} orders for merchant '{args.merchant}'")
+    return 0
+
+
+def cmd_precompute(args):
+    # Stores the Status Flags of the current status map and rules, so edits to
+    # either reach the partitions, the KPIs and the rollups below
+    rewritten = refresh_statuses(args.merchant)
+    # New version next: snapshots and cached sections built from the old
+    # rollups stop matching, and the rollups below are written after it
+    if bump_dataset_version(args.merchant) is None:
+        log(f"No dataset for merchant '{args.merchant}'")
+        return 1
+    if rewritten:
+        log(f"Updated order statuses in {rewritten} partitions")
+    df = load_dataset(args.merchant)
+    write_rollups(df, rollup_dir(args.merchant))
+    build_cohorts(df, rollup_dir(args.merchant))
+    log(f"Rollups and cohorts precomputed for {len(df):,} orders")
+    return 0
+
+
+def cmd_pincodes(args):
+    count = compile_pincode_master(args.source)
+    log(f"Compiled {count:,} pincodes from {args.source}")
+    return 0
+
+
+def cmd_geo(args):
+    count = build_geometries(args.source, layer=args.layer, name_field=args.name_field, state_field=args.state_field)
+    log(f"Wrote {count:,} {args.layer} at {', '.join(GEO_LEVELS)} detail from {args.source}")
+    return 0
+
+
+def cmd_report(args):
+    presets = load_presets()
+    if args.preset:
+        unknown = sorted(set(args.preset) - set(presets))
+        if unknown:
+            log(f"Unknown presets: {', '.join(unknown)} (available: {', '.join(presets)})")
+            return 1
+        presets = {name: presets[name] for name in args.preset}
+
+    merchants = list_merchants() if args.all_merchants else [args.merchant]
+    rendered = 0
+    for merchant in merchants:
+        count = render_reports(merchant, presets, log=log)
+        if not count:
+            log(f"No dataset for merchant '{merchant}'")
+        rendered += count
+    return 0 if rendered else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GoKwik dashboard ingest")
+    parser.add_argument("--merchant", type=merchant_slug, default=DEFAULT_MERCHANT)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Clean order reports into the merchant's partitions")
+    ingest.add_argument("paths", nargs="+", help="CSV/XLSX files or directories")
+    ingest.add_argument("--replace", action="store_true", help="Drop the merchant's existing partitions instead of upserting")
+    ingest.add_argument("--skip-precompute", action="store_true")
+    ingest.set_defaults(func=cmd_ingest)
+
+    precompute = sub.add_parser("precompute", help="Rebuild rollups for the stored dataset")
+    precompute.set_defaults(func=cmd_precompute)
+
+    pincodes = sub.add_parser("pincodes", help="Compile the pincode master into the memory-mapped lookup")
+    pincodes.add_argument("source", nargs="?", default=PINCODE_MASTER)
+    pincodes.set_defaults(func=cmd_pincodes)
+
+    geo = sub.add_parser("geo", help="Simplify a state or district GeoJSON into the map's zoom levels")
+    geo.add_argument("source", help="GeoJSON with one feature per state or district")
+    geo.add_argument("--layer", choices=list(GEO_LAYERS), default="states")
+    geo.add_argument("--name-field", help="Property holding the state (or district) name")
+    geo.add_argument("--state-field", help="Property holding the state name of a district")
+    geo.set_defaults(func=cmd_geo)
+
+    report = sub.add_parser("report", help="Render preset report snapshots (HTML and CSV) under data/reports")
+    report.add_argument("--preset", nargs="+", help="Presets to render (default: all)")
+    report.add_argument("--all-merchants", action="store_true", help="Render every merchant's reports")
+    report.set_defaults(func=cmd_report)
+
+    args = parser.parse_args(argv)
+    migrate_legacy_dataset()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import os
+
+import pandas as pd
+
+COHORT_CUSTOMERS = "cohort_customers.parquet"
+COHORT_ACTIVITY = "cohort_activity.parquet"
+COHORT_MATRIX = "cohort_matrix.parquet"
+
+# Attributes taken from a customer's first order
+COHORT_DIMENSIONS = ["Payment Type", "City Tier"]
+
+
+def _month_start(dates):
+    return dates.dt.to_period("M").dt.start_time
+
+
+def _month_index(dates):
+    return dates.dt.year * 12 + dates.dt.month
+
+
+def customer_orders(orders):
+    """Orders with a known customer, reduced to the columns cohorts need"""
+    if "Customer ID" not in orders.columns:
+        return None
+    dims = [c for c in COHORT_DIMENSIONS if c in orders.columns]
+    known = orders["Customer ID"].notna() & (orders["Customer ID"] != "Unknown")
+    frame = orders.loc[known, ["Customer ID", "Order Date", "Grand Total"] + dims]
+    return frame.assign(Month=_month_start(frame["Order Date"]))
+
+
+def first_orders(orders):
+    """Acquisition month and first-order attributes per customer"""
+    dims = [c for c in COHORT_DIMENSIONS if c in orders.columns]
+    first = orders.sort_values("Order Date", kind="stable").drop_duplicates("Customer ID")
+    first = first.rename(columns={"Order Date": "First Order", "Month": "Cohort"})
+    return first[["Customer ID", "First Order", "Cohort"] + dims].reset_index(drop=True)
+
+
+def monthly_activity(orders):
+    """Orders and revenue per customer and calendar month"""
+    return orders.groupby(["Customer ID", "Month"]).agg(
+        Orders=("Order Date", "size"),
+        Revenue=("Grand Total", "sum"),
+    ).reset_index()
+
+
+def cohort_matrix(customers, activity):
+    """Active customers, orders and revenue per cohort, period and first-order attributes"""
+    dims = [c for c in COHORT_DIMENSIONS if c in customers.columns]
+    joined = activity.merge(customers, on="Customer ID")
+    joined["Period"] = _month_index(joined["Month"]) - _month_index(joined["Cohort"])
+    return joined.groupby(["Cohort", "Period"] + dims, dropna=False, observed=True).agg(
+        Customers=("Customer ID", "size"),
+        Orders=("Orders", "sum"),
+        Revenue=("Revenue", "sum"),
+    ).reset_index()
+
+
+def _write(tables, rollup_dir):
+    os.makedirs(rollup_dir, exist_ok=True)
+    for name, table in tables.items():
+        table.to_parquet(os.path.join(rollup_dir, name), index=False)
+
+
+def build_cohorts(dataset, rollup_dir):
+    """Rebuild the cohort tables from a merchant's full order history"""
+    orders = customer_orders(dataset)
+    if orders is None:
+        return None
+    customers = first_orders(orders)
+    activity = monthly_activity(orders)
+    matrix = cohort_matrix(customers, activity)
+    _write({COHORT_CUSTOMERS: customers, COHORT_ACTIVITY: activity, COHORT_MATRIX: matrix}, rollup_dir)
+    return matrix
+
+
+def update_cohorts(new_orders, dataset, rollup_dir, replaced_orders=None):
+    """Fold newly ingested orders into the cohort tables.
+
+    Only cohorts that gain or lose a customer are recomputed, from the
+    customer-month activity table rather than from raw orders. Customers of
+    ``replaced_orders`` (re-exported orders, as stored before and after the
+    re-export) are refolded from their full history in ``dataset``, since a
+    re-export can change an order's date, amount or customer. Falls back to a
+    full rebuild when the tables do not exist yet.
+    """
+    paths = {name: os.path.join(rollup_dir, name) for name in (COHORT_CUSTOMERS, COHORT_ACTIVITY, COHORT_MATRIX)}
+    if not all(os.path.exists(p) for p in paths.values()):
+        return build_cohorts(dataset, rollup_dir)
+
+    orders = customer_orders(new_orders)
+    replaced = customer_orders(replaced_orders) if replaced_orders is not None else None
+    rescan = set() if replaced is None else set(replaced["Customer ID"])
+    if (orders is None or orders.empty) and not rescan:
+        # Nothing to fold in, but the tables are still current for the new dataset version
+        for path in paths.values():
+            os.utime(path)
+        return pd.read_parquet(paths[COHORT_MATRIX])
+
+    customers = pd.read_parquet(paths[COHORT_CUSTOMERS])
+    activity = pd.read_parquet(paths[COHORT_ACTIVITY])
+    matrix = pd.read_parquet(paths[COHORT_MATRIX])
+
+    touched_cohorts = set()
+    if rescan:
+        # Drop what is stored for these customers and fold their whole history back in
+        stale = customers["Customer ID"].isin(rescan)
+        touched_cohorts |= set(customers.loc[stale, "Cohort"])
+        customers = customers[~stale]
+        activity = activity[~activity["Customer ID"].isin(rescan)]
+        history = customer_orders(dataset[dataset["Customer ID"].isin(rescan)])
+        if orders is not None:
+            history = pd.concat([orders[~orders["Customer ID"].isin(rescan)], history], ignore_index=True)
+        # A batch without customer IDs can still re-export stored orders that had them
+        orders = history
+
+    new_first = first_orders(orders)
+    affected = customers["Customer ID"].isin(new_first["Customer ID"])
+    merged = (
+        pd.concat([customers[affected], new_first], ignore_index=True)
+        .sort_values("First Order", kind="stable")
+        .drop_duplicates("Customer ID")
+    )
+    touched_cohorts |= set(customers.loc[affected, "Cohort"]) | set(merged["Cohort"])
+    customers = pd.concat([customers[~affected], merged], ignore_index=True)
+
+    active = activity["Customer ID"].isin(new_first["Customer ID"])
+    updated = (
+        pd.concat([activity[active], monthly_activity(orders)], ignore_index=True)
+        .groupby(["Customer ID", "Month"], as_index=False)[["Orders", "Revenue"]].sum()
+    )
+    activity = pd.concat([activity[~active], updated], ignore_index=True)
+
+    members = customers[customers["Cohort"].isin(touched_cohorts)]
+    recomputed = cohort_matrix(members, activity[activity["Customer ID"].isin(members["Customer ID"])])
+    matrix = pd.concat([matrix[~matrix["Cohort"].isin(touched_cohorts)], recomputed], ignore_index=True)
+
+    _write({COHORT_CUSTOMERS: customers, COHORT_ACTIVITY: activity, COHORT_MATRIX: matrix}, rollup_dir)
+    return matrix
+
+
+def slice_cohorts(matrix, filters):
+    """Restrict the cohort matrix to the active payment, tier and date filters"""
+    start, end = filters["date_range"][0], filters["date_range"][-1]
+    mask = (
+        (matrix["Cohort"] >= pd.Timestamp(start).to_period("M").start_time) &
+        (matrix["Cohort"] <= pd.Timestamp(end)) &
+        (matrix["Payment Type"].isin(filters["payment"]))
+    )
+    if filters["tier"] and "City Tier" in matrix.columns:
+        mask &= matrix["City Tier"].isin(filters["tier"])
+    return matrix[mask]
+
+
+def retention_curve(matrix, by=None):
+    """Share of each cohort active N months after acquisition, weighted by cohort size.
+
+    A cohort only counts towards period N once N months of data exist for it.
+    """
+    keys = [by] if by else []
+    latest = (_month_index(matrix["Cohort"]) + matrix["Period"]).max()
+
+    sizes = matrix[matrix["Period"] == 0].groupby(["Cohort"] + keys, dropna=False)["Customers"].sum().rename("Size").reset_index()
+    sizes["Horizon"] = latest - _month_index(sizes["Cohort"])
+    exposure = sizes.loc[sizes.index.repeat(sizes["Horizon"] + 1)]
+    exposure = exposure.assign(Period=exposure.groupby(level=0).cumcount())
+
+    denominator = exposure.groupby(keys + ["Period"], dropna=False)["Size"].sum()
+    numerator = matrix.groupby(keys + ["Period"], dropna=False)["Customers"].sum()
+    return (numerator / denominator * 100).dropna().rename("Retention").reset_index()
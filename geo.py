@@ -0,0 +1,269 @@
+import difflib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Simplified geometries are served by Streamlit's static file server
+# (server.enableStaticServing) so the browser fetches each level once and
+# plotly.js keeps it in memory across reruns; figures only carry the URL. The
+# server looks for static/ next to app.py, whatever the working directory is
+STATIC_GEO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "geo")
+STATIC_GEO_URL = "app/static/geo"
+GEO_LAYERS = {"states": "india_states", "districts": "india_districts"}
+
+# Douglas-Peucker tolerance (degrees) and coordinate decimals per zoom level
+GEO_LEVELS = {
+    "Low": (0.05, 3),
+    "Medium": (0.01, 4),
+    "High": (0.002, 5),
+}
+DEFAULT_GEO_LEVEL = "Medium"
+
+INDIA_STATES = [
+    "Andaman and Nicobar Islands", "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chandigarh",
+    "Chhattisgarh", "Dadra and Nagar Haveli and Daman and Diu", "Delhi", "Goa", "Gujarat", "Haryana",
+    "Himachal Pradesh", "Jammu and Kashmir", "Jharkhand", "Karnataka", "Kerala", "Ladakh", "Lakshadweep",
+    "Madhya Pradesh", "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Puducherry",
+    "Punjab", "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand",
+    "West Bengal",
+]
+
+# Old names, unambiguous abbreviations and common misspellings, keyed by
+# _name_key. Two-letter codes are left out: several are other places or plain
+# words ("uk", "up") or clash between states ("ap"), and a wrong state is worse
+# than an unmatched one
+STATE_ALIASES = {
+    "orissa": "Odisha",
+    "pondicherry": "Puducherry",
+    "uttaranchal": "Uttarakhand",
+    "nct of delhi": "Delhi",
+    "new delhi": "Delhi",
+    "delhi ncr": "Delhi",
+    "jandk": "Jammu and Kashmir",
+    "andaman and nicobar": "Andaman and Nicobar Islands",
+    "dadra and nagar haveli": "Dadra and Nagar Haveli and Daman and Diu",
+    "daman and diu": "Dadra and Nagar Haveli and Daman and Diu",
+    "dnhdd": "Dadra and Nagar Haveli and Daman and Diu",
+    "chattisgarh": "Chhattisgarh",
+    "telengana": "Telangana",
+    "tamilnadu": "Tamil Nadu",
+}
+
+NAME_FIELDS = ["ST_NM", "st_nm", "NAME_1", "state", "State", "name", "NAME"]
+DISTRICT_FIELDS = ["DISTRICT", "district", "NAME_2", "dtname", "District"]
+
+
+def _name_key(name):
+    name = str(name).lower().replace("&", " and ")
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z ]", " ", name)).strip()
+
+
+def normalize_states(values, canonical=INDIA_STATES):
+    """Map messy state spellings onto canonical names.
+
+    Tries an exact match after case and punctuation folding, then the alias
+    table, then a close fuzzy match; anything else is returned title-cased.
+    Only distinct values are matched.
+    """
+    values = pd.Series(values)
+    keys = {_name_key(name): name for name in canonical}
+    aliases = {key: name for key, name in STATE_ALIASES.items() if name in canonical}
+
+    def match(raw):
+        if pd.isna(raw):
+            return raw
+        key = _name_key(raw)
+        if key in keys:
+            return keys[key]
+        if key in aliases or key.replace(" ", "") in aliases:
+            return aliases.get(key) or aliases[key.replace(" ", "")]
+        close = difflib.get_close_matches(key, keys, n=1, cutoff=0.85)
+        return keys[close[0]] if close else str(raw).strip().title()
+
+    uniques = values.dropna().unique()
+    return values.map(dict(zip(uniques, [match(u) for u in uniques])))
+
+
+def geometry_path(layer, level):
+    return os.path.join(STATIC_GEO_DIR, f"{GEO_LAYERS[layer]}_{level.lower()}.geojson")
+
+
+def geometry_url(layer, level):
+    return f"{STATIC_GEO_URL}/{GEO_LAYERS[layer]}_{level.lower()}.geojson"
+
+
+def available_levels(layer):
+    """Zoom levels with a built geometry file for the layer"""
+    return [level for level in GEO_LEVELS if os.path.exists(geometry_path(layer, level))]
+
+
+def geometry_ids(layer, level):
+    """Feature ids of a built geometry file, read once per file version"""
+    path = geometry_path(layer, level)
+    stamp = os.stat(path).st_mtime_ns
+    cached = _ids_cache.get(path)
+    if cached is None or cached[0] != stamp:
+        with open(path) as f:
+            cached = (stamp, [feature["id"] for feature in json.load(f)["features"]])
+        _ids_cache[path] = cached
+    return cached[1]
+
+
+_ids_cache = {}
+
+
+def simplify_line(points, tolerance):
+    """Douglas-Peucker simplification of an (n, 2) array, keeping both endpoints"""
+    if len(points) <= 2:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        lo, hi = stack.pop()
+        if hi - lo < 2:
+            continue
+        start, end = points[lo], points[hi]
+        segment = end - start
+        inner = points[lo + 1:hi] - start
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            mid = lo + 1 + farthest
+            keep[mid] = True
+            stack.extend([(lo, mid), (mid, hi)])
+    return points[keep]
+
+
+def _polygons(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def _ring_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1)))
+
+
+def simplify_features(polygons, tolerance, decimals):
+    """Topology-preserving simplification of {name: [polygon, ...]}.
+
+    Rings are cut into arcs wherever the set of rings sharing a vertex
+    changes, and every arc is simplified once, so neighbouring states keep
+    identical borders with no gaps or overlaps.
+    """
+    rings = {}
+    for name, polys in polygons.items():
+        for p, polygon in enumerate(polys):
+            for r, ring in enumerate(polygon):
+                points = np.round(np.asarray(ring, dtype=np.float64)[:, :2], 6)
+                if len(points) > 1 and (points[0] == points[-1]).all():
+                    points = points[:-1]
+                if len(points) >= 3:
+                    rings[(name, p, r)] = points
+
+    members = {}
+    for ring_id, points in rings.items():
+        for vertex in map(tuple, points):
+            members.setdefault(vertex, set()).add(ring_id)
+
+    simplified_arcs = {}
+
+    def simplify_arc(arc):
+        key = tuple(map(tuple, arc))
+        reverse = key[::-1]
+        canonical = min(key, reverse)
+        if canonical not in simplified_arcs:
+            simplified_arcs[canonical] = simplify_line(np.array(canonical), tolerance)
+        result = simplified_arcs[canonical]
+        return result if canonical == key else result[::-1]
+
+    output = {}
+    for (name, p, r), points in rings.items():
+        n = len(points)
+        sharing = [frozenset(members[tuple(v)]) for v in points]
+        junctions = [i for i in range(n) if sharing[i] != sharing[i - 1] or sharing[i] != sharing[(i + 1) % n]]
+        if not junctions:
+            # No junctions: cut at the lowest vertex and the one farthest from
+            # it, which a hole and the island filling it both pick the same way
+            first = int(np.lexsort((points[:, 1], points[:, 0]))[0])
+            far = int(np.argmax(np.hypot(*(points - points[first]).T)))
+            junctions = sorted({first, far})
+
+        start = junctions[0]
+        ordered = np.concatenate([points[start:], points[:start]])
+        cuts = [j - start if j >= start else j - start + n for j in junctions] + [n]
+        ring_points = [ordered[0]]
+        closed = np.concatenate([ordered, ordered[:1]])
+        for lo, hi in zip(cuts[:-1], cuts[1:]):
+            ring_points.extend(simplify_arc(closed[lo:hi + 1])[1:])
+        ring = np.round(np.array(ring_points), decimals)
+        if len(ring) >= 4:
+            output.setdefault(name, {}).setdefault(p, {})[r] = ring
+
+    features = []
+    for name, polys in polygons.items():
+        shapes = []
+        for p in sorted(output.get(name, {})):
+            rings_out = output[name][p]
+            if 0 not in rings_out:
+                continue
+            shapes.append([rings_out[r].tolist() for r in sorted(rings_out)])
+        if not shapes:
+            # Everything collapsed: keep the largest exterior ring unsimplified
+            exteriors = [np.asarray(poly[0], dtype=np.float64)[:, :2] for poly in polys]
+            largest = max(exteriors, key=_ring_area)
+            shapes = [[np.round(largest, decimals).tolist()]]
+        geometry = {"type": "Polygon", "coordinates": shapes[0]} if len(shapes) == 1 else {"type": "MultiPolygon", "coordinates": shapes}
+        features.append({"type": "Feature", "id": name, "properties": {"name": name}, "geometry": geometry})
+    return features
+
+
+def _field(properties, candidates, override):
+    if override:
+        return properties.get(override)
+    return next((properties[f] for f in candidates if properties.get(f)), None)
+
+
+def build_geometries(source, layer="states", name_field=None, state_field=None):
+    """Write simplified copies of a state or district GeoJSON at every zoom level.
+
+    States are keyed by canonical state name; districts by "District, State".
+    Returns the number of features written per level.
+    """
+    with open(source) as f:
+        collection = json.load(f)
+
+    polygons = {}
+    for feature in collection["features"]:
+        properties = feature.get("properties") or {}
+        state = _field(properties, NAME_FIELDS, state_field if layer == "districts" else name_field)
+        if state is None or not feature.get("geometry"):
+            continue
+        name = normalize_states([state]).iloc[0]
+        if layer == "districts":
+            district = _field(properties, DISTRICT_FIELDS, name_field)
+            if district is None:
+                continue
+            name = f"{str(district).strip().title()}, {name}"
+        polygons.setdefault(name, []).extend(_polygons(feature["geometry"]))
+
+    os.makedirs(STATIC_GEO_DIR, exist_ok=True)
+    for level, (tolerance, decimals) in GEO_LEVELS.items():
+        features = simplify_features(polygons, tolerance, decimals)
+        path = geometry_path(layer, level)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    return len(polygons)
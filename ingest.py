@@ -0,0 +1,312 @@
+import hashlib
+import os
+import re
+import time
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+
+from aggregates import write_rollups
+from cohorts import build_cohorts, update_cohorts
+from geo import normalize_states
+from pincodes import enrich_locations
+from statuses import assign_statuses
+
+DATA_DIR = "data"
+MERCHANTS_DIR = os.path.join(DATA_DIR, "merchants")
+DEFAULT_MERCHANT = "default"
+
+# Single-dataset layout used before merchants were introduced
+LEGACY_DATA_FILE = os.path.join(DATA_DIR, "latest.parquet")
+
+REQUIRED = [
+    "Order Number",
+    "Created At",
+    "Merchant Order Status",
+    "Payment Method",
+    "Grand Total"
+]
+
+SUPPORTED_EXTENSIONS = (".csv", ".xlsx")
+
+
+class MissingColumnsError(ValueError):
+    """Raised when an order report lacks one of the REQUIRED columns"""
+
+    def __init__(self, missing):
+        self.missing = missing
+        super().__init__(f"Missing columns: {', '.join(missing)}")
+
+
+def read_file(file):
+    """Read an uploaded file or a path on disk"""
+    name = getattr(file, "name", str(file))
+    return pd.read_csv(file) if name.endswith(".csv") else pd.read_excel(file)
+
+
+def hash_customer_name(name):
+    """Hash customer name for privacy"""
+    if pd.isna(name):
+        return "Unknown"
+    return hashlib.md5(str(name).encode()).hexdigest()[:8]
+
+
+def clean_orders(df):
+    """Validate and normalise a raw GoKwik order report"""
+    df.columns = df.columns.str.strip()
+
+    missing = [c for c in REQUIRED if c not in df.columns]
+    if missing:
+        raise MissingColumnsError(missing)
+
+    # Data cleaning
+    df["Order Date"] = pd.to_datetime(df["Created At"], errors="coerce", dayfirst=True)
+    df = df[df["Order Date"].notna()].reset_index(drop=True)
+
+    df["Grand Total"] = pd.to_numeric(df["Grand Total"], errors="coerce")
+    df["Status"] = df["Merchant Order Status"]
+    df = assign_statuses(df)
+    df["Payment Method"] = df["Payment Method"].astype(str).str.upper()
+    df["Payment Type"] = df["Payment Method"].apply(
+        lambda x: "COD" if "COD" in str(x) else "Prepaid"
+    )
+
+    # Customer ID
+    if "Customer Phone" in df.columns:
+        df["Customer ID"] = df["Customer Phone"].apply(lambda x: str(x).split('|')[0] if pd.notna(x) else "Unknown")
+    elif "Customer Name" in df.columns:
+        df["Customer ID"] = df["Customer Name"].apply(hash_customer_name)
+
+    # City tier, plus city/district/state from the pincode master when configured
+    if "Billing Pincode" in df.columns:
+        df = enrich_locations(df, "Billing Pincode")
+    elif "Shipping Pincode" in df.columns:
+        df = enrich_locations(df, "Shipping Pincode")
+    else:
+        df["City Tier"] = "Unknown"
+
+    if "Billing State" in df.columns:
+        df["Billing State"] = normalize_states(df["Billing State"]).to_numpy()
+
+    return df
+
+
+def collect_files(paths):
+    """Expand files and directories into a sorted list of order reports"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(
+                    os.path.join(root, name) for name in names
+                    if name.endswith(SUPPORTED_EXTENSIONS) and not name.startswith("~$")
+                )
+        elif path.endswith(SUPPORTED_EXTENSIONS):
+            files.append(path)
+    return sorted(files)
+
+
+def merge_orders(existing, new):
+    """Upsert new orders into an existing dataset, replacing re-exported order numbers"""
+    if existing is None or len(existing) == 0:
+        return new.reset_index(drop=True)
+    existing = existing.drop(columns=["__last_updated__"], errors="ignore")
+    keep = ~existing["Order Number"].isin(new["Order Number"])
+    return pd.concat([existing[keep], new], ignore_index=True)
+
+
+def merchant_slug(name):
+    """Normalise a merchant name into a directory-safe identifier"""
+    slug = re.sub(r"[^a-z0-9]+", "-", str(name).strip().lower()).strip("-")
+    return slug or DEFAULT_MERCHANT
+
+
+def merchant_dir(merchant):
+    return os.path.join(MERCHANTS_DIR, merchant_slug(merchant))
+
+
+def partition_dir(merchant):
+    return os.path.join(merchant_dir(merchant), "orders")
+
+
+def rollup_dir(merchant):
+    return os.path.join(merchant_dir(merchant), "rollups")
+
+
+def hot_cache_path(merchant):
+    return os.path.join(merchant_dir(merchant), "hot.arrow")
+
+
+def list_merchants():
+    if not os.path.isdir(MERCHANTS_DIR):
+        return []
+    return sorted(m for m in os.listdir(MERCHANTS_DIR) if partition_files(m))
+
+
+def partition_files(merchant):
+    """Monthly partition files (YYYY-MM.parquet) of a merchant, oldest first"""
+    pdir = partition_dir(merchant)
+    if not os.path.isdir(pdir):
+        return []
+    return sorted(os.path.join(pdir, f) for f in os.listdir(pdir) if f.endswith(".parquet"))
+
+
+def dataset_version(merchant):
+    """Latest partition modification stamp, used as a cache key"""
+    files = partition_files(merchant)
+    return max(os.stat(f).st_mtime_ns for f in files) if files else None
+
+
+def bump_dataset_version(merchant):
+    """Move the dataset version forward without changing any orders.
+
+    Everything keyed on the version (cached sections, report snapshots, the
+    hot cache, warm-up) is then treated as stale. Tables that must stay
+    current have to be written after this.
+    """
+    files = partition_files(merchant)
+    if not files:
+        return None
+    version = max(time.time_ns(), dataset_version(merchant) + 1)
+    os.utime(files[-1], ns=(version, version))
+    return version
+
+
+def write_hot_cache(df, merchant):
+    """Write an uncompressed Arrow IPC copy of the dataset for memory-mapped loads"""
+    path = hot_cache_path(merchant)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type object columns across partitions; parquet loads still work
+        return False
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+    return True
+
+
+def read_hot_cache(merchant, version):
+    """Open the hot cache with mmap if it is at least as new as the partitions.
+
+    Numeric and datetime columns without nulls stay views over the mapped
+    pages, so processes share them through the OS page cache.
+    """
+    path = hot_cache_path(merchant)
+    if version is None or not os.path.exists(path) or os.stat(path).st_mtime_ns < version:
+        return None
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def load_dataset(merchant):
+    """Load only the given merchant's data, from the hot cache when it is current"""
+    files = partition_files(merchant)
+    if not files:
+        return None
+    df = read_hot_cache(merchant, dataset_version(merchant))
+    if df is None:
+        df = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+        write_hot_cache(df, merchant)
+    return df
+
+
+def save_data(df, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    df["__last_updated__"] = date.today()
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def save_partitions(df, merchant, replace=False):
+    """Upsert cleaned orders into the merchant's monthly partitions.
+
+    A re-exported order replaces its stored row in whichever month that row
+    is in, so an order whose date moved to another month is not kept twice.
+    Returns the rows whose Order Number was not stored before and the stored
+    rows that re-exported orders replaced, which is what incrementally
+    maintained tables (cohorts) need to fold in.
+    """
+    pdir = partition_dir(merchant)
+    os.makedirs(pdir, exist_ok=True)
+    if replace:
+        for path in partition_files(merchant):
+            os.remove(path)
+
+    df = df.drop(columns=["__last_updated__"], errors="ignore")
+    months = df["Order Date"].dt.strftime("%Y-%m")
+    targets = {os.path.join(pdir, f"{month}.parquet") for month in months.dropna().unique()}
+
+    # Other months holding any incoming order; only their Order Number column is read
+    moved = {}
+    for path in partition_files(merchant):
+        if path not in targets:
+            hits = pd.read_parquet(path, columns=["Order Number"])["Order Number"].isin(df["Order Number"]).to_numpy()
+            if hits.any():
+                moved[path] = (pd.read_parquet(path), hits)
+    moved_orders = [stored[hits] for stored, hits in moved.values()]
+    moved_numbers = pd.concat([rows["Order Number"] for rows in moved_orders]) if moved_orders else df["Order Number"].iloc[:0]
+
+    new_orders = []
+    replaced_orders = list(moved_orders)
+    for month, part in df.groupby(months):
+        path = os.path.join(pdir, f"{month}.parquet")
+        existing = pd.read_parquet(path) if os.path.exists(path) else None
+        known = moved_numbers if existing is None else pd.concat([existing["Order Number"], moved_numbers])
+        new_orders.append(part[~part["Order Number"].isin(known)])
+        if existing is not None:
+            replaced_orders.append(existing[existing["Order Number"].isin(part["Order Number"])])
+        save_data(merge_orders(existing, part), path)
+
+    # Drop the old rows only once the new ones are written, so a crash leaves a duplicate rather than a gap
+    for path, (stored, hits) in moved.items():
+        remaining = stored[~hits].drop(columns=["__last_updated__"], errors="ignore")
+        if len(remaining):
+            save_data(remaining.reset_index(drop=True), path)
+        else:
+            os.remove(path)
+
+    new_orders = pd.concat(new_orders, ignore_index=True) if new_orders else df.iloc[:0]
+    replaced_orders = pd.concat(replaced_orders, ignore_index=True) if replaced_orders else df.iloc[:0]
+    return new_orders, replaced_orders
+
+
+def store_orders(df, merchant, replace=False):
+    """Save cleaned orders and refresh the merchant's precomputed tables"""
+    new_orders, replaced_orders = save_partitions(df, merchant, replace=replace)
+    dataset = load_dataset(merchant)
+    write_rollups(dataset, rollup_dir(merchant))
+    if replace:
+        build_cohorts(dataset, rollup_dir(merchant))
+    else:
+        # A re-export can move an order to another customer, so both versions count
+        reexported = df[df["Order Number"].isin(replaced_orders["Order Number"])]
+        update_cohorts(new_orders, dataset, rollup_dir(merchant), pd.concat([replaced_orders, reexported]))
+    return dataset
+
+
+def refresh_statuses(merchant):
+    """Re-apply the status map and rules to the stored orders.
+
+    Only partitions whose Status Flags change are rewritten. Returns how many were.
+    """
+    rewritten = 0
+    for path in partition_files(merchant):
+        stored = pd.read_parquet(path)
+        fresh = assign_statuses(stored.drop(columns=["__last_updated__"], errors="ignore"))
+        if "Status Flags" not in stored.columns or "Status Code" in stored.columns or \
+                not stored["Status Flags"].equals(fresh["Status Flags"]):
+            save_data(fresh, path)
+            rewritten += 1
+    return rewritten
+
+
+def migrate_legacy_dataset():
+    """Move a pre-merchant data/latest.parquet into the default merchant"""
+    if os.path.exists(LEGACY_DATA_FILE) and not list_merchants():
+        save_partitions(pd.read_parquet(LEGACY_DATA_FILE), DEFAULT_MERCHANT)
+        os.replace(LEGACY_DATA_FILE, f"{LEGACY_DATA_FILE}.migrated")
@@ -0,0 +1,228 @@
+"""Concurrent-session load test for the dashboard.
+
+    python loadtest.py --rows 200000 --sessions 1 2 4 8 --steps 20
+
+Each session is a streamlit.testing AppTest driving app.py in this process,
+so all sessions share one set of st.cache_resource caches, like browser
+sessions on one server. Sessions run on their own threads and replay a
+random sequence of interactions against a generated dataset, stored in a
+temporary data directory.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+MERCHANT = "loadtest"
+
+STATUSES = ["Confirmed", "Delivered", "Shipped", "Cancelled", "RTO Delivered", "Pending"]
+STATUS_WEIGHTS = [0.25, 0.35, 0.15, 0.1, 0.08, 0.07]
+PAYMENT_METHODS = ["UPI", "CARD", "NETBANKING", "COD"]
+UTM_SOURCES = ["google", "facebook", "instagram", "email", None]
+
+
+def log(message):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+def generate_orders(rows, days=365, customers=None, products=200, seed=0):
+    """Synthetic GoKwik order report with the columns the dashboard uses"""
+    rng = np.random.default_rng(seed)
+    customers = customers or max(rows // 3, 1)
+    end = pd.Timestamp.today().normalize()
+    created = end - pd.to_timedelta(rng.integers(0, days * 86400, rows), unit="s")
+    product_names = np.array([f"Product {i:03d}" for i in range(products)], dtype=object)
+    basket = rng.integers(1, 4, rows)
+    items = rng.choice(product_names, size=(rows, 3))
+    utm_sources = rng.choice(np.array(UTM_SOURCES, dtype=object), rows)
+
+    return pd.DataFrame({
+        "Order Number": np.arange(1, rows + 1) + 10_000_000,
+        "Created At": created.strftime("%d-%m-%Y %H:%M:%S"),
+        "Merchant Order Status": rng.choice(STATUSES, rows, p=STATUS_WEIGHTS),
+        "Payment Method": rng.choice(PAYMENT_METHODS, rows, p=[0.35, 0.15, 0.05, 0.45]),
+        "Grand Total": rng.gamma(2.0, 600.0, rows).round(2),
+        "Customer Phone": (9_000_000_000 + rng.integers(0, customers, rows)).astype(str),
+        "Billing Pincode": rng.integers(110001, 855117, rows),
+        "Billing State": rng.choice(["Maharashtra", "Karnataka", "Delhi", "Tamil Nadu", "Gujarat", "Uttar Pradesh"], rows),
+        "Billing City": rng.choice(["Mumbai", "Bengaluru", "New Delhi", "Chennai", "Ahmedabad", "Lucknow"], rows),
+        "Product Name": [" | ".join(row[:n]) for row, n in zip(items, basket)],
+        "Utm Source": utm_sources,
+        "Utm Medium": np.where(utm_sources == "google", rng.choice(["cpc", "organic"], rows), "social"),
+        "Utm Campaign": rng.choice([f"campaign-{i}" for i in range(20)], rows),
+        "Utm Content": rng.choice([f"creative-{i}" for i in range(100)], rows),
+    })
+
+
+def rss_mb():
+    """Current resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def _widget(widgets, label):
+    return next((w for w in widgets if w.label == label), None)
+
+
+def change_date_range(at, rng):
+    date_input = _widget(at.sidebar.date_input, "Date Range")
+    start, end = date_input.min, date_input.max
+    span = (end - start).days
+    first = start + timedelta(days=int(rng.integers(0, max(span, 1))))
+    last = first + timedelta(days=int(rng.integers(0, max((end - first).days, 0) + 1)))
+    date_input.set_value((first, last))
+
+
+def toggle_payment_type(at, rng):
+    payment = _widget(at.sidebar.multiselect, "Payment Type")
+    both = ["Prepaid", "COD"]
+    payment.set_value(both if len(payment.value) < 2 else [both[int(rng.integers(0, 2))]])
+
+
+def switch_time_grain(at, rng):
+    grain = _widget(at.selectbox, "📅 Time Granularity")
+    grain.set_value(grain.options[int(rng.integers(0, len(grain.options)))])
+
+
+def flip_top10_metric(at, rng):
+    radio = _widget(at.radio, "Select Metric")
+    radio.set_value("Revenue" if radio.value == "Orders" else "Orders")
+
+
+def request_download(at, rng):
+    # AppTest cannot click a download button, but it can ask for the export
+    # to be prepared; once prepared for these filters, replay a plain rerun
+    prepare = next((b for b in at.button if b.label.startswith("📦 Prepare export")), None)
+    if prepare is not None:
+        prepare.click()
+
+
+def toggle_order_table(at, rng):
+    table = next((t for t in at.toggle if t.label.startswith("Show ") and t.label.endswith(" orders")), None)
+    if table is not None:
+        table.set_value(not table.value)
+
+
+# Interaction name -> (weight, action mutating widget state before a rerun)
+INTERACTIONS = {
+    "date_range": (3, change_date_range),
+    "payment_type": (2, toggle_payment_type),
+    "time_grain": (2, switch_time_grain),
+    "top10_metric": (2, flip_top10_metric),
+    "download": (1, request_download),
+    "order_table": (1, toggle_order_table),
+}
+
+
+def run_session(session, steps, seed, timeout, samples, errors):
+    """Open the dashboard, then replay ``steps`` weighted random interactions"""
+    from streamlit.testing.v1 import AppTest
+
+    rng = np.random.default_rng(seed + session)
+    names = list(INTERACTIONS)
+    weights = np.array([INTERACTIONS[n][0] for n in names], dtype=float)
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    sequence = ["open"] + list(rng.choice(names, size=steps, p=weights / weights.sum()))
+    for step in sequence:
+        try:
+            if step != "open":
+                INTERACTIONS[step][1](at, rng)
+            started = time.perf_counter()
+            at.run()
+            samples.append((step, (time.perf_counter() - started) * 1000))
+            if at.exception:
+                errors.append((step, at.exception[0].message))
+        except Exception as e:
+            errors.append((step, repr(e)))
+
+
+def run_level(sessions, steps, seed, timeout):
+    samples, errors = [], []
+    threads = [
+        threading.Thread(target=run_session, args=(i, steps, seed, timeout, samples, errors))
+        for i in range(sessions)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies = np.array([ms for step, ms in samples if step != "open"] or [np.nan])
+    opens = np.array([ms for step, ms in samples if step == "open"] or [np.nan])
+    return {
+        "sessions": sessions,
+        "reruns": len(samples),
+        "errors": len(errors),
+        "open_p50_ms": float(np.nanpercentile(opens, 50)),
+        "p50_ms": float(np.nanpercentile(latencies, 50)),
+        "p95_ms": float(np.nanpercentile(latencies, 95)),
+        "p99_ms": float(np.nanpercentile(latencies, 99)),
+        "throughput_rps": len(samples) / wall if wall else 0.0,
+        "rss_mb": rss_mb(),
+        "first_errors": errors[:3],
+    }
+
+
+def prepare_dataset(rows, days, seed):
+    from ingest import clean_orders, store_orders
+
+    started = time.perf_counter()
+    store_orders(clean_orders(generate_orders(rows, days=days, seed=seed)), MERCHANT, replace=True)
+    log(f"Generated and ingested {rows:,} orders in {time.perf_counter() - started:.1f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for app.py")
+    parser.add_argument("--rows", type=int, default=100_000, help="Orders in the generated dataset")
+    parser.add_argument("--days", type=int, default=365, help="Days of history the orders span")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrent session counts to test")
+    parser.add_argument("--steps", type=int, default=20, help="Interactions per session after opening the dashboard")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds allowed per rerun")
+    parser.add_argument("--data-dir", help="Working directory for the generated dataset (default: a temporary one)")
+    parser.add_argument("--output", help="Append one JSON line per session level to this file")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = args.data_dir or tempfile.mkdtemp(prefix="gokwik-loadtest-")
+    os.makedirs(workdir, exist_ok=True)
+    # The app resolves data/ against the working directory
+    os.chdir(workdir)
+    prepare_dataset(args.rows, args.days, args.seed)
+
+    print(f"{'sessions':>8} {'reruns':>7} {'errors':>6} {'open p50':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'rerun/s':>8} {'RSS MB':>8}")
+    for sessions in args.sessions:
+        result = run_level(sessions, args.steps, args.seed, args.timeout)
+        result.update(rows=args.rows, steps=args.steps, ts=time.time())
+        print(
+            f"{sessions:>8} {result['reruns']:>7} {result['errors']:>6} {result['open_p50_ms']:>8.0f}ms"
+            f" {result['p50_ms']:>6.0f}ms {result['p95_ms']:>6.0f}ms {result['p99_ms']:>6.0f}ms"
+            f" {result['throughput_rps']:>8.2f} {result['rss_mb']:>8.0f}",
+            flush=True
+        )
+        for step, message in result["first_errors"]:
+            log(f"{step}: {message}")
+        if output:
+            with open(output, "a") as f:
+                f.write(json.dumps(result, default=str) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+REFERENCE_DIR = os.path.join("data", "reference")
+PINCODE_MASTER = os.environ.get("GOKWIK_PINCODE_MASTER", os.path.join(REFERENCE_DIR, "pincodes.csv"))
+PINCODE_LOOKUP = os.path.join(REFERENCE_DIR, "pincode_lookup.npy")
+PINCODE_NAMES = os.path.join(REFERENCE_DIR, "pincode_names.json")
+
+# One record per possible 6-digit pincode; code 0 means "not in the master"
+LOOKUP_DTYPE = np.dtype([("city", "<u4"), ("district", "<u2"), ("state", "u1"), ("tier", "u1")])
+LOOKUP_SIZE = 1_000_000
+
+TIERS = np.array(["Unknown", "Tier 1", "Tier 2", "Tier 3"], dtype=object)
+
+# Fallback by 3-digit prefix for pincodes the master does not cover.
+# Tier 1 wins where a prefix used to be listed under both tiers.
+TIER_1_PREFIXES = np.array(sorted({
+    400, 401, 110, 121, 122, 201, 124, 125, 127, 128, 134,
+    560, 562, 563, 500, 501, 502, 503, 504, 505, 508,
+    600, 601, 602, 603, 700, 711, 712, 713, 721, 722, 743,
+    411, 412, 380, 382, 383,
+}))
+TIER_2_PREFIXES = np.setdiff1d(np.array(sorted({
+    302, 303, 226, 227, 208, 209, 440, 441, 442,
+    452, 453, 462, 463, 530, 531, 390, 391,
+    141, 142, 282, 283, 422, 423,
+    250, 251, 360, 361, 221, 222, 190, 191, 192, 193, 194,
+    143, 211, 212, 834, 835, 641, 642,
+    520, 521, 342, 344, 625, 626, 492, 493,
+    324, 325, 781, 782, 783, 160, 140,
+})), TIER_1_PREFIXES)
+
+_lookup_cache = {}
+
+
+def compile_pincode_master(source=PINCODE_MASTER, lookup_path=PINCODE_LOOKUP, names_path=PINCODE_NAMES):
+    """Compile the pincode CSV (pincode, city, district, state, tier) into a flat lookup array"""
+    master = pd.read_csv(source, dtype=str).rename(columns=str.lower)
+    master["pincode"] = pd.to_numeric(master["pincode"].str.strip(), errors="coerce")
+    master = master[master["pincode"].between(100000, 999999)].drop_duplicates("pincode")
+    pins = master["pincode"].astype(np.int64).to_numpy()
+
+    lookup = np.zeros(LOOKUP_SIZE, dtype=LOOKUP_DTYPE)
+    names = {}
+    for field in ("city", "district", "state"):
+        codes, uniques = pd.factorize(master[field].str.strip().str.title() if field in master else pd.Series(index=master.index, dtype=object))
+        lookup[field][pins] = codes + 1
+        names[field] = [None] + uniques.tolist()
+
+    tier = master["tier"].astype(str).str.extract(r"(\d)")[0] if "tier" in master else pd.Series(index=master.index, dtype=object)
+    lookup["tier"][pins] = pd.to_numeric(tier, errors="coerce").fillna(0).clip(0, 3).astype("u1").to_numpy()
+
+    os.makedirs(os.path.dirname(lookup_path) or ".", exist_ok=True)
+    tmp_path = f"{lookup_path}.tmp.npy"
+    np.save(tmp_path, lookup)
+    os.replace(tmp_path, lookup_path)
+    with open(names_path, "w") as f:
+        json.dump(names, f)
+    return len(master)
+
+
+def load_pincode_lookup(lookup_path=PINCODE_LOOKUP, names_path=PINCODE_NAMES, source=PINCODE_MASTER):
+    """Memory-mapped lookup array and name tables, recompiled when the master CSV changes.
+
+    The array is opened read-only with mmap so every dashboard process shares
+    the same page-cache copy. Returns None when no master is configured.
+    """
+    if os.path.exists(source) and (
+        not os.path.exists(lookup_path) or os.stat(source).st_mtime_ns > os.stat(lookup_path).st_mtime_ns
+    ):
+        compile_pincode_master(source, lookup_path, names_path)
+    if not os.path.exists(lookup_path):
+        return None
+
+    stamp = os.stat(lookup_path).st_mtime_ns
+    cached = _lookup_cache.get(lookup_path)
+    if cached is None or cached[0] != stamp:
+        with open(names_path) as f:
+            names = {field: np.array(values, dtype=object) for field, values in json.load(f).items()}
+        cached = (stamp, np.load(lookup_path, mmap_mode="r"), names)
+        _lookup_cache[lookup_path] = cached
+    return cached[1], cached[2]
+
+
+def _digits(pincodes, width):
+    return pd.to_numeric(pincodes.astype(str).str.strip().str[:width], errors="coerce")
+
+
+def prefix_tiers(pincodes):
+    """Tier from the 3-digit prefix lists; missing or non-numeric pincodes are Unknown"""
+    prefixes = _digits(pincodes, 3).to_numpy()
+    codes = np.where(np.isin(prefixes, TIER_1_PREFIXES), 1, np.where(np.isin(prefixes, TIER_2_PREFIXES), 2, 3))
+    codes = np.where(np.isnan(prefixes) | pincodes.isna().to_numpy(), 0, codes)
+    return codes.astype("u1")
+
+
+def enrich_locations(df, pincode_column):
+    """Set City Tier and fill city, district and state from the pincode master in one gather"""
+    pincodes = df[pincode_column]
+    tiers = prefix_tiers(pincodes)
+
+    loaded = load_pincode_lookup()
+    if loaded is not None:
+        lookup, names = loaded
+        pins = _digits(pincodes, 6).to_numpy()
+        valid = ~np.isnan(pins) & (pins >= 100000) & (pins <= 999999)
+        records = np.zeros(len(df), dtype=LOOKUP_DTYPE)
+        records[valid] = lookup[pins[valid].astype(np.int64)]
+
+        tiers = np.where(records["tier"] > 0, records["tier"], tiers)
+        for field, column in (("city", "Billing City"), ("district", "Billing District"), ("state", "Billing State")):
+            values = pd.Series(names[field][records[field]], index=df.index)
+            df[column] = df[column].fillna(values) if column in df.columns else values
+
+    df["City Tier"] = TIERS[tiers]
+    return df
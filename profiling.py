@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+PROFILE_LOG = os.path.join("data", "perf_log.jsonl")
+DEFAULT_SLOW_MS = 500.0
+
+# tracemalloc is process-wide while profilers belong to one session's run, so
+# tracing is reference-counted: the first enabled profiler starts it and the
+# last one to finish stops it (unless something else had already started it)
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+
+
+def _acquire_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owned = True
+        _tracing_users += 1
+
+
+def _release_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+def load_thresholds():
+    """Slow-section thresholds in ms, overridable via GOKWIK_SLOW_SECTIONS (JSON)"""
+    thresholds = {"default": DEFAULT_SLOW_MS}
+    raw = os.environ.get("GOKWIK_SLOW_SECTIONS")
+    if raw:
+        try:
+            thresholds.update({k: float(v) for k, v in json.loads(raw).items()})
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return thresholds
+
+
+class SectionProfiler:
+    """Lap timer for dashboard sections: wall time, rows, peak memory and chart payload.
+
+    Milestones such as the first meaningful paint are logged as ms since
+    ``started`` (a perf_counter value, default now). Peak memory is traced
+    process-wide, so concurrent profiled sessions can inflate each other's
+    peaks.
+    """
+
+    def __init__(self, enabled=False, thresholds=None, log_path=PROFILE_LOG, started=None):
+        self.enabled = enabled
+        self.thresholds = thresholds or load_thresholds()
+        self.log_path = log_path
+        self.run_id = uuid.uuid4().hex[:8]
+        self.started = time.perf_counter() if started is None else started
+        self.records = []
+        self.milestones = {}
+        self._current = None
+        self._tracing = False
+        if enabled:
+            _acquire_tracing()
+            self._tracing = True
+
+    def start(self, name, rows=0):
+        """Close the running section (if any) and start timing a new one"""
+        if not self.enabled:
+            return
+        self.stop()
+        mem_start = 0
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            mem_start = tracemalloc.get_traced_memory()[0]
+        self._current = {
+            "section": name,
+            "rows": int(rows),
+            "payload_bytes": 0,
+            "_mem_start": mem_start,
+            "_t0": time.perf_counter(),
+        }
+
+    def add_rows(self, rows):
+        if self.enabled and self._current is not None:
+            self._current["rows"] += int(rows)
+
+    def record_figure(self, nbytes):
+        """Add the serialized size of a plotly figure to the running section"""
+        if self.enabled and self._current is not None:
+            self._current["payload_bytes"] += int(nbytes)
+
+    def mark(self, name, **fields):
+        """Record the time since the run started under ``name``"""
+        if self.enabled:
+            self.milestones[name] = {"ms": round((time.perf_counter() - self.started) * 1000, 1), **fields}
+
+    def stop(self):
+        if not self.enabled or self._current is None:
+            return
+        current = self._current
+        self._current = None
+        wall_ms = (time.perf_counter() - current.pop("_t0")) * 1000
+        mem_start = current.pop("_mem_start")
+        peak_delta = 0
+        if tracemalloc.is_tracing():
+            peak_delta = max(tracemalloc.get_traced_memory()[1] - mem_start, 0)
+        threshold = self.thresholds.get(current["section"], self.thresholds["default"])
+        current.update({
+            "wall_ms": round(wall_ms, 1),
+            "peak_mem_kb": round(peak_delta / 1024, 1),
+            "payload_kb": round(current.pop("payload_bytes") / 1024, 1),
+            "threshold_ms": threshold,
+            "slow": wall_ms > threshold,
+        })
+        self.records.append(current)
+
+    def finish(self):
+        """Stop timing, append this rerun to the JSONL log and return its records"""
+        if not self.enabled:
+            return []
+        self.stop()
+        self._release()
+        if self.records or self.milestones:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            ts = datetime.now().isoformat(timespec="seconds")
+            with open(self.log_path, "a") as f:
+                for record in self.records:
+                    f.write(json.dumps({"ts": ts, "run_id": self.run_id, **record}) + "\n")
+                for name, milestone in self.milestones.items():
+                    f.write(json.dumps({"ts": ts, "run_id": self.run_id, "milestone": name, **milestone}) + "\n")
+        return self.records
+
+    def _release(self):
+        if getattr(self, "_tracing", False):
+            self._tracing = False
+            _release_tracing()
+
+    def __del__(self):
+        # A run cut short by st.stop() or a rerun never reaches finish()
+        self._release()
@@ -0,0 +1,267 @@
+import html
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from aggregates import ROLLUP_BUILDERS, default_filters, filter_key, payment_split, period_totals, read_rollup
+from cache import MerchantCache
+from ingest import DATA_DIR, dataset_version, load_dataset, merchant_slug, rollup_dir
+from sections import ORDERS, SNAPSHOT_SECTIONS, SectionResults, write_snapshot_section
+
+REPORTS_DIR = os.path.join(DATA_DIR, "reports")
+REPORT_HTML = "report.html"
+REPORT_INDEX = "index.json"
+
+# Optional JSON of {preset: spec}. "days" keeps that many days up to the latest
+# order (all dates if absent); "status", "payment", "tier" and "utm" replace the
+# sidebar defaults
+REPORT_PRESETS = os.environ.get("GOKWIK_REPORT_PRESETS", os.path.join(REPORTS_DIR, "presets.json"))
+DEFAULT_PRESETS = {
+    "all_time": {},
+    "last_7_days": {"days": 7},
+    "last_30_days": {"days": 30},
+}
+
+COUNT = "{:,.0f}"
+CURRENCY = "₹{:,.0f}"
+PERCENT = "{:.1f}%"
+UTM_KINDS = {
+    "Total Orders": COUNT, "Prepaid": COUNT, "COD": COUNT, "Prepaid %": PERCENT, "COD %": PERCENT,
+    "Total Revenue": CURRENCY, "AOV": CURRENCY,
+}
+
+PAGE_STYLE = """
+body { font-family: Arial, sans-serif; color: #1a1a1a; background: #f5f7fa; margin: 0; padding: 24px; }
+h1 { margin: 0 0 4px; }
+h2 { border-bottom: 3px solid #667eea; padding-bottom: 6px; margin-top: 36px; }
+.meta { color: #6c757d; margin-bottom: 24px; }
+.cards { display: flex; flex-wrap: wrap; gap: 12px; }
+.card { background: white; border-radius: 10px; padding: 14px 18px; min-width: 150px; box-shadow: 0 2px 6px rgba(0,0,0,0.08); }
+.card .label { color: #6c757d; font-size: 13px; }
+.card .value { font-size: 24px; font-weight: bold; margin-top: 4px; }
+.card .delta { font-size: 12px; margin-top: 4px; color: #6c757d; }
+.row { display: flex; flex-wrap: wrap; gap: 12px; }
+.row > div { flex: 1 1 480px; background: white; border-radius: 10px; padding: 8px; }
+table { border-collapse: collapse; background: white; font-size: 13px; margin-top: 12px; }
+th, td { padding: 6px 10px; border-bottom: 1px solid #f0f0f0; text-align: right; }
+th:first-child, td:first-child { text-align: left; }
+"""
+
+
+def load_presets(source=REPORT_PRESETS):
+    if not os.path.exists(source):
+        return dict(DEFAULT_PRESETS)
+    with open(source) as f:
+        return json.load(f)
+
+
+def preset_filters(df, spec):
+    """Filter state of a preset, matching what the dashboard sidebar produces for it"""
+    filters = default_filters(df)
+    start, end = filters["date_range"]
+    if spec.get("days"):
+        start = max(start, end - timedelta(days=int(spec["days"]) - 1))
+    filters["date_range"] = (start, end)
+    filters.update({name: list(values) for name, values in spec.items() if name in filters and name != "date_range"})
+    return filters
+
+
+def merchant_reports_dir(merchant):
+    return os.path.join(REPORTS_DIR, merchant_slug(merchant))
+
+
+def report_dir(merchant, preset):
+    return os.path.join(merchant_reports_dir(merchant), preset)
+
+
+def read_index(merchant):
+    """Filter key -> {preset, version, created, dir} of the merchant's rendered reports"""
+    path = os.path.join(merchant_reports_dir(merchant), REPORT_INDEX)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def find_snapshot(merchant, version, filters):
+    """The rendered report for exactly these filters and this dataset version, if any"""
+    entry = read_index(merchant).get(filter_key(filters))
+    if entry is None or entry["version"] != version or not os.path.isdir(entry["dir"]):
+        return None
+    return entry
+
+
+def _write_index(merchant, index):
+    os.makedirs(merchant_reports_dir(merchant), exist_ok=True)
+    path = os.path.join(merchant_reports_dir(merchant), REPORT_INDEX)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _format(template):
+    return lambda value: "-" if pd.isna(value) else template.format(value)
+
+
+def _table(frame, kinds):
+    formatters = {column: _format(template) for column, template in kinds.items() if column in frame.columns}
+    return frame.to_html(index=False, formatters=formatters, na_rep="-", border=0, escape=True)
+
+
+def _card(label, value, current, previous, key):
+    delta = ""
+    if previous.get(key):
+        change = (current[key] - previous[key]) / previous[key] * 100
+        delta = f'<div class="delta">{"▲" if change >= 0 else "▼"} {abs(change):.1f}% vs prev period</div>'
+    return f'<div class="card"><div class="label">{label}</div><div class="value">{value}</div>{delta}</div>'
+
+
+def _kpi_cards(kpis):
+    current, previous = kpis["current"], kpis["previous"]
+    cards = [
+        _card("Total Orders", f"{current['orders']:,}", current, previous, "orders"),
+        _card("Total Revenue", f"₹{current['revenue']:,.0f}", current, previous, "revenue"),
+        _card("Avg Order Value", f"₹{current['aov']:,.0f}", current, previous, "aov"),
+        _card("Prepaid Orders", f"{current['prepaid']:,}", current, previous, "prepaid"),
+        _card("COD Orders", f"{current['cod']:,}", current, previous, "cod"),
+        _card("Payment Success", f"{current['success']:.1f}%", current, previous, "success"),
+        _card("Unique Customers", f"{current['customers']:,}", current, previous, "customers"),
+    ]
+    return f'<div class="cards">{"".join(cards)}</div>'
+
+
+def render_report(results, out_dir, title):
+    """Write a report's HTML page, CSV tables and section results into ``out_dir``.
+
+    Returns the names of the CSV files written.
+    """
+    import charts
+
+    figures = []
+
+    def figure(fig):
+        # plotly.js is inlined once, so the page opens without network access
+        figures.append(fig)
+        return fig.to_html(full_html=False, include_plotlyjs=len(figures) == 1, config={"displaylogo": False})
+
+    for name in SNAPSHOT_SECTIONS:
+        write_snapshot_section(out_dir, name, results.get(name))
+
+    kpis = results.get("kpis")[1]
+    rollup = results.get("rollup")
+    trend = period_totals(rollup, "Daily")
+    payments = payment_split(rollup)
+    tables = {
+        "kpis": pd.DataFrame.from_dict(kpis, orient="index").rename_axis("Window").reset_index(),
+        "trend": trend,
+        "payment_split": payments,
+    }
+    body = [
+        "<h2>📈 Key Performance Indicators</h2>",
+        _kpi_cards(kpis),
+        "<h2>📊 Revenue & Order Trends</h2>",
+        f'<div class="row"><div>{figure(charts.trend_chart(trend, "Daily"))}</div>'
+        f'<div>{figure(charts.payment_pie(payments))}</div></div>',
+    ]
+
+    states = results.get("states")
+    if states is not None:
+        tables["states"] = states
+        body += [
+            "<h2>🗺️ States</h2>",
+            f'<div class="row"><div>{figure(charts.state_bar(states))}</div>'
+            f'<div>{figure(charts.top_states_chart(states, "Revenue"))}</div></div>',
+            _table(states, {"Orders": COUNT, "Revenue": CURRENCY}),
+        ]
+
+    utm_titles = {"utm_sources": "UTM Sources", "utm_campaigns": "UTM Campaigns", "utm_contents": "UTM Content"}
+    utm_tables = [(name, results.get(name)) for name in utm_titles]
+    utm_tables = [(name, table) for name, table in utm_tables if table is not None]
+    if utm_tables:
+        body.append("<h2>📱 Marketing Performance</h2>")
+        for name, table in utm_tables:
+            tables[name] = table
+            body += [f"<h3>{utm_titles[name]}</h3>", _table(table, UTM_KINDS)]
+
+    rfm = results.get("rfm")
+    if rfm is not None:
+        segments = rfm["Segment"].value_counts().rename_axis("Segment").reset_index(name="Customers")
+        tables["rfm"] = rfm
+        tables["rfm_segments"] = segments
+        body += [
+            "<h2>🎯 RFM Analysis</h2>",
+            f'<div class="row"><div>{figure(charts.rfm_segments(rfm))}</div>'
+            f'<div>{figure(charts.recency_histogram(rfm))}</div>'
+            f'<div>{figure(charts.rfm_scatter(rfm))}</div></div>',
+            _table(segments, {"Customers": COUNT}),
+        ]
+
+    for name, table in tables.items():
+        table.to_csv(os.path.join(out_dir, f"{name}.csv"), index=False)
+
+    start, end = results.filters["date_range"][0], results.filters["date_range"][-1]
+    page = (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+        f"<style>{PAGE_STYLE}</style></head><body>"
+        f"<h1>📊 {html.escape(title)}</h1>"
+        f'<div class="meta">{start:%d %b %Y} – {end:%d %b %Y} · generated {datetime.now():%d %b %Y, %I:%M %p}</div>'
+        + "".join(body)
+        + "</body></html>"
+    )
+    with open(os.path.join(out_dir, REPORT_HTML), "w", encoding="utf-8") as f:
+        f.write(page)
+    return [f"{name}.csv" for name in tables]
+
+
+def render_reports(merchant, presets=None, cache=None, log=print):
+    """Render every preset for the merchant's current dataset and index the snapshots.
+
+    Section results are computed once per preset through SectionResults, so a
+    snapshot holds exactly what the dashboard would compute for its filters.
+    """
+    version = dataset_version(merchant)
+    if version is None:
+        return 0
+    presets = load_presets() if presets is None else presets
+    cache = cache or MerchantCache()
+
+    def load(merchant, version, name):
+        def build():
+            if name == ORDERS:
+                return load_dataset(merchant)
+            rollup = read_rollup(rollup_dir(merchant), name, min_mtime_ns=version)
+            return rollup if rollup is not None else ROLLUP_BUILDERS[name](load(merchant, version, ORDERS))
+        return cache.get(merchant, name, version, build, component="dataset" if name == ORDERS else "rollups")
+
+    df = load(merchant, version, ORDERS)
+    index = {key: entry for key, entry in read_index(merchant).items() if entry["preset"] not in presets}
+    for preset, spec in presets.items():
+        started = time.perf_counter()
+        filters = preset_filters(df, spec)
+        results = SectionResults(cache, load, merchant, version, filters, orders=df)
+
+        final_dir = report_dir(merchant, preset)
+        tmp_dir, old_dir = f"{final_dir}.tmp", f"{final_dir}.old"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        title = f"{merchant} · {preset.replace('_', ' ').title()}"
+        files = render_report(results, tmp_dir, title)
+
+        # Swap the finished directory in, so the dashboard never reads a half-written one
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(final_dir):
+            os.replace(final_dir, old_dir)
+        os.replace(tmp_dir, final_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+        index[filter_key(filters)] = {"preset": preset, "version": version, "created": time.time(), "dir": final_dir}
+        log(f"Rendered '{preset}' for {merchant} in {time.perf_counter() - started:.1f}s: {REPORT_HTML}, {', '.join(files)}")
+
+    _write_index(merchant, index)
+    return len(presets)
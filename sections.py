@@ -0,0 +1,404 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+from aggregates import (
+    CUSTOMER_SKETCHES, DAILY_ROLLUP, ORDER_SKETCHES, PRODUCT_LINES, TOPK_EXACT_LIMIT, comparison_windows, filter_frame,
+    filter_key, kpi_values, lifecycle_breakdown, utm_breakdown, window_filters, window_masks, window_totals
+)
+from sketches import hll_estimate, stratified_totals
+
+# Cache name of a merchant's full order table
+ORDERS = "orders"
+
+# Datasets at least this large open in preview mode
+PREVIEW_MIN_ROWS = int(os.environ.get("GOKWIK_PREVIEW_MIN_ROWS", 1_000_000))
+
+# Orders per slice when the cache is near its memory budget and sections
+# switch to streamed aggregation
+STREAM_CHUNK_ROWS = int(os.environ.get("GOKWIK_STREAM_CHUNK_ROWS", 250_000))
+
+
+def state_breakdown(filtered):
+    """Orders and revenue per billing state, most orders first"""
+    state_data = filtered.groupby("Billing State").agg({
+        "Order Number": "count",
+        "Grand Total": "sum"
+    }).reset_index()
+    state_data.columns = ["State", "Orders", "Revenue"]
+    return state_data.sort_values("Orders", ascending=False)
+
+
+def district_breakdown(filtered):
+    """Orders and revenue per billing district and state"""
+    district_data = filtered.groupby(["Billing District", "Billing State"]).agg({
+        "Order Number": "count",
+        "Grand Total": "sum"
+    }).reset_index()
+    district_data.columns = ["District", "State", "Orders", "Revenue"]
+    return district_data
+
+
+def kpi_windows(daily, order_sketches, customer_sketches, filters):
+    """Rollup totals and KPI values for the current, previous and year-ago windows.
+
+    Distinct orders and customers are HyperLogLog estimates; the dashboard
+    overwrites them when exact counts are requested.
+    """
+    windows = comparison_windows(filters["date_range"])
+    wide_filters = window_filters(filters, windows)
+    totals = window_totals(filter_frame(daily, wide_filters, date_col="Day"), windows)
+    kpis = {name: kpi_values(t) for name, t in totals.items()}
+
+    order_sketch = filter_frame(order_sketches, wide_filters, date_col="Day")
+    customer_sketch = filter_frame(customer_sketches, wide_filters, date_col="Day")
+    customer_masks = window_masks(customer_sketch["Day"], windows)
+    for name, mask in window_masks(order_sketch["Day"], windows).items():
+        kpis[name]["orders"] = hll_estimate(order_sketch[mask])
+        kpis[name]["customers"] = hll_estimate(customer_sketch[customer_masks[name]])
+    return totals, kpis
+
+
+def _rfm_score(data, column, ascending=True):
+    try:
+        unique_values = data[column].nunique()
+        if unique_values <= 1:
+            return pd.Series([3] * len(data), index=data.index)
+
+        n_bins = min(5, unique_values)
+        if ascending:
+            labels = list(range(1, n_bins + 1))
+        else:
+            labels = list(range(n_bins, 0, -1))
+
+        if column == "Frequency":
+            return pd.qcut(data[column].rank(method='first'), n_bins, labels=labels, duplicates='drop')
+        else:
+            return pd.qcut(data[column], n_bins, labels=labels, duplicates='drop')
+    except:
+        try:
+            if column == "Frequency":
+                return pd.cut(data[column].rank(method='first'), n_bins, labels=labels, duplicates='drop')
+            else:
+                return pd.cut(data[column], n_bins, labels=labels, duplicates='drop')
+        except:
+            ranks = data[column].rank(method='first', pct=True)
+            if ascending:
+                return pd.cut(ranks, bins=5, labels=[1, 2, 3, 4, 5])
+            else:
+                return pd.cut(ranks, bins=5, labels=[5, 4, 3, 2, 1])
+
+
+def _rfm_segment(score):
+    if score >= 13:
+        return "Champions"
+    elif score >= 11:
+        return "Loyal"
+    elif score >= 9:
+        return "Potential"
+    elif score >= 7:
+        return "At Risk"
+    else:
+        return "Lost"
+
+
+def rfm_scores(filtered):
+    """Recency, frequency and monetary scores (1-5) and segment per customer"""
+    current_date = filtered["Order Date"].max()
+
+    rfm_data = filtered.groupby("Customer ID").agg({
+        "Order Date": lambda x: (current_date - x.max()).days,
+        "Order Number": "count",
+        "Grand Total": "sum"
+    }).reset_index()
+
+    rfm_data.columns = ["Customer ID", "Recency", "Frequency", "Monetary"]
+
+    rfm_data["R_Score"] = _rfm_score(rfm_data, "Recency", ascending=False)
+    rfm_data["F_Score"] = _rfm_score(rfm_data, "Frequency", ascending=True)
+    rfm_data["M_Score"] = _rfm_score(rfm_data, "Monetary", ascending=True)
+
+    rfm_data["RFM_Score"] = rfm_data["R_Score"].astype(str) + rfm_data["F_Score"].astype(str) + rfm_data["M_Score"].astype(str)
+    rfm_data["RFM_Total"] = rfm_data["R_Score"].astype(int) + rfm_data["F_Score"].astype(int) + rfm_data["M_Score"].astype(int)
+    rfm_data["Segment"] = rfm_data["RFM_Total"].apply(_rfm_segment)
+    return rfm_data
+
+
+def product_breakdown(product_lines, filtered, chunk_rows=None):
+    """Top products, their payment split and the detail table from exact line items.
+
+    Product line items are exploded once at ingest; the filtered orders are
+    joined onto them here. With ``chunk_rows`` the join and aggregation run
+    over slices of that many orders, so the exploded frame never exists in
+    full; per-product partials are then summed.
+    """
+    rows = product_lines["Row"].to_numpy()
+    bounds = [0, len(rows)]
+    if chunk_rows and len(rows):
+        # Lines of one order share a Row, so cutting on Row keeps orders whole
+        bounds = rows.searchsorted(np.arange(0, rows[-1] + chunk_rows + 1, chunk_rows), side="left").tolist()
+
+    details, payments = [], []
+    lines = 0
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        product_exploded = product_lines.iloc[lo:hi].join(
+            filtered[["Order Number", "Grand Total", "Payment Type"]], on="Row", how="inner"
+        )
+        lines += len(product_exploded)
+        details.append(product_exploded.groupby("Product Name").agg(**{
+            "Units Sold": ("Order Number", "count"),
+            "Unique Orders": ("Order Number", "nunique"),
+            "Total Revenue": ("Grand Total", "sum"),
+        }))
+        payments.append(product_exploded.groupby(["Product Name", "Payment Type"]).size().rename("Count"))
+
+    product_detail = pd.concat(details).groupby(level=0).sum().rename_axis("Product Name").reset_index()
+    product_detail = product_detail.sort_values("Units Sold", ascending=False)
+
+    # Count each product occurrence (line-item level)
+    product_data = product_detail.head(10)[["Product Name", "Units Sold", "Total Revenue"]]
+    product_data.columns = ["Product", "Units Sold", "Revenue"]
+
+    # Product payment split
+    top_products = product_detail["Product Name"].head(8).tolist()
+    product_payment = pd.concat(payments).groupby(level=[0, 1]).sum().reset_index()
+    product_payment.columns = ["Product Name", "Payment Type", "Count"]
+    product_payment = product_payment[product_payment["Product Name"].isin(top_products)]
+
+    product_detail = product_detail.head(15).copy()
+    product_detail["Avg Revenue per Unit"] = product_detail["Total Revenue"] / product_detail["Units Sold"]
+    return {"data": product_data, "payment": product_payment, "detail": product_detail, "lines": lines}
+
+
+def _use_topk(results):
+    # Top-K summaries are keyed by day and payment type only, so they stand in
+    # for exact product/UTM rankings when no other filter removes rows and the
+    # selection is large
+    filtered = results.get("filtered")
+    if len(filtered) <= TOPK_EXACT_LIMIT:
+        return False
+    status_options = results.table(ORDERS)["Status"].unique().tolist()
+    date_payment_filters = {**results.filters, "status": status_options, "tier": [], "utm": []}
+    date_payment_rows = filter_frame(results.table(DAILY_ROLLUP), date_payment_filters, date_col="Day")["Orders"].sum()
+    return len(filtered) == date_payment_rows
+
+
+def _column_section(column, compute):
+    """Section that only exists when the filtered orders have ``column``"""
+    def section(results):
+        filtered = results.get("filtered")
+        return compute(results, filtered) if column in filtered.columns else None
+    return section
+
+
+# Section results that depend on the filter state, in page order. Each takes
+# the SectionResults it belongs to and may ask it for other sections.
+SECTIONS = {
+    "filtered": lambda r: filter_frame(r.table(ORDERS), r.filters),
+    "rollup": lambda r: filter_frame(r.table(DAILY_ROLLUP), r.filters, date_col="Day"),
+    "use_topk": _use_topk,
+    "kpis": lambda r: kpi_windows(r.table(DAILY_ROLLUP), r.table(ORDER_SKETCHES), r.table(CUSTOMER_SKETCHES), r.filters),
+    "states": _column_section("Billing State", lambda r, f: state_breakdown(f)),
+    "districts": _column_section(
+        "Billing District",
+        lambda r, f: district_breakdown(f) if "Billing State" in f.columns else None
+    ),
+    "lifecycle": lambda r: lifecycle_breakdown(r.get("rollup")),
+    "utm_contents": _column_section(
+        "Utm Content",
+        lambda r, f: None if r.get("use_topk") else utm_breakdown(f, "Utm Content", attributes=["Utm Source", "Utm Medium"])
+    ),
+    "utm_sources": _column_section("Utm Source", lambda r, f: utm_breakdown(f, "Utm Source")),
+    "utm_campaigns": _column_section("Utm Campaign", lambda r, f: utm_breakdown(f, "Utm Campaign", attributes=["Utm Source"])),
+    "rfm": _column_section("Customer ID", lambda r, f: rfm_scores(f)),
+    "products": _column_section(
+        "Product Name",
+        lambda r, f: None if r.get("use_topk") else product_breakdown(
+            r.table(PRODUCT_LINES), f, chunk_rows=STREAM_CHUNK_ROWS if r.streaming else None
+        )
+    ),
+}
+
+# Large, cheap-to-recompute results the cache may decline to keep near its budget
+SPILLABLE_SECTIONS = {"filtered", "rfm"}
+
+# Sections a report snapshot stores; the filtered orders are recomputed instead
+SNAPSHOT_SECTIONS = [name for name in SECTIONS if name != "filtered"]
+
+
+def snapshot_path(snapshot_dir, name):
+    return os.path.join(snapshot_dir, "sections", f"{name}.pkl")
+
+
+def write_snapshot_section(snapshot_dir, name, value):
+    path = snapshot_path(snapshot_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_snapshot_section(snapshot_dir, name):
+    """A section result stored in a report snapshot; raises KeyError if it has none"""
+    try:
+        with open(snapshot_path(snapshot_dir, name), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        raise KeyError(name)
+
+
+class SectionResults:
+    """Section results for one merchant, dataset version and filter state.
+
+    Results are memoized in the merchant cache under the filter state's
+    canonical key, so the dashboard and the background warm-up share them.
+    ``load(merchant, version, name)`` returns the merchant's orders or a rollup.
+    ``streaming`` is set when the cache is near its memory budget. With a
+    ``snapshot`` directory (a report rendered for these filters and this
+    version), stored results are read from it instead of computed. ``orders``
+    passes in a dataset the caller already loaded.
+
+    Tables and spillable sections are also held by the instance, which lives
+    for one run: near the budget the dataset is not kept in the cache, and it
+    should still be read only once per run.
+    """
+
+    def __init__(self, cache, load, merchant, version, filters, snapshot=None, orders=None):
+        self.cache = cache
+        self.merchant = merchant
+        self.version = version
+        self.filters = filters
+        self.snapshot = snapshot
+        self._load = load
+        self._key = filter_key(filters)
+        self.streaming = cache.under_pressure()
+        self._tables = {} if orders is None else {ORDERS: orders}
+        self._spilled = {}
+
+    def table(self, name):
+        if name not in self._tables:
+            self._tables[name] = self._load(self.merchant, self.version, name)
+        return self._tables[name]
+
+    def get(self, name):
+        if name in self._spilled:
+            return self._spilled[name]
+        value = self.cache.get(
+            self.merchant, ("section", name, self._key), self.version, lambda: self._compute(name),
+            component="sections", spillable=name in SPILLABLE_SECTIONS
+        )
+        if name in SPILLABLE_SECTIONS:
+            self._spilled[name] = value
+        return value
+
+    def _compute(self, name):
+        if self.snapshot is not None:
+            try:
+                return read_snapshot_section(self.snapshot, name)
+            except KeyError:
+                pass
+        return SECTIONS[name](self)
+
+    def ready(self, names=SECTIONS):
+        """Whether the sections are cached, or a background run finished them (spilled ones recompute on demand)"""
+        if (self.merchant, self.version, self._key) in _background_done:
+            return True
+        return all(self.cache.contains(self.merchant, ("section", name, self._key), self.version) for name in names)
+
+    def peek(self, name):
+        """The section's result if already computed, else None"""
+        return self.cache.peek(self.merchant, ("section", name, self._key), self.version)
+
+    def compute_in_background(self, names=SECTIONS):
+        """Compute the sections on a daemon thread, once per filter state"""
+        job = (self.merchant, self.version, self._key)
+        with _background_lock:
+            if job in _background_jobs:
+                return
+            _background_jobs.add(job)
+
+        def run():
+            try:
+                for name in names:
+                    self.get(name)
+            finally:
+                with _background_lock:
+                    _background_jobs.discard(job)
+                    if len(_background_done) >= 1000:
+                        _background_done.clear()
+                    _background_done.add(job)
+
+        threading.Thread(target=run, name="gokwik-exact", daemon=True).start()
+
+
+_background_jobs = set()
+_background_done = set()
+_background_lock = threading.Lock()
+
+
+def sample_breakdown(view, domain, dimension):
+    """Estimated orders, payment mix and revenue per value of ``dimension`` from a sample.
+
+    ``domain`` holds the dimension value of sampled rows matching the filters
+    and NaN elsewhere; "±" columns are 95% confidence half-widths.
+    """
+    orders = stratified_totals(view, np.ones(len(view)), domain)
+    cod = stratified_totals(view, view["Payment Type"].eq("COD"), domain)["Estimate"].reindex(orders.index, fill_value=0)
+    revenue = stratified_totals(view, view["Grand Total"].fillna(0), domain).reindex(orders.index, fill_value=0)
+
+    table = pd.DataFrame({
+        dimension: orders.index,
+        "Total Orders": orders["Estimate"].round().astype("int64").to_numpy(),
+        "Orders ±": orders["CI"].round().astype("int64").to_numpy(),
+        "COD": cod.round().astype("int64").to_numpy(),
+        "Total Revenue": revenue["Estimate"].to_numpy(),
+        "Revenue ±": revenue["CI"].to_numpy(),
+    })
+    total = table["Total Orders"].where(table["Total Orders"] > 0)
+    table["Prepaid"] = table["Total Orders"] - table["COD"]
+    table["Prepaid %"] = (table["Prepaid"] / total * 100).round(1)
+    table["COD %"] = (table["COD"] / total * 100).round(1)
+    table["AOV"] = (table["Total Revenue"] / total).round(0)
+    return table.sort_values("Total Orders", ascending=False, ignore_index=True)
+
+
+class SamplePreview:
+    """Preview estimates of the order-level sections from the stratified sample.
+
+    Whole strata inside the date range and payment types are kept, and the
+    remaining filters only decide which sampled rows count, so estimates stay
+    unbiased for any filter combination.
+    """
+
+    def __init__(self, sample, filters):
+        statuses = sample["Status"].unique().tolist()
+        self.view = filter_frame(sample, {**filters, "status": statuses, "tier": [], "utm": []}, date_col="Day")
+        self.mask = self.view.index.isin(filter_frame(self.view, filters, date_col="Day").index)
+        rows = stratified_totals(self.view, self.mask, np.where(self.mask, "All", None))
+        self.rows = int(round(rows["Estimate"].sum()))
+        self.rows_ci = int(round(rows["CI"].sum()))
+
+    def _domain(self, column):
+        return self.view[column].where(self.mask)
+
+    def get(self, name):
+        if name == "states" and "Billing State" in self.view.columns:
+            table = sample_breakdown(self.view, self._domain("Billing State"), "Billing State")
+            return table.rename(columns={
+                "Billing State": "State", "Total Orders": "Orders", "Total Revenue": "Revenue"
+            })[["State", "Orders", "Orders ±", "Revenue", "Revenue ±"]]
+        dimension = {"utm_sources": "Utm Source", "utm_campaigns": "Utm Campaign", "utm_contents": "Utm Content"}.get(name)
+        if dimension in self.view.columns:
+            table = sample_breakdown(self.view, self._domain(dimension), dimension)
+            attributes = {"utm_campaigns": ["Utm Source"], "utm_contents": ["Utm Source", "Utm Medium"]}.get(name, [])
+            attributes = [c for c in attributes if c in self.view.columns]
+            if attributes:
+                first = self.view[self.mask].groupby(dimension)[attributes].first()
+                table = table.join(first, on=dimension)
+            if "Utm Medium" in table.columns:
+                is_google = table["Utm Source"].astype(str).str.lower().str.contains("google", regex=False).to_numpy()
+                table["Medium"] = np.where(is_google, table["Utm Medium"], "-")
+            return table
+        return None
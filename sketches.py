@@ -0,0 +1,137 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# 2**11 registers: ~2.3% standard error. Precision must stay >= 11 so the
+# remaining hash bits fit exactly in a float64 mantissa (see hll_observations).
+HLL_PRECISION = 11
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+
+def hll_error(precision=HLL_PRECISION):
+    """Relative standard error of a HyperLogLog estimate"""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+def hll_observations(values, precision=HLL_PRECISION):
+    """Hash values into (register, rank) pairs; merging is a max per register"""
+    hashes = pd.util.hash_pandas_object(pd.Series(values).astype(str), index=False).to_numpy()
+    suffix_bits = 64 - precision
+    registers = (hashes >> np.uint64(suffix_bits)).astype(np.uint16)
+    suffix = hashes & np.uint64((1 << suffix_bits) - 1)
+    # frexp gives floor(log2(x)) + 1, i.e. the bit length of the suffix (0 for 0)
+    _, bit_length = np.frexp(suffix.astype(np.float64))
+    ranks = (suffix_bits - bit_length + 1).astype(np.uint8)
+    return registers, ranks
+
+
+def build_sketch_table(keys, values, precision=HLL_PRECISION):
+    """Sparse HLL per key combination: one row per (keys..., Register) with its max Rank"""
+    valid = values.notna().to_numpy()
+    keys = keys[valid]
+    registers, ranks = hll_observations(values[valid], precision)
+    obs = keys.assign(Register=registers, Rank=ranks)
+    return obs.groupby(list(keys.columns) + ["Register"], dropna=False, observed=True)["Rank"].max().reset_index()
+
+
+def hll_estimate(sketch, precision=HLL_PRECISION):
+    """Distinct-count estimate from any subset of sketch rows"""
+    m = 1 << precision
+    registers = np.zeros(m, dtype=np.float64)
+    if len(sketch):
+        np.maximum.at(registers, sketch["Register"].to_numpy(np.int64), sketch["Rank"].to_numpy(np.float64))
+
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.exp2(-registers))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Linear counting is more accurate while most registers are empty
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+def summarize_topk(items, keys, capacity):
+    """Keep the ``capacity`` heaviest items of each summary (one per ``keys`` group).
+
+    ``items`` has one row per occurrence with Item, Order Number and Grand Total.
+    Retained counts are exact; Threshold records the largest count that was
+    dropped, which bounds how much any missing item can be undercounted.
+    """
+    extra = {c: (c, "first") for c in items.columns if c not in keys + ["Item", "Order Number", "Grand Total"]}
+    counts = items.groupby(keys + ["Item"], observed=True).agg(
+        Count=("Order Number", "size"),
+        Orders=("Order Number", "nunique"),
+        Revenue=("Grand Total", "sum"),
+        **extra,
+    ).reset_index()
+
+    counts = counts.sort_values(keys + ["Count"], ascending=[True] * len(keys) + [False], ignore_index=True)
+    rank = counts.groupby(keys, observed=True).cumcount()
+    dropped = counts[rank == capacity].set_index(keys)["Count"].rename("Threshold")
+    kept = counts[rank < capacity].join(dropped, on=keys)
+    kept["Threshold"] = kept["Threshold"].fillna(0).astype("int64")
+    return kept
+
+
+def merge_topk(summaries, keys):
+    """Merge top-K summaries into per-item totals with an undercount bound.
+
+    An item absent from a summary may still have occurred there up to that
+    summary's Threshold times, so Error is the sum of those thresholds.
+    """
+    total_threshold = summaries.drop_duplicates(keys)["Threshold"].sum()
+    extra = {c: (c, "first") for c in summaries.columns if c not in keys + ["Item", "Count", "Orders", "Revenue", "Threshold"]}
+    merged = summaries.groupby("Item").agg(
+        Count=("Count", "sum"),
+        Orders=("Orders", "sum"),
+        Revenue=("Revenue", "sum"),
+        Covered=("Threshold", "sum"),
+        **extra,
+    )
+    merged["Error"] = total_threshold - merged.pop("Covered")
+    return merged.sort_values("Count", ascending=False)
+
+
+def stratified_sample(frame, strata, rate, min_rows, key):
+    """Keep max(min_rows, ceil(rate * N)) rows of every stratum of N rows.
+
+    Rows are picked by hash of ``key``, so rebuilding the sample keeps the
+    same orders. Adds the Stratum id, its population Stratum Size and the
+    row's inverse-probability Weight.
+    """
+    groups = frame.groupby(strata, dropna=False, observed=True, sort=False)
+    stratum = groups.ngroup().to_numpy()
+    size = groups[key].transform("size").to_numpy()
+    hashes = pd.Series(pd.util.hash_pandas_object(frame[key].astype(str), index=False).to_numpy())
+    rank = hashes.groupby(stratum).rank(method="first").to_numpy()
+    take = np.minimum(np.maximum(np.ceil(size * rate), min_rows), size)
+    kept = rank <= take
+    return frame[kept].assign(**{
+        "Stratum": stratum[kept],
+        "Stratum Size": size[kept],
+        "Weight": size[kept] / take[kept],
+    })
+
+
+def stratified_totals(sample, values, domain, z=1.96):
+    """Estimated population total of ``values`` per ``domain`` label, with confidence half-widths.
+
+    ``sample`` must hold every sampled row of the strata involved; rows whose
+    domain is missing count as zero. Variance is the stratified estimator
+    with finite population correction, summed over strata.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    frame = pd.DataFrame({"Stratum": sample["Stratum"].to_numpy(), "Domain": np.asarray(domain, dtype=object), "y": y, "y2": y * y})
+    strata = sample.groupby("Stratum")["Stratum Size"].agg(n="size", N="first")
+
+    cells = frame[frame["Domain"].notna()].groupby(["Domain", "Stratum"]).agg(S1=("y", "sum"), S2=("y2", "sum"))
+    cells = cells.reset_index().join(strata, on="Stratum")
+    n, N = cells["n"], cells["N"]
+    mean = cells["S1"] / n
+    var = ((cells["S2"] - n * mean ** 2) / (n - 1)).where(n > 1, 0).clip(lower=0)
+    cells["Total"] = N * mean
+    cells["Var"] = N ** 2 * (1 - n / N) * var / n
+
+    totals = cells.groupby("Domain")[["Total", "Var"]].sum()
+    return pd.DataFrame({"Estimate": totals["Total"], "CI": z * np.sqrt(totals["Var"])})
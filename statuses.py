@@ -0,0 +1,146 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from pincodes import REFERENCE_DIR
+
+# Optional CSV with `status, state` columns mapping raw "Merchant Order Status"
+# values (case-insensitive) to one of LIFECYCLE_STATES
+STATUS_MAP = os.environ.get("GOKWIK_STATUS_MAP", os.path.join(REFERENCE_DIR, "statuses.csv"))
+
+# Lifecycle states; a state's code is its index in this list (new states are
+# only ever appended)
+LIFECYCLE_STATES = ["Unknown", "Pending", "Confirmed", "Shipped", "Delivered", "Cancelled", "RTO", "Failed"]
+
+# Bits of the uint8 "Status Flags" column
+CONFIRMED = 1
+DELIVERED = 2
+CANCELLED = 4
+RTO = 8
+# Counted by the Payment Success KPI, set from the raw value rather than the
+# lifecycle state so the KPI keeps its original rule (see SUCCESS_PATTERN)
+SUCCESSFUL = 16
+FLAG_NAMES = {CONFIRMED: "Confirmed", DELIVERED: "Delivered", CANCELLED: "Cancelled", RTO: "RTO", SUCCESSFUL: "Successful"}
+LIFECYCLE_FLAGS = ["Confirmed", "Delivered", "Cancelled", "RTO"]
+
+STATE_FLAGS = {
+    "Unknown": 0,
+    "Pending": 0,
+    "Confirmed": CONFIRMED,
+    "Shipped": CONFIRMED,
+    "Delivered": CONFIRMED | DELIVERED,
+    "Cancelled": CANCELLED,
+    # Returned to origin after being confirmed and shipped
+    "RTO": CONFIRMED | RTO,
+    # Failed or negated steps ("Delivery Failed", "Undelivered", "Payment Failed")
+    "Failed": 0,
+}
+
+# Failures and negations, checked before the keywords they contain
+NEGATED_PATTERN = r"not deliver|undeliver|fail"
+
+# Fallback for raw values the map does not list; first matching pattern wins
+DEFAULT_PATTERNS = [
+    (r"rto|return", "RTO"),
+    (r"cancel", "Cancelled"),
+    (NEGATED_PATTERN, "Failed"),
+    (r"deliver", "Delivered"),
+    (r"ship|transit|dispatch", "Shipped"),
+    (r"confirm", "Confirmed"),
+    (r"pending|placed|created|new", "Pending"),
+]
+
+# Payment Success counts raw statuses naming a confirmed, shipped or delivered
+# order, as the dashboard always has, except failed or negated ones. It does
+# not follow the lifecycle state: "RTO Delivered" counts, "In Transit" and
+# "Returned" do not
+SUCCESS_PATTERN = r"confirmed|delivered|shipped"
+
+_map_cache = {}
+
+
+def load_status_map(source=STATUS_MAP):
+    """Lower-cased raw status -> lifecycle state from the configured CSV, re-read when it changes"""
+    if not os.path.exists(source):
+        return {}
+    stamp = os.stat(source).st_mtime_ns
+    cached = _map_cache.get(source)
+    if cached is None or cached[0] != stamp:
+        table = pd.read_csv(source, dtype=str).rename(columns=str.lower).dropna(subset=["status", "state"])
+        states = table["state"].str.strip().str.title().replace({"Rto": "RTO"})
+        unknown = sorted(set(states) - set(LIFECYCLE_STATES))
+        if unknown:
+            raise ValueError(f"Unknown lifecycle states in {source}: {', '.join(unknown)}")
+        cached = (stamp, dict(zip(table["status"].str.strip().str.lower(), states)))
+        _map_cache[source] = cached
+    return cached[1]
+
+
+def lifecycle_state(raw, status_map):
+    """Lifecycle state of one raw status value"""
+    if pd.isna(raw):
+        return "Unknown"
+    value = str(raw).strip().lower()
+    if value in status_map:
+        return status_map[value]
+    for pattern, state in DEFAULT_PATTERNS:
+        if re.search(pattern, value):
+            return state
+    return "Unknown"
+
+
+def payment_successful(raw):
+    """Whether one raw status value counts towards Payment Success"""
+    if pd.isna(raw):
+        return False
+    value = str(raw).strip().lower()
+    return bool(re.search(SUCCESS_PATTERN, value)) and not re.search(NEGATED_PATTERN, value)
+
+
+def status_codes(status):
+    """(Status Code, Status Flags) uint8 arrays for a column of raw statuses.
+
+    Only the distinct raw values are classified; rows are mapped with one gather.
+    """
+    status_map = load_status_map()
+    rows, uniques = pd.factorize(status, use_na_sentinel=False)
+    states = [lifecycle_state(raw, status_map) for raw in uniques]
+    codes = np.array([LIFECYCLE_STATES.index(s) for s in states], dtype="u1")
+    flags = np.array(
+        [STATE_FLAGS[s] | (SUCCESSFUL if payment_successful(raw) else 0) for s, raw in zip(states, uniques)],
+        dtype="u1"
+    )
+    return codes[rows], flags[rows]
+
+
+def assign_statuses(df):
+    """Add the compact Status Flags column the rollups and KPIs count from"""
+    df["Status Flags"] = status_codes(df["Status"])[1]
+    return df.drop(columns=["Status Code"], errors="ignore")
+
+
+def status_flags(frame):
+    """Status Flags of raw orders or a rollup.
+
+    The stored column is read where it is set; rows without it (stored before
+    it existed) and frames without it are classified from Status. Stored flags
+    follow the status map and rules as of ingest or the last ``cli.py
+    precompute``, which rewrites the partitions whose flags changed.
+    """
+    if "Status Flags" not in frame.columns:
+        return status_codes(frame["Status"])[1]
+    stored = frame["Status Flags"]
+    missing = stored.isna().to_numpy()
+    flags = stored.fillna(0).to_numpy().astype("u1")
+    if missing.any():
+        flags[missing] = status_codes(frame["Status"][missing])[1]
+    return flags
+
+
+def flag_counts(frame, counts):
+    """Columns of ``counts`` restricted to rows with each lifecycle flag set"""
+    flags = status_flags(frame)
+    counts = np.asarray(counts)
+    return {name: np.where(flags & bit, counts, 0) for bit, name in FLAG_NAMES.items()}
@@ -0,0 +1,28 @@
+import streamlit as st
+
+# Column kinds: data stays numeric/datetime and the browser does the formatting
+COUNT = "count"
+CURRENCY = "currency"
+PERCENT = "percent"
+DATE = "date"
+
+
+def column_config(kind, label):
+    if kind == COUNT:
+        return st.column_config.NumberColumn(label, format="localized")
+    if kind == CURRENCY:
+        return st.column_config.NumberColumn(f"{label} (₹)", format="localized")
+    if kind == PERCENT:
+        # Values are already 0-100
+        return st.column_config.NumberColumn(label, format="%.1f%%")
+    if kind == DATE:
+        return st.column_config.DatetimeColumn(label, format="DD MMM YYYY")
+    raise ValueError(f"Unknown column kind: {kind}")
+
+
+def render_table(df, kinds=None, **kwargs):
+    """Render a summary table with typed, client-side column formatting"""
+    kwargs.setdefault("use_container_width", True)
+    kwargs.setdefault("hide_index", True)
+    configs = {col: column_config(kind, col) for col, kind in (kinds or {}).items() if col in df.columns}
+    st.dataframe(df, column_config=configs, **kwargs)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from cache import MerchantCache, estimate_bytes
+
+
+def test_estimate_bytes_counts_text_and_binary():
+    csv = "Order Number,Grand Total\n" + "1,100.0\n" * 125_000
+    assert estimate_bytes(csv) >= len(csv)
+    assert estimate_bytes(csv.encode()) >= len(csv)
+    assert estimate_bytes(bytearray(1024)) >= 1024
+
+
+def test_estimate_bytes_nested_values():
+    frame = pd.DataFrame({"a": np.arange(1000, dtype="int64")})
+    array = np.zeros(500, dtype="float64")
+    total = estimate_bytes({"frame": frame, "parts": [array, "x" * 10_000], "flag": True})
+    assert total >= frame.memory_usage(deep=True).sum() + array.nbytes + 10_000
+    assert estimate_bytes(None) == 0
+
+
+def test_spillable_entries_are_not_kept_under_pressure():
+    cache = MerchantCache(budget_bytes=100_000, idle_seconds=3600, pressure=0.5)
+    cache.get("acme", "big", 1, lambda: "x" * 60_000)
+    assert cache.contains("acme", "big", 1)
+    cache.get("acme", "export", 1, lambda: "y" * 10_000, component="sections", spillable=True)
+    assert not cache.contains("acme", "export", 1)
+    assert cache.spilled == 1
+
+
+def test_over_budget_evicts_from_the_largest_merchant():
+    cache = MerchantCache(budget_bytes=100_000, idle_seconds=3600)
+    cache.get("acme", "a", 1, lambda: "a" * 40_000)
+    cache.get("acme", "b", 1, lambda: "b" * 40_000)
+    cache.get("zeta", "c", 1, lambda: "c" * 30_000)
+    assert not cache.contains("acme", "a", 1)
+    assert cache.contains("acme", "b", 1) and cache.contains("zeta", "c", 1)
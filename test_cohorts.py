@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import ingest
+from cohorts import COHORT_DIMENSIONS, build_cohorts, update_cohorts
+
+KEYS = ["Cohort", "Period"] + COHORT_DIMENSIONS
+
+
+def make_orders(numbers, customers, rng, start="2024-01-01", days=180):
+    return pd.DataFrame({
+        "Order Number": numbers,
+        "Customer ID": customers,
+        "Order Date": pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, len(numbers)), unit="D"),
+        "Grand Total": rng.uniform(100, 2000, len(numbers)).round(2),
+        "Payment Type": rng.choice(["COD", "Prepaid"], len(numbers)),
+        "City Tier": rng.choice(["Tier 1", "Tier 2"], len(numbers)),
+    })
+
+
+def sorted_matrix(matrix):
+    return matrix.sort_values(KEYS, ignore_index=True)
+
+
+def assert_matches_rebuild(matrix, dataset, tmp_path):
+    full = build_cohorts(dataset, str(tmp_path / "full"))
+    pd.testing.assert_frame_equal(sorted_matrix(matrix), sorted_matrix(full), check_dtype=False)
+
+
+def test_update_cohorts_matches_full_rebuild(tmp_path):
+    rng = np.random.default_rng(11)
+    customers = [f"c{i}" for i in range(80)]
+    first = make_orders(np.arange(500), rng.choice(customers, 500), rng)
+    # Returning customers, new customers and some orders before their old first order
+    later = make_orders(np.arange(500, 800), rng.choice(customers + [f"n{i}" for i in range(40)], 300), rng,
+                        start="2023-12-01", days=240)
+    rollups = str(tmp_path / "rollups")
+    build_cohorts(first, rollups)
+
+    dataset = pd.concat([first, later], ignore_index=True)
+    matrix = update_cohorts(later, dataset, rollups)
+    assert_matches_rebuild(matrix, dataset, tmp_path)
+
+
+def test_update_cohorts_without_new_orders_keeps_the_matrix(tmp_path):
+    rng = np.random.default_rng(5)
+    orders = make_orders(np.arange(200), rng.choice([f"c{i}" for i in range(30)], 200), rng)
+    rollups = str(tmp_path / "rollups")
+    built = build_cohorts(orders, rollups)
+    pd.testing.assert_frame_equal(update_cohorts(orders.iloc[:0], orders, rollups), built)
+
+
+def test_reexported_orders_refold_their_customers(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "MERCHANTS_DIR", str(tmp_path / "merchants"))
+    rng = np.random.default_rng(23)
+    customers = [f"c{i}" for i in range(60)]
+    first = make_orders(np.arange(400), rng.choice(customers, 400), rng)
+    ingest.save_partitions(first, "acme")
+    build_cohorts(ingest.load_dataset("acme"), ingest.rollup_dir("acme"))
+
+    # Re-export 100 orders within their month with new customers and amounts, plus new orders
+    reexported = first.iloc[::4].copy()
+    reexported["Customer ID"] = rng.choice(customers + ["moved"], len(reexported))
+    reexported["Grand Total"] = reexported["Grand Total"] * 2
+    reexported["Order Date"] = reexported["Order Date"].dt.to_period("M").dt.start_time
+    batch = pd.concat([reexported, make_orders(np.arange(400, 500), rng.choice(customers, 100), rng)], ignore_index=True)
+
+    new_orders, replaced_orders = ingest.save_partitions(batch, "acme")
+    assert len(new_orders) == 100
+    assert sorted(replaced_orders["Order Number"]) == sorted(reexported["Order Number"])
+
+    dataset = ingest.load_dataset("acme")
+    changed = pd.concat([replaced_orders, batch[batch["Order Number"].isin(replaced_orders["Order Number"])]])
+    matrix = update_cohorts(new_orders, dataset, ingest.rollup_dir("acme"), changed)
+    assert_matches_rebuild(matrix, dataset, tmp_path)
+
+
+def test_build_cohorts_needs_customer_ids(tmp_path):
+    orders = make_orders(np.arange(10), ["c"] * 10, np.random.default_rng(0)).drop(columns="Customer ID")
+    assert build_cohorts(orders, str(tmp_path)) is None
+
+
+@pytest.mark.parametrize("unknown", [None, "Unknown"])
+def test_orders_without_a_known_customer_are_left_out(tmp_path, unknown):
+    rng = np.random.default_rng(2)
+    orders = make_orders(np.arange(50), ["c1"] * 25 + [unknown] * 25, rng)
+    matrix = build_cohorts(orders, str(tmp_path))
+    assert matrix["Orders"].sum() == 25
+
+
+def test_reexport_without_customer_ids_refolds_the_stored_customers(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "MERCHANTS_DIR", str(tmp_path / "merchants"))
+    rng = np.random.default_rng(31)
+    first = make_orders(np.arange(300), rng.choice([f"c{i}" for i in range(40)], 300), rng)
+    ingest.save_partitions(first, "acme")
+    build_cohorts(ingest.load_dataset("acme"), ingest.rollup_dir("acme"))
+
+    # A report without the customer column that re-exports stored orders in their month
+    batch = first.iloc[::5].drop(columns="Customer ID")
+    batch["Grand Total"] = batch["Grand Total"] + 50
+    new_orders, replaced_orders = ingest.save_partitions(batch, "acme")
+    assert new_orders.empty
+
+    dataset = ingest.load_dataset("acme")
+    changed = pd.concat([replaced_orders, batch])
+    matrix = update_cohorts(new_orders, dataset, ingest.rollup_dir("acme"), changed)
+    assert_matches_rebuild(matrix, dataset, tmp_path)
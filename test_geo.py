@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from geo import INDIA_STATES, normalize_states
+
+
+def test_normalize_states_folds_case_punctuation_and_aliases():
+    raw = ["tamil nadu", "TAMIL NADU", "Tamilnadu", "Jammu & Kashmir", "J&K", "Orissa", "NCT of Delhi", "Uttaranchal"]
+    assert normalize_states(raw).tolist() == [
+        "Tamil Nadu", "Tamil Nadu", "Tamil Nadu", "Jammu and Kashmir", "Jammu and Kashmir", "Odisha", "Delhi", "Uttarakhand",
+    ]
+
+
+def test_normalize_states_fuzzy_matches_close_misspellings():
+    assert normalize_states(["Karnatka", "Maharastra", "Chattisgarh"]).tolist() == [
+        "Karnataka", "Maharashtra", "Chhattisgarh",
+    ]
+
+
+def test_normalize_states_leaves_ambiguous_codes_and_unknowns():
+    # "UK" is as likely the United Kingdom as Uttarakhand
+    assert normalize_states(["UK", "up", "london "]).tolist() == ["Uk", "Up", "London"]
+
+
+def test_normalize_states_keeps_missing_values_and_positions():
+    values = pd.Series(["kerala", None, np.nan, "Kerala"], index=[10, 11, 12, 13])
+    result = normalize_states(values)
+    assert result.iloc[0] == result.iloc[3] == "Kerala"
+    assert result.iloc[1:3].isna().all()
+
+
+def test_normalize_states_only_maps_onto_the_given_names():
+    canonical = [s for s in INDIA_STATES if s != "Odisha"]
+    assert normalize_states(["Orissa", "odisha"], canonical=canonical).tolist() == ["Orissa", "Odisha"]
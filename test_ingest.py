@@ -0,0 +1,79 @@
+import os
+
+import pandas as pd
+import pytest
+
+import ingest
+from statuses import CANCELLED, assign_statuses
+
+
+@pytest.fixture(autouse=True)
+def merchants_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "MERCHANTS_DIR", str(tmp_path / "merchants"))
+
+
+def orders(numbers, dates, customer="c1", total=100.0):
+    return pd.DataFrame({
+        "Order Number": numbers,
+        "Customer ID": customer,
+        "Order Date": pd.to_datetime(dates),
+        "Grand Total": total,
+    })
+
+
+def stored_months(merchant):
+    return sorted(os.path.basename(path)[:7] for path in ingest.partition_files(merchant))
+
+
+def test_reexport_within_a_month_replaces_the_row():
+    ingest.save_partitions(orders([1, 2], ["2024-01-05", "2024-01-06"]), "acme")
+    new_orders, replaced_orders = ingest.save_partitions(orders([2, 3], ["2024-01-07", "2024-01-08"], total=250.0), "acme")
+
+    assert new_orders["Order Number"].tolist() == [3]
+    assert replaced_orders["Order Number"].tolist() == [2]
+    dataset = ingest.load_dataset("acme").set_index("Order Number")
+    assert sorted(dataset.index) == [1, 2, 3]
+    assert dataset.loc[2, "Grand Total"] == 250.0
+
+
+def test_reexport_into_another_month_moves_the_order():
+    ingest.save_partitions(orders([1, 2, 3], ["2024-01-30", "2024-01-31", "2024-02-01"]), "acme")
+    # Order 2 re-exported with a February date, order 1 with a March one
+    new_orders, replaced_orders = ingest.save_partitions(
+        orders([2, 1, 4], ["2024-02-02", "2024-03-01", "2024-02-03"], customer="c2"), "acme"
+    )
+
+    assert new_orders["Order Number"].tolist() == [4]
+    assert sorted(replaced_orders["Order Number"]) == [1, 2]
+    assert (replaced_orders["Customer ID"] == "c1").all()
+
+    dataset = ingest.load_dataset("acme")
+    assert dataset["Order Number"].is_unique
+    assert sorted(dataset["Order Number"]) == [1, 2, 3, 4]
+    moved = dataset.set_index("Order Number").loc[[1, 2], "Order Date"]
+    assert moved.dt.strftime("%Y-%m").tolist() == ["2024-03", "2024-02"]
+    # January emptied out, so its partition is gone
+    assert stored_months("acme") == ["2024-02", "2024-03"]
+
+
+def test_replace_drops_every_stored_partition():
+    ingest.save_partitions(orders([1, 2], ["2024-01-05", "2024-02-06"]), "acme")
+    new_orders, replaced_orders = ingest.save_partitions(orders([5], ["2024-03-01"]), "acme", replace=True)
+    assert new_orders["Order Number"].tolist() == [5]
+    assert replaced_orders.empty
+    assert stored_months("acme") == ["2024-03"]
+
+
+def test_refresh_statuses_rewrites_only_stale_partitions():
+    frame = orders([1, 2], ["2024-01-05", "2024-02-06"]).assign(Status=["Cancelled", "Cancelled"])
+    ingest.save_partitions(assign_statuses(frame), "acme")
+    assert ingest.refresh_statuses("acme") == 0
+
+    # Flags stored under an older map or rules
+    january = ingest.partition_files("acme")[0]
+    stale = pd.read_parquet(january).assign(**{"Status Flags": 0})
+    stale.to_parquet(january, index=False)
+
+    assert ingest.refresh_statuses("acme") == 1
+    assert (ingest.load_dataset("acme")["Status Flags"] == CANCELLED).all()
+    assert ingest.refresh_statuses("acme") == 0
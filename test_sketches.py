@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sketches import (
+    build_sketch_table, hll_error, hll_estimate, merge_topk, stratified_sample, stratified_totals, summarize_topk
+)
+
+
+@pytest.mark.parametrize("distinct", [100, 5_000, 200_000])
+def test_hll_estimate_within_error_bound(distinct):
+    values = pd.Series([f"customer-{i}" for i in range(distinct)] * 2)
+    sketch = build_sketch_table(pd.DataFrame({"Day": np.zeros(len(values), dtype=int)}), values)
+    estimate = hll_estimate(sketch)
+    # Three standard errors; hashing is deterministic, so this does not flake
+    assert abs(estimate - distinct) <= 3 * hll_error() * distinct
+
+
+def test_hll_sketches_merge_like_the_union():
+    days = pd.DataFrame({"Day": np.repeat([0, 1], 30_000)})
+    values = pd.Series([f"customer-{i}" for i in range(30_000)] + [f"customer-{i}" for i in range(15_000, 45_000)])
+    sketch = build_sketch_table(days, values)
+    union = hll_estimate(sketch)
+    # Per-day registers merged at query time give the same answer as one sketch of everything
+    assert union == hll_estimate(build_sketch_table(pd.DataFrame({"Day": np.zeros(len(values), dtype=int)}), values))
+    assert abs(union - 45_000) <= 3 * hll_error() * 45_000
+
+
+def test_merge_topk_undercount_bound():
+    rng = np.random.default_rng(7)
+    n = 20_000
+    items = pd.DataFrame({
+        "Day": rng.integers(0, 10, n),
+        # Zipf-like popularity, so summaries drop a long tail
+        "Item": [f"item-{i}" for i in np.minimum(rng.zipf(1.3, n), 500)],
+        "Order Number": np.arange(n),
+        "Grand Total": rng.uniform(100, 1000, n),
+    })
+    summaries = summarize_topk(items, ["Day"], capacity=20)
+    merged = merge_topk(summaries, ["Day"])
+    truth = items.groupby("Item").size()
+
+    undercount = truth.reindex(merged.index) - merged["Count"]
+    assert (undercount >= 0).all()
+    assert (undercount <= merged["Error"]).all()
+    # Items kept by every summary are exact
+    assert (undercount[merged["Error"] == 0] == 0).all()
+    # Items no summary kept occurred at most the summed thresholds
+    total_threshold = summaries.drop_duplicates(["Day"])["Threshold"].sum()
+    assert truth.drop(merged.index).max() <= total_threshold
+
+
+def _population(n=60_000, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Order Number": np.arange(n),
+        "Day": rng.integers(0, 30, n),
+        "Payment Type": rng.choice(["COD", "Prepaid"], n),
+        "Billing State": rng.choice(["Delhi", "Kerala", "Punjab", "Goa", "Assam", "Bihar"], n, p=[.3, .2, .2, .15, .1, .05]),
+        "Grand Total": rng.gamma(2.0, 400.0, n),
+    })
+
+
+def test_stratified_totals_confidence_intervals_cover_truth():
+    frame = _population()
+    truth = frame.groupby("Billing State")["Grand Total"].sum()
+    covered = []
+    for rate in (0.02, 0.05, 0.1):
+        sample = stratified_sample(frame, ["Day", "Payment Type"], rate, 3, key="Order Number")
+        totals = stratified_totals(sample, sample["Grand Total"], sample["Billing State"])
+        error = (totals["Estimate"] - truth.reindex(totals.index)).abs()
+        assert (totals["CI"] > 0).all()
+        covered += list(error <= totals["CI"])
+    # 95% intervals: allow for a couple of misses across 18 domains
+    assert np.mean(covered) >= 0.85
+
+
+def test_stratified_totals_are_exact_for_a_full_sample():
+    frame = _population(n=5_000)
+    sample = stratified_sample(frame, ["Day", "Payment Type"], 1.0, 3, key="Order Number")
+    assert len(sample) == len(frame)
+    assert (sample["Weight"] == 1).all()
+    totals = stratified_totals(sample, sample["Grand Total"], sample["Billing State"])
+    truth = frame.groupby("Billing State")["Grand Total"].sum()
+    np.testing.assert_allclose(totals["Estimate"], truth.reindex(totals.index))
+    # Finite population correction: nothing left to estimate
+    np.testing.assert_allclose(totals["CI"], 0, atol=1e-6)
@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+
+from statuses import (
+    CANCELLED, CONFIRMED, DELIVERED, LIFECYCLE_STATES, RTO, STATE_FLAGS, SUCCESSFUL, assign_statuses, lifecycle_state,
+    payment_successful, status_codes, status_flags
+)
+
+
+@pytest.mark.parametrize("raw, state", [
+    ("Delivered", "Delivered"),
+    ("  DELIVERED ", "Delivered"),
+    ("RTO Delivered", "RTO"),
+    ("Returned to origin", "RTO"),
+    ("Cancelled by customer", "Cancelled"),
+    ("Cancelled - Delivery Failed", "Cancelled"),
+    ("Delivery Failed", "Failed"),
+    ("Not Delivered", "Failed"),
+    ("Undelivered", "Failed"),
+    ("Payment Failed", "Failed"),
+    ("In Transit", "Shipped"),
+    ("Dispatched", "Shipped"),
+    ("Order Confirmed", "Confirmed"),
+    ("Order Placed", "Pending"),
+    ("pending", "Pending"),
+    ("On hold", "Unknown"),
+    (None, "Unknown"),
+    (float("nan"), "Unknown"),
+])
+def test_lifecycle_state_keywords(raw, state):
+    assert lifecycle_state(raw, {}) == state
+
+
+def test_lifecycle_state_map_wins_over_keywords():
+    status_map = {"delivered to locker": "Shipped", "on hold": "Pending"}
+    assert lifecycle_state("Delivered to Locker", status_map) == "Shipped"
+    assert lifecycle_state(" On Hold", status_map) == "Pending"
+    assert lifecycle_state("Delivered", status_map) == "Delivered"
+
+
+@pytest.mark.parametrize("raw, successful", [
+    ("Confirmed", True),
+    ("Shipped", True),
+    ("Delivered", True),
+    ("RTO Delivered", True),
+    ("In Transit", False),
+    ("Returned", False),
+    ("Not Delivered", False),
+    ("Undelivered", False),
+    ("Payment Failed - Confirmed", False),
+    (None, False),
+])
+def test_payment_successful(raw, successful):
+    assert payment_successful(raw) is successful
+
+
+def test_status_codes_flags():
+    status = pd.Series(["Delivered", "RTO", "Cancelled", "Not Delivered", None, "Delivered"])
+    codes, flags = status_codes(status)
+    assert [LIFECYCLE_STATES[c] for c in codes] == ["Delivered", "RTO", "Cancelled", "Failed", "Unknown", "Delivered"]
+    assert list(flags) == [
+        CONFIRMED | DELIVERED | SUCCESSFUL, STATE_FLAGS["RTO"], CANCELLED, 0, 0, CONFIRMED | DELIVERED | SUCCESSFUL
+    ]
+    assert STATE_FLAGS["RTO"] & RTO
+
+
+def test_status_flags_read_the_stored_column():
+    frame = assign_statuses(pd.DataFrame({"Status": ["Delivered", "Cancelled"], "Status Code": [0, 0]}))
+    assert "Status Code" not in frame.columns
+    # Stored flags win over Status, so edits only apply once precompute rewrites them
+    frame.loc[1, "Status Flags"] = RTO
+    assert list(status_flags(frame)) == [CONFIRMED | DELIVERED | SUCCESSFUL, RTO]
+
+
+def test_status_flags_classify_rows_stored_without_them():
+    frame = pd.DataFrame({"Status": ["Cancelled", "Delivered", "RTO"], "Status Flags": [CANCELLED, None, None]})
+    assert list(status_flags(frame)) == [CANCELLED, CONFIRMED | DELIVERED | SUCCESSFUL, STATE_FLAGS["RTO"]]
+    assert list(status_flags(frame[["Status"]])) == list(status_flags(frame))
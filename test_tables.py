@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")
+
+import tables
+from tables import COUNT, CURRENCY, DATE, PERCENT, column_config, render_table
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tables.st, "dataframe", lambda df, **kwargs: calls.append((df, kwargs)))
+    return calls
+
+
+def test_render_table_keeps_data_typed_and_configures_present_columns(rendered):
+    df = pd.DataFrame({
+        "State": ["Goa", "Kerala"],
+        "Orders": [1200, 35],
+        "Revenue": [125000.5, 9000.0],
+        "COD %": [40.0, 12.5],
+        "First Order": pd.to_datetime(["2024-01-02", "2024-03-04"]),
+    })
+    kinds = {"Orders": COUNT, "Revenue": CURRENCY, "COD %": PERCENT, "First Order": DATE, "Missing": COUNT}
+    render_table(df, kinds)
+
+    (shown, kwargs), = rendered
+    # Formatting happens in the browser; the frame is passed through unchanged
+    assert shown is df
+    assert set(kwargs["column_config"]) == {"Orders", "Revenue", "COD %", "First Order"}
+    assert kwargs["hide_index"] is True
+    assert kwargs["use_container_width"] is True
+
+
+def test_render_table_without_kinds(rendered):
+    render_table(pd.DataFrame({"a": [1]}), hide_index=False)
+    (_, kwargs), = rendered
+    assert kwargs["column_config"] == {}
+    assert kwargs["hide_index"] is False
+
+
+def test_column_config_labels_and_formats():
+    assert column_config(CURRENCY, "Revenue")["label"] == "Revenue (₹)"
+    assert column_config(PERCENT, "COD %")["type_config"]["format"] == "%.1f%%"
+    assert column_config(COUNT, "Orders")["type_config"]["format"] == "localized"
+
+
+def test_column_config_rejects_unknown_kinds():
+    with pytest.raises(ValueError, match="Unknown column kind"):
+        column_config("money", "Revenue")
@@ -0,0 +1,59 @@
+import logging
+import os
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import ingest
+import sections
+import warmup
+from aggregates import default_filters
+from cache import MerchantCache
+from sections import ORDERS
+
+
+@pytest.fixture(autouse=True)
+def merchants_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "MERCHANTS_DIR", str(tmp_path / "merchants"))
+    os.makedirs(ingest.merchant_dir("acme"))
+
+
+def filters(day):
+    return {"date_range": (date(2024, 1, 1), date(2024, 1, day)), "payment": ["COD"]}
+
+
+def test_record_filters_caps_the_history(monkeypatch):
+    monkeypatch.setattr(warmup, "HISTORY_MAX_BYTES", 4096)
+    monkeypatch.setattr(warmup, "HISTORY_LIMIT", 10)
+    for day in range(1, 29):
+        for _ in range(3):
+            warmup.record_filters("acme", filters(day))
+
+    assert os.path.getsize(warmup.history_path("acme")) <= 4096
+    # Only the newest records survive the trim
+    ranked = warmup.popular_filters("acme", n=50)
+    assert filters(28)["date_range"] in [f["date_range"] for f in ranked]
+    assert min(f["date_range"][1].day for f in ranked) > 15
+
+
+def test_failing_section_is_logged_and_the_rest_still_warm(monkeypatch, caplog):
+    def boom(results):
+        raise RuntimeError("corrupt partition")
+
+    monkeypatch.setattr(warmup, "SECTIONS", {"broken": boom, "fine": lambda results: 42})
+    monkeypatch.setattr(sections, "SECTIONS", {"broken": boom, "fine": lambda results: 42})
+    monkeypatch.setattr(warmup, "dataset_version", lambda merchant: 7)
+    orders = pd.DataFrame({"Order Date": pd.to_datetime(["2024-01-01", "2024-01-05"]), "Payment Type": ["COD", "Prepaid"],
+                           "Status": ["Delivered", "Cancelled"]})
+    cache = MerchantCache()
+    warmer = warmup.Warmer(cache, lambda merchant, version, name: orders if name == ORDERS else None, top_n=0)
+
+    with caplog.at_level(logging.ERROR, logger="warmup"):
+        warmer.warm("acme", 7)
+
+    assert "section broken failed for merchant acme at dataset version 7" in caplog.text
+    assert "corrupt partition" in caplog.text
+    results = sections.SectionResults(cache, None, "acme", 7, default_filters(orders))
+    assert results.peek("fine") == 42
+    assert results.peek("broken") is None
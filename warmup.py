@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import date
+
+from aggregates import default_filters, filter_key
+from ingest import dataset_version, list_merchants, merchant_dir
+from sections import ORDERS, SECTIONS, SectionResults
+
+FILTER_HISTORY = "filter_history.jsonl"
+
+# Popular filter states warmed besides the default view, how far back and how
+# many history records count towards popularity
+WARMUP_TOP_N = int(os.environ.get("GOKWIK_WARMUP_TOP", 3))
+HISTORY_DAYS = float(os.environ.get("GOKWIK_WARMUP_HISTORY_DAYS", 14))
+HISTORY_LIMIT = 5000
+# Past this size the history file is cut back to its last HISTORY_LIMIT records
+HISTORY_MAX_BYTES = 2 * 1024 ** 2
+
+# Warm-up stops after this much CPU time per dataset version, and sleeps
+# between sections so it uses at most this share of one core
+WARMUP_CPU_SECONDS = float(os.environ.get("GOKWIK_WARMUP_CPU_SEC", 120))
+WARMUP_CPU_SHARE = float(os.environ.get("GOKWIK_WARMUP_CPU_SHARE", 0.5))
+
+# How often the warmer checks for datasets ingested by other processes (cli.py)
+WARMUP_POLL_SECONDS = float(os.environ.get("GOKWIK_WARMUP_POLL_SEC", 60))
+
+log = logging.getLogger(__name__)
+_history_lock = threading.Lock()
+
+
+def history_path(merchant):
+    return os.path.join(merchant_dir(merchant), FILTER_HISTORY)
+
+
+def record_filters(merchant, filters):
+    """Append a filter state a session applied to the merchant's history"""
+    record = {
+        "ts": time.time(),
+        **filters,
+        "date_range": [str(filters["date_range"][0]), str(filters["date_range"][-1])],
+    }
+    path = history_path(merchant)
+    with _history_lock:
+        with open(path, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+            size = f.tell()
+        if size > HISTORY_MAX_BYTES:
+            with open(path) as f:
+                lines = deque(f, maxlen=HISTORY_LIMIT)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.writelines(lines)
+            os.replace(tmp_path, path)
+
+
+def popular_filters(merchant, n=WARMUP_TOP_N, days=HISTORY_DAYS):
+    """The ``n`` filter states applied most often in the last ``days`` days"""
+    path = history_path(merchant)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        lines = deque(f, maxlen=HISTORY_LIMIT)
+
+    since = time.time() - days * 86400
+    counts = Counter()
+    states = {}
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.pop("ts", 0) < since:
+            continue
+        record["date_range"] = tuple(date.fromisoformat(d) for d in record["date_range"])
+        key = filter_key(record)
+        counts[key] += 1
+        states[key] = record
+    return [states[key] for key, _ in counts.most_common(n)]
+
+
+class Warmer:
+    """Background thread that precomputes section results after each ingest.
+
+    Whenever a merchant's dataset version changes after startup, the default
+    view and the merchant's most popular recent filter states are computed
+    into the shared merchant cache, so the first analyst to open the dashboard after
+    an upload does not pay the cold cost.
+    """
+
+    def __init__(self, cache, load, top_n=WARMUP_TOP_N, cpu_seconds=WARMUP_CPU_SECONDS,
+                 cpu_share=WARMUP_CPU_SHARE, poll_seconds=WARMUP_POLL_SECONDS):
+        self.cache = cache
+        self.load = load
+        self.top_n = top_n
+        self.cpu_seconds = cpu_seconds
+        self.cpu_share = cpu_share
+        self.poll_seconds = poll_seconds
+        self._warmed = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="gokwik-warmup", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Check for new dataset versions now instead of at the next poll"""
+        self._wake.set()
+
+    def _run(self):
+        # Datasets already on disk at startup are left cold: only the merchant
+        # an analyst selects is loaded, and warming starts with the next ingest
+        for merchant in list_merchants():
+            self._warmed[merchant] = dataset_version(merchant)
+        while True:
+            for merchant in list_merchants():
+                version = dataset_version(merchant)
+                if version is None or self._warmed.get(merchant) == version:
+                    continue
+                # Marked first so a failing dataset is not retried every poll
+                self._warmed[merchant] = version
+                try:
+                    self.warm(merchant, version)
+                except Exception:
+                    log.exception("Warm-up failed for merchant %s at dataset version %s", merchant, version)
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def warm(self, merchant, version):
+        """Compute every section for the default and popular filter states"""
+        started = time.thread_time()
+        orders = self.load(merchant, version, ORDERS)
+        states = [default_filters(orders)]
+        states += [f for f in popular_filters(merchant, self.top_n) if filter_key(f) != filter_key(states[0])]
+
+        for filters in states:
+            results = SectionResults(self.cache, self.load, merchant, version, filters, orders=orders)
+            for name in SECTIONS:
+                section_start = time.thread_time()
+                try:
+                    results.get(name)
+                except Exception:
+                    # The section stays cold; the others are still warmed
+                    log.exception("Warm-up of section %s failed for merchant %s at dataset version %s",
+                                  name, merchant, version)
+                spent = time.thread_time() - section_start
+                if time.thread_time() - started > self.cpu_seconds or dataset_version(merchant) != version:
+                    return
+                time.sleep(spent * (1 - self.cpu_share) / self.cpu_share)